@@ -23,7 +23,6 @@ Steven Sloboda sloboste@umich.edu https://github.com/sloboste
 # Standard libary
 from collections import defaultdict
 import threading
-import string
 import time
 import re
 
@@ -331,7 +330,10 @@ class BTLEDevice(object):
                     Notification handle = <handle> value: <value> 
                     Indication   handle = <handle> value: <value>
         """
-        hex_handle, _, hex_value = string.split(msg.strip(), maxsplit=5)[3:]
+        if isinstance(msg, bytes):
+            msg = msg.decode('ascii', 'replace')
+
+        hex_handle, _, hex_value = msg.strip().split(None, 5)[3:]
         handle = int(hex_handle, 16)
         value = bytearray.fromhex(hex_value)
 
@@ -379,7 +381,9 @@ def le_scan(sudo_password=None, timeout=5):
     command = 'hcitool lescan'
     if sudo_password: command = 'sudo %s' % command
 
-    scan = pexpect.spawn('bash', ['-c', command], ignore_sighup=False)
+    # str instead of bytes in before, as in python 2
+    scan = pexpect.spawn('bash', ['-c', command], ignore_sighup=False,
+                         encoding='utf-8')
     if sudo_password: 
         scan.sendline(sudo_password)
         scan.readline()  # exclude sudo message from scan.before
@@ -397,7 +401,7 @@ def le_scan(sudo_password=None, timeout=5):
     except pexpect.TIMEOUT:
         devices = {}
         for line in scan.before.split('\r\n'):
-            match = re.match(r'(([0-9A-Fa-f]{2}:?){6}) (\(?\w+\)?', line)
+            match = re.match(r'(([0-9A-Fa-f]{2}:?){6}) (\(?\w+\)?)', line)
             if match is not None:
                 address = match.group(1)
                 name = match.group(3)
@@ -437,7 +441,8 @@ def reset_bluetooth_controller(sudo_password=None, hci_device='hci0',
     command = 'hciconfig %s reset' % hci_device
     if sudo_password: command = 'sudo %s' % command
 
-    p = pexpect.spawn('bash', ['-c', command], ignore_sighup=False)
+    p = pexpect.spawn('bash', ['-c', command], ignore_sighup=False,
+                      encoding='utf-8')
     if sudo_password: p.sendline(sudo_password)
 
     try:
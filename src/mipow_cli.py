@@ -24,25 +24,63 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+import os
 import re
 import sys
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from playbulb import colors
+from playbulb.daemon import DEFAULT_SOCKET
 from playbulb.mipow import Bulb
 
 _HEADLINE = """
 Mipow bulb command line remote control for Linux / Raspberry Pi
 
-Usage: <mac/alias> <command> <parameters...>
+Usage: [--ndjson] <targets> <command> <parameters...>
+       group <name> [<targets>]
+       fleet [<targets>] [<seconds>]
+       watch <targets> [<seconds>]
+       export [<targets>] [<file>]
+       import [<file>]
+       batch [<file>]
+       daemon [<socket>]
+       setup <file>|scan [<adapter,...>] [<limit>]
        <mac>: bluetooth mac address of bulb
        <alias>: you can use alias instead of mac address
                 after you have run setup (see setup)
+       <targets>: comma separated macs, aliases, groups or all,
+                  runs on all targets concurrently
+       --ndjson: print one json line per target as it is done
        <command>: For command and parameters
+       group: defines a group of bulbs, without targets removes it
+       fleet: reads the state of many bulbs (default all) concurrently
+              and prints one json line per bulb after <seconds>
+              (default 5), bulbs not read by then are marked stale
+       watch: prints changes of color and effect as json lines,
+              polls every <seconds> (default 1) and less often
+              while nothing changes
+       export: writes the state of many bulbs (default all) as json
+               lines to file or stdout (-) as each bulb has been read
+       import: restores the states of an export from file or stdin,
+               writes only what differs from the current state
+       batch: runs lines of <mac/alias> <command> <parameters...>
+              from file or stdin, one connection per bulb and
+              bulbs concurrently
+       daemon: keeps bulbs connected, commands are passed to
+               a running daemon and fall back to a direct
+               connection otherwise, set MIPOW_SOCKET for a daemon
+               on another <socket>
+       setup: sets up many bulbs concurrently, lines of <mac> [<alias>]
+              from file or stdin (-) or the bulbs found by a scan,
+              at most <limit> bulbs per adapter at a time (default 4)
 
 """
 
 _KNOWN_BULBS_FILE= "~/.known_bulbs"
-_MAC_PATTERN = "\[0-9A-F]{2}:\[0-9A-F]{2}:\[0-9A-F]{2}" \
-                + ":\[0-9A-F]{2}:\[0-9A-F]{2}:\[0-9A-F]{2}"
+_COMMANDS = None
+_REGISTRY = None
+_MAC_PATTERN = r"\[0-9A-F]{2}:\[0-9A-F]{2}:\[0-9A-F]{2}" \
+                + r":\[0-9A-F]{2}:\[0-9A-F]{2}:\[0-9A-F]{2}"
 _PARAMS = "params"
 _USAGE = "usage"
 
@@ -55,109 +93,147 @@ _PARSE_STR = "$"
 
 _PARSER = "parser"
 
-known_bulbs = []
+# perceived brightness levels of up and down
+_DIM_STEP = 32
 
-COMMANDS = {
-    "color" : {
-        _USAGE : """
+# bulbs which are driven concurrently in batch mode
+_BATCH_WORKERS = 8
+
+# shared value ranges of parameters
+_BYTE = range(256)
+_TIMER_NO = range(1, 5)
+
+
+
+
+def _commands():
+
+    global _COMMANDS
+
+    # built on first use instead of on import
+    if _COMMANDS is not None:
+        return _COMMANDS
+
+    _COMMANDS = {
+        "color" : {
+            _USAGE : """
   color <white> <red> <green> <blue>
-                                 - set color, each value 0 - 255""",
-        _PARAMS : [
-            range(256),
-            range(256),
-            range(256),
-            range(256)
-        ]
-    },
-    "on" : {
-        _USAGE : """
+                                 - set color, each value 0 - 255
+  color <color>                  - set color by name, e.g. red, warmwhite,
+                                   by hex #rrggbb, by temperature 2700K
+                                   or by hsv(<0 - 360>,<0 - 1>,<0 - 1>)""",
+            _PARAMS : [
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE
+            ]
+        },
+        "on" : {
+            _USAGE : """
   on                             - turn on light (white)""",
-        _PARAMS : []
-    }, 
-    "off" : {
-        _USAGE : """
+            _PARAMS : []
+        }, 
+        "off" : {
+            _USAGE : """
   off                            - turn off light""",
-        _PARAMS : []
-    },    
-    "toggle" : {
-        _USAGE : """
+            _PARAMS : []
+        },    
+        "toggle" : {
+            _USAGE : """
   toggle                         - turn off / on (remembers color!)""",
-        _PARAMS : []
-    },
-    "up" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "up" : {
+            _USAGE : """
   up                             - turn up light""",
-        _PARAMS : []
-    },    
-    "down" : {
-        _USAGE : """
+            _PARAMS : []
+        },    
+        "down" : {
+            _USAGE : """
   down                           - dim light""",
-        _PARAMS : []
-    },
-    "blink" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "animate" : {
+            _USAGE : """
+  animate <seconds> <white> <red> <green> <blue>
+                                 - change color smoothly, the frames
+                                   are streamed from this host
+                                   <seconds>: runtime in seconds
+                                   color values: 0 - 255""",
+            _PARSER : [_PARSE_STR],
+            _PARAMS : [
+                r"([0-9]+)",
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE
+            ]
+        },
+        "blink" : {
+            _USAGE : """
   blink <hold> <white> <red> <green> <blue>
                                  - run build-in blink effect
                                    <hold>: 0 - 255ms per step
                                    color values: 0 - 255""",
-        _PARAMS : [
-            range(256),
-            range(256),
-            range(256),
-            range(256),
-            range(256)        
-        ]
-    },
-    "candle" : {
-        _USAGE : """
+            _PARAMS : [
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE        
+            ]
+        },
+        "candle" : {
+            _USAGE : """
   candle <hold>                   - run build-in candle effect
                                    <hold>: 0 - 255 in 1/100s""",
-        _PARAMS : [
-            range(256)        
-        ]
-    },            
-    "disco" : {
-        _USAGE : """
+            _PARAMS : [
+                _BYTE        
+            ]
+        },            
+        "disco" : {
+            _USAGE : """
   disco <hold>                   - run build-in disco effect
                                    <hold>: 0 - 255 in 1/100s""",
-        _PARAMS : [
-            range(256)        
-        ]
-    },                                    
-    "pulse" : {
-        _USAGE : """
+            _PARAMS : [
+                _BYTE        
+            ]
+        },                                    
+        "pulse" : {
+            _USAGE : """
   pulse <hold> <white> <red> <green> <blue>
                                  - run build-in pulse effect
                                    <hold>: 0 - 255ms per step
                                    color values: 0=off, 1=on""",
-        _PARAMS : [
-            range(256),
-            range(256),
-            range(256),
-            range(256),
-            range(256)        
-        ]
-    },
-    "rainbow" : {
-        _USAGE : """
+            _PARAMS : [
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE        
+            ]
+        },
+        "rainbow" : {
+            _USAGE : """
   rainbow <hold>                 - run build-in rainbow effect
                                    <hold>: 0 - 255ms per step""",
-        _PARAMS : [
-            range(256)        
-        ]
-    },
-    "hold" : {
-        _USAGE : """
+            _PARAMS : [
+                _BYTE        
+            ]
+        },
+        "hold" : {
+            _USAGE : """
   hold                           - change hold value of current effect""",
-        _PARAMS : []
-    },
-    "halt" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "halt" : {
+            _USAGE : """
   halt                           - halt build-in effect, keeps color""",
-        _PARAMS : []
-    },
-    "set-timer" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "set-timer" : {
+            _USAGE : """
   set-timer <timer> <time> <start> <minutes> <white> <red> <green> <blue>
                                  - schedules timer
                                    <timer>: No. of timer 1 - 4
@@ -165,73 +241,90 @@ COMMANDS = {
                                             (hh:mm or in minutes)
                                    <minutes>: runtime in minutes
                                    color values: 0 - 255""",
-        _PARSER : [None, 
-                   _PARSE_STR],
-        _PARAMS : [
-            range(1, 5),
-            r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)",
-            range(256),
-            range(256),
-            range(256),
-            range(256),
-            range(256)
-        ]
-    },
-    "unset-timer" : {
-        _USAGE : """
+            _PARSER : [None, 
+                       _PARSE_STR],
+            _PARAMS : [
+                _TIMER_NO,
+                r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)",
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE
+            ]
+        },
+        "unset-timer" : {
+            _USAGE : """
   unset-timer <timer>            - deactivates single timer
                                    <timer>: No. of timer 1 - 4""",
-        _PARAMS : [
-            range(1, 5)
-        ]
-    },
-    "unset-all-timers" : {
-        _USAGE : """
+            _PARAMS : [
+                _TIMER_NO
+            ]
+        },
+        "unset-all-timers" : {
+            _USAGE : """
   unset-all-timers               - deactivates all timers"""
-    },
-                        
-    "fade" : {
-        _USAGE : """
+        },
+                            
+        "fade" : {
+            _USAGE : """
   fade <minutes> <white> <red> <green> <blue>
                                  - change color smoothly
                                    <minutes>: runtime in minutes
                                    color values: 0 - 255""",
-        _PARAMS : []
-    },
-    "ambient" : {
-        _USAGE : """
+            _PARSER : [_PARSE_STR],
+            _PARAMS : [
+                r"([0-9]+)",
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE
+            ]
+        },
+        "ambient" : {
+            _USAGE : """
   ambient <minutes> [<start>]    - schedules ambient program
                                   <minutes>: runtime in minutes
                                              best in steps of 15m
                                   <start>: starting time (optional)
                                            (hh:mm or in minutes)""",
-        _PARSER : [_PARSE_STR, 
-                   _PARSE_OPT],
-        _PARAMS : [
-            r"([0-9]+)",
-            r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)"
-        ]
-    },
-    "wakeup" : {
-        _USAGE : """
+            _PARSER : [_PARSE_STR, 
+                       _PARSE_OPT],
+            _PARAMS : [
+                r"([0-9]+)",
+                r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)"
+            ]
+        },
+        "wakeup" : {
+            _USAGE : """
   wakeup <minutes> [<start>]     - schedules wake-up program
                                    <minutes>: runtime in minutes
                                               best in steps of 15m
                                    <start>: starting time (optional)
                                             (hh:mm or in minutes)""",
-        _PARAMS : []
-    },
-    "doze" : {
-        _USAGE : """
+            _PARSER : [_PARSE_STR, 
+                       _PARSE_OPT],
+            _PARAMS : [
+                r"([0-9]+)",
+                r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)"
+            ]
+        },
+        "doze" : {
+            _USAGE : """
   doze <minutes> [<start>]       - schedules doze program
                                    <minutes>: runtime in minutes
                                               best in steps of 15m
                                    <start>: starting time (optional)
                                             (hh:mm or in minutes)""",
-        _PARAMS : []
-    },
-    "bgr" : {
-        _USAGE : """
+            _PARSER : [_PARSE_STR, 
+                       _PARSE_OPT],
+            _PARAMS : [
+                r"([0-9]+)",
+                r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)"
+            ]
+        },
+        "bgr" : {
+            _USAGE : """
   bgr <minutes> [<start>] [<brightness>]
                                  - schedules blue-green-red program
                                    <minutes>: runtime in minutes
@@ -239,10 +332,17 @@ COMMANDS = {
                                    <start>: starting time (optional)
                                           (hh:mm or in minutes)
                                    <brightness>: 0 - 255 (default: 255)""",
-        _PARAMS : []
-    },
-    "set-random" : {
-        _USAGE : """
+            _PARSER : [_PARSE_STR, 
+                       _PARSE_OPT,
+                       _PARSE_OPT],
+            _PARAMS : [
+                r"([0-9]+)",
+                r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)",
+                r"([0-9]*)"
+            ]
+        },
+        "set-random" : {
+            _USAGE : """
   set-random <start> <stop> <min> <max> [<white> <red> <green> <blue>]
                                  - schedules random mode
                                    <start>: start time
@@ -252,51 +352,68 @@ COMMANDS = {
                                    <min>: min runtime in minutes
                                    <max>: max runtime in minutes
                                           color values: 0 - 255""",
-        _PARSER : [_PARSE_STR, 
-                   _PARSE_STR],
-        _PARAMS : [
-            r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)",
-            r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)",
-            range(256),
-            range(256),
-            range(256),
-            range(256),
-            range(256),            
-            range(256)
-        ]
-    },
-    "unset-random" : {
-        _USAGE : """
+            _PARSER : [_PARSE_STR, 
+                       _PARSE_STR],
+            _PARAMS : [
+                r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)",
+                r"([0-2]?[0-9]:[0-5][0-9]|[0-9]*)",
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE,
+                _BYTE,            
+                _BYTE
+            ]
+        },
+        "unset-random" : {
+            _USAGE : """
   unset-random                   - stop random mode""",
-        _PARAMS : []
-    },
-    "status" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "status" : {
+            _USAGE : """
   status                         - print full state of bulb""",
-        _PARAMS : []
-    },
-    "json" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "json" : {
+            _USAGE : """
   json                           - print full state of bulb in 
                                    json format""",
-        _PARAMS : []
-    },
-    "name" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "name" : {
+            _USAGE : """
   name                           - rename bulb""",
-        _PARAMS : []
-    },
-    "reset" : {
-        _USAGE : """
+            _PARAMS : []
+        },
+        "reset" : {
+            _USAGE : """
   reset                          - perform factory reset""",
-        _PARAMS : []
-    },
-    "setup" : {
-        _USAGE : """
-  setup                          - setup bulb for this program""",
-        _PARAMS : []
+            _PARAMS : []
+        },
+        "setup" : {
+            _USAGE : """
+  setup [<alias>]                - setup bulb for this program
+                                   <alias>: name to use instead of mac""",
+            _PARSER : [_PARSE_OPT],
+            _PARAMS : [
+                r"^([A-Za-z0-9_.-]+)$"
+            ]
+        }
     }
-}
+
+    return _COMMANDS
+
+
+
+
+def __getattr__(name):
+
+    # COMMANDS of earlier versions
+    if name == "COMMANDS":
+        return _commands()
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 
@@ -331,23 +448,23 @@ def _help():
     s = _HEADLINE 
        
     s += "Basic commands:"
-    for cmd in ["color", "on", "off", "toggle", "up", "down"]:
-        s += _build_help(COMMANDS[cmd])
+    for cmd in ["color", "on", "off", "toggle", "up", "down", "animate"]:
+        s += _build_help(_commands()[cmd])
 
     s += "\n\nBuild-in effects:"
     for cmd in ["blink", "candle", "disco", "pulse", 
                 "rainbow", "hold", "halt"]:
-        s += _build_help(COMMANDS[cmd])
+        s += _build_help(_commands()[cmd])
 
     s += "\n\nTimer commands:"
     for cmd in ["set-timer", "unset-timer", "unset-all-timers", 
                 "set-random", "unset-random", 
                 "fade", "ambient", "wakeup", "doze", "bgr"]:
-        s += _build_help(COMMANDS[cmd])
+        s += _build_help(_commands()[cmd])
 
     s += "\n\nOther commands:"
     for cmd in ["setup", "name", "status", "json", "reset"]:
-        s += _build_help(COMMANDS[cmd])
+        s += _build_help(_commands()[cmd])
 
     s+= "\n"
     
@@ -447,13 +564,13 @@ def _interprete_params(command, cmd_params):
 
         cmd_value = cmd_params.pop(0)
 
-        # handle parameter of type list (range of int values)
-        if type(param_def) in (tuple, list):
+        # handle parameter of type range (allowed int values)
+        if type(param_def) in (range, tuple, list):
             params.append(_interprete_param_array(cmd_def, 
                                                   cmd_value,
                                                   param_def))
             
-        elif type(param_def) in (tuple, str):
+        elif type(param_def) is str:
             params.append(_interprete_param_regex(cmd_def,
                                             cmd_value,
                                             param_def,
@@ -464,13 +581,25 @@ def _interprete_params(command, cmd_params):
 
 
 
+def _interprete_color(cmd_params):
+
+    try:
+        return [str(v) for v in colors.parse(cmd_params[0])]
+    except ValueError:
+        raise HelpException(_build_help(_commands()["color"],
+                                        "ERROR: Unknown color <"
+                                        + cmd_params[0] + ">:"))
+
+
+
+
 def _interprete_command(cmd):
-    if cmd not in COMMANDS:
+    if cmd not in _commands():
         raise HelpException(_help()
                         + "\n\n ERROR: Invalid command <"
                         + cmd + ">\n")
 
-    return COMMANDS[cmd]
+    return _commands()[cmd]
 
 
 
@@ -480,11 +609,618 @@ def _parse_to_datetime(s_time):
     if s_time == None:
         return None
 
-    elif type(s_time) is int:
+    elif type(s_time) is int or s_time.isdigit():
         return datetime.now() + timedelta(minutes = int(s_time))
 
+    # next occurrence of hh:mm
+    now = datetime.now()
+    _time = datetime.strptime(s_time, "%H:%M")
+    _time = now.replace(hour = _time.hour, minute = _time.minute,
+                        second = 0, microsecond = 0)
+
+    return _time if _time > now else _time + timedelta(days = 1)
+
+
+
+
+def _program(bulb, cmd, params):
+
+    from playbulb import program
+
+    minutes = int(params.pop(0))
+
+    # a fade starts from the color the bulb shows
+    color = None
+
+    if cmd == "fade":
+        keyframes = program.fade(minutes, params)
+        start = None
+
+    else:
+        start = _parse_to_datetime(params.pop(0))
+
+        if cmd == "wakeup":
+            keyframes = program.wakeup(minutes)
+
+        elif cmd == "doze":
+            keyframes = program.doze(minutes)
+
+        else:
+            brightness = params.pop(0)
+            brightness = 255 if brightness is None else int(brightness)
+            if brightness not in _BYTE:
+                raise HelpException(_build_help(_commands()[cmd],
+                           "ERROR: Value <" + str(brightness)
+                           + "> is out of allowed range:"))
+
+            keyframes = program.bgr(minutes, brightness)
+
+        color = program.first(keyframes)
+
+    steps = program.compile(keyframes, start)
+
+    # the cli cannot wait for timers to fire in order to refill them
+    if len(steps) > program._SLOTS:
+        raise HelpException(_build_help(_commands()[cmd],
+                            "ERROR: Program needs " + str(len(steps))
+                            + " timers, the bulb has "
+                            + str(program._SLOTS)
+                            + ". Use the scheduler service for longer"
+                            + " programs:"))
+
+    return program.load(bulb, steps, color = color)
+
+
+
+
+def _registry():
+
+    global _REGISTRY
+
+    # one registry, so concurrent setups share its lock
+    if _REGISTRY is None:
+        from playbulb import registry
+        _REGISTRY = registry.Registry(_KNOWN_BULBS_FILE)
+
+    return _REGISTRY
+
+
+
+
+def _bulb(target, cmd = None):
+
+    # set up bulbs discover their characteristics again
+    if cmd == "setup":
+        return Bulb(mac = _registry().mac(target), rediscover = True)
+
+    return _registry().bulb(target)
+
+
+
+
+def _setup(bulb, alias):
+
+    if not bulb.sync(Bulb.INIT_DEVICE, True):
+        raise IOError("bulb <%s> is not reachable"
+                      % bulb.bulb[Bulb._DEV_MAC])
+
+    from playbulb import registry
+    _registry().put(registry.profile(bulb), alias)
+
+    return "%s %s %s" % (bulb.bulb[Bulb._DEV_MAC],
+                         alias if alias is not None else "-",
+                         bulb.bulb[Bulb._DEV_NAME])
+
+
+
+
+def _targets(arg):
+
+    _registry_ = _registry()
+
+    macs = []
+    for target in arg.split(","):
+        if target == "all":
+            found = [p["mac"] for p in _registry_.profiles()]
+        else:
+            try:
+                found = _registry_.group(target) or [_registry_.mac(target)]
+            except ValueError as e:
+                raise HelpException("\n ERROR: %s, neither alias, group "
+                                    "nor mac address\n" % str(e))
+
+        macs += [mac for mac in found if mac not in macs]
+
+    return macs
+
+
+
+
+def _group(args):
+
+    if len(args) == 0 or len(args) > 2:
+        raise HelpException("\n ERROR: group <name> [<targets>] expected\n")
+
+    _registry().set_group(args[0], _targets(args[1])
+                          if len(args) > 1 else [])
+
+    return True
+
+
+
+
+def _fleet(args):
+
+    import json
+    from playbulb.group import BulbGroup
+    from playbulb.pool import BulbPool
+
+    if len(args) > 2:
+        raise HelpException("\n ERROR: fleet [<targets>] [<seconds>] "
+                            + "expected\n")
+
+    targets = _targets(args[0] if len(args) > 0 else "all")
+    deadline = float(args[1]) if len(args) > 1 \
+        else BulbGroup.DEFAULT_DEADLINE
+
+    group = BulbGroup(targets,
+                      pool = BulbPool(size = len(targets),
+                                      factory = _registry().bulb),
+                      workers = _BATCH_WORKERS)
+    result = group.status(deadline = deadline)
+
+    for mac, state in result.states.items():
+        print(json.dumps({
+            "target" : mac,
+            "stale"  : mac in result.stale,
+            "age"    : result.stale.get(mac, 0.0),
+            "error"  : str(result.errors[mac]) if mac in result.errors
+            else None,
+            "state"  : state
+        }, separators = (",", ":"), sort_keys = True), flush = True)
+
+    # bulbs which have failed are done, the others have missed the
+    # deadline and are not waited for, pending ones are cancelled
+    group.close(wait = all(mac in result.errors for mac in result.stale))
+
+    return len(result.stale) == 0
+
+
+
+
+def _watch(args):
+
+    import threading
+    from playbulb import watch
+
+    if len(args) == 0 or len(args) > 2:
+        raise HelpException("\n ERROR: watch <targets> [<seconds>] "
+                            + "expected\n")
+
+    interval = float(args[1]) if len(args) > 1 \
+        else watch.Watcher.DEFAULT_INTERVAL
+
+    lock = threading.Lock()
+    watchers = []
+
+    def _run(mac, watcher):
+        for line in watch.lines(watcher, mac):
+            with lock:
+                print(line, flush = True)
+
+    threads = []
+    for mac in _targets(args[0]):
+        watcher = watch.Watcher(_registry().bulb(mac), interval)
+        watchers.append(watcher)
+        threads.append(threading.Thread(target = _run,
+                                        args = (mac, watcher),
+                                        daemon = True))
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        for watcher in watchers:
+            watcher.stop()
+
+    return True
+
+
+
+
+def _export(args):
+
+    from playbulb import snapshot
+
+    if len(args) > 2:
+        raise HelpException("\n ERROR: export [<targets>] [<file>] "
+                            + "expected\n")
+
+    targets = _targets(args[0] if len(args) > 0 else "all")
+
+    if len(args) < 2 or args[1] == "-":
+        return snapshot.export(targets, sys.stdout, _BATCH_WORKERS,
+                               _registry().bulb)
+
+    with open(args[1], "w") as _file:
+        return snapshot.export(targets, _file, _BATCH_WORKERS,
+                               _registry().bulb)
+
+
+
+
+def _import(args):
+
+    from playbulb import snapshot
+
+    if len(args) > 1:
+        raise HelpException("\n ERROR: import [<file>] expected\n")
+
+    _file = sys.stdin if len(args) == 0 or args[0] == "-" \
+        else open(args[0], "r")
+
+    ok = True
+    try:
+        for result in snapshot.restore(_file, _BATCH_WORKERS,
+                                       factory = _registry().bulb):
+            print("%s %s" % (result.mac,
+                             "%i writes" % result.writes
+                             if result.error is None
+                             else "ERROR: " + str(result.error)),
+                  flush = True)
+            ok = ok and result.error is None
+    finally:
+        if _file is not sys.stdin:
+            _file.close()
+
+    return ok
+
+
+
+
+def _perform_one(mac, cmd, params):
+
+    reply = _request_daemon(mac, cmd, params)
+    if reply is None:
+        return _execute(_bulb(mac, cmd), cmd, params)
+
+    if not reply["ok"]:
+        raise IOError(reply["error"])
+
+    return reply["output"]
+
+
+
+
+def _perform_many(targets, cmd, params, ndjson):
+
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures import as_completed
+
+    ok = True
+
+    with ThreadPoolExecutor(max_workers = min(len(targets),
+                                              _BATCH_WORKERS)) as executor:
+        futures = OrderedDict(
+            (executor.submit(_perform_one, mac, cmd, list(params)), mac)
+            for mac in targets)
+
+        # streamed as done or in the order of the targets
+        for future in (as_completed(futures) if ndjson else futures):
+            mac = futures[future]
+            try:
+                output = future.result()
+                error = None
+            except Exception as e:
+                output = None
+                error = str(e)
+                ok = False
+
+            if ndjson:
+                if cmd == "json" and output is not None:
+                    output = json.loads(output)
+
+                print(json.dumps({
+                    "target" : mac,
+                    "ok"     : error is None,
+                    "output" : output,
+                    "error"  : error
+                }, separators = (",", ":")), flush = True)
+
+            else:
+                print("%s %s" % (mac, "ok" if error is None
+                                 else "ERROR: " + error))
+                if output is not None:
+                    print(output)
+
+    return ok
+
+
+
+
+def _parse_command(commands):
+
+    cmd = commands.pop(0)
+    if cmd == "color" and len(commands) == 1:
+        commands = _interprete_color(commands)
+
+    return cmd, _interprete_params(cmd, commands)
+
+
+
+
+def _failed(bulb, cmd):
+
+    return IOError("bulb <%s> has failed to %s, it may not be reachable"
+                   % (bulb.bulb[Bulb._DEV_MAC], cmd))
+
+
+
+
+def _execute(bulb, cmd, params):
+
+    if cmd in ["json", "status"]:
+        if not bulb.sync(  Bulb.INIT_COLOR 
+                         + Bulb.INIT_DEVICE
+                         + Bulb.INIT_EFFECT
+                         + Bulb.INIT_TIMER
+                         + Bulb.INIT_RANDOM, 
+                         True):
+            raise _failed(bulb, cmd)
+
+    ok = True
+
+    # status to json
+    if cmd == "json":
+        return bulb.dump_bulb_to_json()
+    
+    # status to human readable    
+    elif cmd == "status":
+        return bulb.print_bulb()
+    
+    elif cmd == "color":
+        ok = bulb.color(params)
+
+    elif cmd == "on":
+        ok = bulb.on()
+
+    elif cmd == "off":
+        ok = bulb.off()
+
+    elif cmd == "toggle":
+        ok = bulb.toggle()
+
+    elif cmd == "down":
+        ok = bulb.dim(incr = -_DIM_STEP)
+
+    elif cmd == "up":
+        ok = bulb.dim(incr = _DIM_STEP)
+
+    elif cmd == "animate":
+        from playbulb import animation
+        seconds = int(params.pop(0))
+        animation.Animation(bulb).fade(params, seconds)
+
+    elif cmd == "blink":
+        ok = bulb.effect(effect = Bulb.EFFECT_BLINK, 
+                         hold = params.pop(0), 
+                         color = params)
+
+    elif cmd == "candle":
+        ok = bulb.effect(effect = Bulb.EFFECT_CANDLE, 
+                         hold = params.pop(0),
+                         color = params)
+        
+    elif cmd == "disco":
+        ok = bulb.effect(effect = Bulb.EFFECT_DISCO, 
+                         hold = params.pop(0), 
+                         color = params)
+
+    elif cmd == "pulse":
+        ok = bulb.effect(effect=Bulb.EFFECT_PULSE, 
+                         hold = params.pop(0),
+                         color = params)
+
+    elif cmd == "rainbow":
+        ok = bulb.effect(effect = Bulb.EFFECT_RAINBOW, 
+                         hold = params.pop(0),
+                         color = params)
+
+    elif cmd == "set-timer":
+        ok = bulb.set_timer(timer = int(params.pop(0)) - 1, 
+                            start = _parse_to_datetime(params.pop(0)),
+                            minutes = int(params.pop(0)),
+                            color = params)
+
+    elif cmd == "unset-timer":
+        ok = bulb.unset_timer(int(params.pop(0)) - 1)
+    
+    elif cmd == "unset-all-timers":
+        ok = bulb.unset_all_timers()
+   
+    elif cmd == "set-random":
+        ok = bulb.set_random(start = _parse_to_datetime(params.pop(0)),
+                             end = _parse_to_datetime(params.pop(0)), 
+                             run_min = int(params.pop(0)), 
+                             run_max = int(params.pop(0)), 
+                             color = params)
+
+    elif cmd == "unset-random":
+        ok = bulb.unset_random()
+
+    elif cmd == "ambient":
+        ok = bulb.ambient(period = int(params.pop(0)), 
+                          start = _parse_to_datetime(params.pop(0)))
+
+    elif cmd in ["fade", "wakeup", "doze", "bgr"]:
+        ok = _program(bulb, cmd, params)
+
+    elif cmd == "setup":
+        return _setup(bulb, params.pop(0))
+
+    # methods of Bulb return False if the bulb has not taken the command
+    if ok is False:
+        raise _failed(bulb, cmd)
+
+
+
+
+def _batch_lines(filename):
+
+    if filename == "-":
+        lines = sys.stdin.readlines()
     else:
-        return datetime.strptime(s_time, "%H:%M")
+        with open(filename, "r") as _file:
+            lines = _file.readlines()
+
+    # parse everything first, so that a typo does not stop a scene halfway
+    commands = OrderedDict()
+    for i, line in enumerate(lines):
+        args = line.split("#")[0].split()
+        if len(args) == 0:
+            continue
+
+        if len(args) < 2:
+            raise HelpException("\n ERROR: Line " + str(i + 1)
+                                + ": <mac> <command> expected\n")
+
+        try:
+            cmd, params = _parse_command(args[1:])
+        except HelpException as e:
+            raise HelpException("\n ERROR: Line " + str(i + 1) + ":"
+                                + e.message)
+
+        commands.setdefault(args[0], []).append((i, cmd, params))
+
+    return commands
+
+
+
+
+def _batch_bulb(mac, commands):
+
+    # all commands of a bulb on one connection
+    bulb = _bulb(mac, commands[0][1])
+
+    # (line, output, error), a failed bulb fails its remaining lines
+    results = []
+    error = None
+    try:
+        for i, cmd, params in commands:
+            if error is None:
+                try:
+                    results.append((i, _execute(bulb, cmd, params), None))
+                    continue
+                except Exception as e:
+                    error = e
+
+            results.append((i, None, error))
+    finally:
+        bulb.disconnect()
+
+    return results
+
+
+
+
+def _batch(args):
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    commands = _batch_lines(args[0] if len(args) > 0 else "-")
+    if len(commands) == 0:
+        return True
+
+    results = []
+
+    # independent bulbs run concurrently
+    with ThreadPoolExecutor(max_workers = min(len(commands),
+                                              _BATCH_WORKERS)) as executor:
+        futures = OrderedDict(
+            (mac, executor.submit(_batch_bulb, mac, _commands))
+            for mac, _commands in commands.items())
+
+        for mac, future in futures.items():
+            try:
+                results += future.result()
+            except Exception as e:
+                results += [(i, None, e) for i, cmd, params in commands[mac]]
+
+    for i, output, error in sorted(results, key = lambda r: r[0]):
+        if error is not None:
+            sys.stderr.write("ERROR: Line %i: %s\n" % (i + 1, str(error)))
+        elif output is not None:
+            print(output)
+
+    return all(error is None for i, output, error in results)
+
+
+
+
+def _request_daemon(mac, cmd, params):
+
+    if not os.path.exists(DEFAULT_SOCKET):
+        return None
+
+    from playbulb import daemon
+
+    # no daemon listening anymore, connect directly
+    try:
+        return daemon.request(mac, cmd, params, DEFAULT_SOCKET)
+    except (ConnectionError, FileNotFoundError):
+        return None
+
+
+
+
+def _setup_all(args):
+
+    from playbulb import provision
+
+    if len(args) == 0 or len(args) > 3:
+        raise HelpException("\n ERROR: setup <file>|scan [<adapters>] "
+                            + "[<limit>] expected\n")
+
+    if args[0] == "scan":
+        try:
+            bulbs = provision.scan()
+        except Exception as e:
+            sys.stderr.write("ERROR: %s\n" % str(e))
+            return False
+
+    else:
+        if args[0] == "-":
+            lines = sys.stdin.readlines()
+        else:
+            with open(args[0], "r") as _file:
+                lines = _file.readlines()
+
+        # <mac> [<alias>]
+        bulbs = []
+        for line in lines:
+            fields = line.split("#")[0].split()
+            if len(fields) > 0:
+                bulbs.append((fields[0],
+                              fields[1] if len(fields) > 1 else None))
+
+    adapters = args[1].split(",") if len(args) > 1 else ["hci0"]
+    limit = int(args[2]) if len(args) > 2 else provision.DEFAULT_LIMIT
+
+    results = provision.setup(_registry(), bulbs, adapters, limit)
+
+    for result in results:
+        print("%s %-12s %s %6.1fs %s" % (
+            result.mac,
+            result.alias if result.alias is not None else "-",
+            result.hci_device,
+            result.seconds,
+            "ok" if result.error is None else "ERROR: " + str(result.error)))
+
+    return all(result.error is None for result in results)
 
 
 
@@ -495,9 +1231,9 @@ def perform(argv):
         
         # help for specific command
         if len(commands) == 2 and commands[0] == "help" \
-                and commands[1] in COMMANDS:
+                and commands[1] in _commands():
             print(_HEADLINE 
-                  + _build_help(COMMANDS[commands[1]])
+                  + _build_help(_commands()[commands[1]])
                   + "\n")
             return
         
@@ -506,103 +1242,75 @@ def perform(argv):
             print(_help())
             return
         
-        # initialize bulb by name or mac
-        mac = commands.pop(0)
-        
-        bulb = Bulb(mac = mac)
-        cmd = commands.pop(0)
-        params = _interprete_params(cmd, commands)
-        
-        # status to json
-        if cmd == "json":
-            bulb.sync(  Bulb.INIT_COLOR 
-                      + Bulb.INIT_DEVICE
-                      + Bulb.INIT_EFFECT
-                      + Bulb.INIT_TIMER
-                      + Bulb.INIT_RANDOM, 
-                      True)
-            print(bulb.dump_bulb_to_json())
-            return
-        
-        # status to human readable    
-        elif cmd == "status":
-            bulb.sync(  Bulb.INIT_COLOR 
-                      + Bulb.INIT_DEVICE
-                      + Bulb.INIT_EFFECT
-                      + Bulb.INIT_TIMER
-                      + Bulb.INIT_RANDOM, 
-                      True)
-            print(bulb.print_bulb())
+        # named groups of bulbs
+        elif commands[0] == "group":
+            return _group(commands[1:])
+
+        # changes of bulbs as they happen
+        elif commands[0] == "watch":
+            return _watch(commands[1:])
+
+        # state of many bulbs within a deadline
+        elif commands[0] == "fleet":
+            return _fleet(commands[1:])
+
+        # snapshots of many bulbs as json lines
+        elif commands[0] == "export":
+            return _export(commands[1:])
+
+        elif commands[0] == "import":
+            return _import(commands[1:])
+
+        # many commands for many bulbs from file or stdin
+        elif commands[0] == "batch":
+            return _batch(commands[1:])
+
+        # many bulbs from file, stdin or scan
+        elif commands[0] == "setup":
+            return _setup_all(commands[1:])
+
+        # keep bulbs connected for following calls
+        elif commands[0] == "daemon":
+            from playbulb import daemon
+            from playbulb.pool import BulbPool
+            pool = BulbPool(factory = _registry().bulb)
+            try:
+                daemon.Daemon(_execute, *commands[1:2],
+                              pool = pool).serve_forever()
+            except IOError as e:
+                sys.stderr.write("ERROR: %s\n" % str(e))
+                return False
             return
-        
-        elif cmd == "color":
-            bulb.color(*tuple(params))
 
-        elif cmd == "on":
-            bulb.on()
+        # bulbs by mac, alias, group or all
+        ndjson = commands[0] == "--ndjson"
+        if ndjson:
+            commands.pop(0)
 
-        elif cmd == "off":
-            bulb.off()
+        if len(commands) < 2:
+            raise HelpException("\n ERROR: [--ndjson] <targets> <command> "
+                                + "<parameters...> expected\n")
 
-        elif cmd == "toggle":
-            bulb.toggle()
+        target = commands.pop(0)
+        targets = _targets(target)
+        if len(targets) == 0:
+            raise HelpException("\n ERROR: no targets in <%s>\n" % target)
 
-        elif cmd == "down":
-            bulb.dim(factor = .5)
+        cmd, params = _parse_command(commands)
 
-        elif cmd == "up":
-            bulb.dim(factor = 2)
+        if len(targets) != 1 or ndjson:
+            return _perform_many(targets, cmd, params, ndjson)
 
-        elif cmd == "blink":
-            bulb.effect(effect = Bulb.EFFECT_BLINK, 
-                        hold = params.pop(0), 
-                        color = params)
+        try:
+            output = _perform_one(targets[0], cmd, params)
+        except HelpException:
+            raise
+        except Exception as e:
+            sys.stderr.write("ERROR: %s\n" % str(e))
+            return False
 
-        elif cmd == "candle":
-            bulb.effect(effect = Bulb.EFFECT_CANDLE, 
-                        hold = params.pop(0),
-                        color = params)
-            
-        elif cmd == "disco":
-            bulb.effect(effect = Bulb.EFFECT_DISCO, 
-                        hold = params.pop(0), 
-                        color = params)
-
-        elif cmd == "pulse":
-            bulb.effect(effect=Bulb.EFFECT_PULSE, 
-                        hold = params.pop(0),
-                        color = params)
-
-        elif cmd == "rainbow":
-            bulb.effect(effect = Bulb.EFFECT_RAINBOW, 
-                        hold = params.pop(0),
-                        color = params)
-
-        elif cmd == "set-timer":
-            bulb.set_timer(timer = int(params.pop(0)) - 1, 
-                        start = _parse_to_datetime(params.pop(0)),
-                        minutes = int(params.pop(0)),
-                        color = params)
-
-        elif cmd == "unset-timer":
-            bulb.unset_timer(int(params.pop(0)) - 1)
-        
-        elif cmd == "unset-all-timers":
-            bulb.unset_all_timers()
-       
-        elif cmd == "set-random":
-            bulb.set_random(start = _parse_to_datetime(params.pop(0)),
-                            end = _parse_to_datetime(params.pop(0)), 
-                            run_min = int(params.pop(0)), 
-                            run_max = int(params.pop(0)), 
-                            color = params)
-
-        elif cmd == "unset-random":
-            bulb.unset_random()
-
-        elif cmd == "ambient":
-            bulb.ambient(period = int(params.pop(0)), 
-                         start = _parse_to_datetime(params.pop(0)))
+        if output is not None:
+            print(output)
 
 
 
@@ -610,7 +1318,12 @@ def perform(argv):
 if __name__ == "__main__":
  
     try:
-        perform(sys.argv)
+        if perform(sys.argv) is False:
+
+            # do not join workers left behind, e.g. by fleet at its deadline
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(1)
 
     except HelpException as e:
         print(e.message)
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Host-side animations streamed as color frames to a bulb.
+
+Frames are scheduled against a monotonic clock relative to the start of
+the animation, so long fades do not drift. Colors are interpolated in
+perceived lightness, so fades look even. If writing a frame takes
+longer than a frame period, the frames that are already stale are
+dropped and the animation continues with the frame that is due now.
+
+The CLI command animate streams a fade with it. The CLI command fade
+and the other programs are compiled onto the timers of the bulb instead,
+see playbulb.program, and need no connection while they run.
+"""
+
+from collections import namedtuple
+import math
+import threading
+import time
+
+from playbulb import colormath
+from playbulb.mipow import Bulb
+
+
+AnimationStats = namedtuple("AnimationStats",
+                            ["frames", "dropped", "fps", "jitter", "late"])
+
+
+
+
+def interpolate(keyframes, t):
+
+    # the end wins, so an animation of no time shows its last color
+    if t >= keyframes[-1][0]:
+        return list(keyframes[-1][1])
+
+    if t <= keyframes[0][0]:
+        return list(keyframes[0][1])
+
+    for (t0, c0), (t1, c1) in zip(keyframes, keyframes[1:]):
+        if t < t1:
+            x = float(t - t0) / (t1 - t0)
+            return colormath.perceptual_blend([c0], [c1], x)[0]
+
+
+
+
+class Animation():
+
+    DEFAULT_FPS = 10
+
+    def __init__(self, bulb, fps = DEFAULT_FPS, clock = time.monotonic):
+
+        self._bulb = bulb
+        self._fps = fps
+        self._clock = clock
+        self._stop = threading.Event()
+
+
+
+
+    def stop(self):
+        self._stop.set()
+
+
+
+
+    def fade(self, color, seconds, start = None):
+
+        if start is None:
+            if not self._bulb.sync(Bulb.INIT_COLOR, False):
+                self._lost()
+            start = self._bulb.bulb[Bulb._COLOR]
+
+        return self.play([(0, start), (seconds, color)])
+
+
+
+
+    def play(self, keyframes, frame = interpolate):
+
+        self._stop.clear()
+
+        duration = keyframes[-1][0]
+        period = 1.0 / self._fps
+        last = None
+
+        frames = 0
+        dropped = 0
+        lateness = []
+
+        begin = self._clock()
+        index = 0
+
+        while index * period < duration and not self._stop.is_set():
+
+            target = index * period
+            delay = target - (self._clock() - begin)
+            if delay > 0 and self._stop.wait(delay):
+                break
+
+            lateness.append(self._clock() - begin - target)
+
+            color = frame(keyframes, target)
+            if color != last:
+                if self._bulb.color(color) is False:
+                    self._lost()
+                last = color
+                frames += 1
+
+            # skip frames which are already due because the link is slow
+            index += 1
+            due = int((self._clock() - begin) / period)
+            if due > index:
+                dropped += due - index
+                index = due
+
+        # the last frame is due at the end, not a period after the one before
+        delay = duration - (self._clock() - begin)
+        if not self._stop.is_set() \
+                and not (delay > 0 and self._stop.wait(delay)):
+            color = frame(keyframes, duration)
+            if color != last:
+                if self._bulb.color(color) is False:
+                    self._lost()
+                frames += 1
+
+        elapsed = self._clock() - begin
+
+        return AnimationStats(
+            frames = frames,
+            dropped = dropped,
+            fps = frames / elapsed if elapsed > 0 else 0.0,
+            jitter = Animation._stddev(lateness),
+            late = max(lateness) if lateness else 0.0)
+
+
+
+
+    def _lost(self):
+
+        raise IOError("bulb <%s> is not reachable"
+                      % self._bulb.bulb[Bulb._DEV_MAC])
+
+
+
+
+    @staticmethod
+    def _stddev(values):
+
+        if len(values) < 2:
+            return 0.0
+
+        mean = sum(values) / len(values)
+        return math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
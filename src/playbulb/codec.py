@@ -0,0 +1,132 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Binary layouts of the playbulb characteristics.
+
+Encoders return bytes, decoders accept anything supporting the buffer
+protocol (bytes, bytearray, memoryview) and return tuples. Times are
+(hour, minute) and colors (white, red, green, blue).
+"""
+
+import struct
+
+
+# color: w r g b
+_COLOR = struct.Struct("4B")
+
+# effect: w r g b, effect, 0, hold, 0
+_EFFECT = struct.Struct("4BBxBx")
+
+# timer write: slot, type, now (s m h), setter, start (m h), w r g b, runtime
+_TIMER = struct.Struct("8B4BB")
+
+# timer read: 4 x (type, start h m), now (h m)
+_TIMER_SLOT = struct.Struct("3B")
+_TIMER_TIME = struct.Struct("12x2B")
+
+# timer effect read: 4 x (w r g b, runtime)
+_TIMER_EFFECT_SLOT = struct.Struct("4BB")
+
+# random mode write: now (s m h), start (h m), stop (h m), min, max, w r g b
+_RANDOM = struct.Struct("3B2B2B2B4B")
+
+# random mode read: status, 2 bytes unused, start (h m), stop (h m),
+# min, max, w r g b
+_RANDOM_READ = struct.Struct("B2x2B2B2B4B")
+
+
+
+
+def encode_color(color):
+    return _COLOR.pack(*color)
+
+
+
+
+def decode_color(buf):
+    return _COLOR.unpack_from(buf)
+
+
+
+
+def encode_effect(color, effect, hold):
+
+    w, r, g, b = color
+    return _EFFECT.pack(w, r, g, b, effect, hold)
+
+
+
+
+def decode_effect(buf):
+
+    w, r, g, b, effect, hold = _EFFECT.unpack_from(buf)
+    return (w, r, g, b), effect, hold
+
+
+
+
+def encode_timer(slot, type_, now, setter, start, color, runtime):
+
+    w, r, g, b = color
+    return _TIMER.pack(slot, type_,
+                       now.second, now.minute, now.hour,
+                       setter, start[1], start[0],
+                       w, r, g, b,
+                       runtime)
+
+
+
+
+def decode_timers(timers, effects):
+
+    slots = []
+    for i in range(4):
+        type_, hour, minute = _TIMER_SLOT.unpack_from(timers, i * 3)
+        w, r, g, b, runtime = _TIMER_EFFECT_SLOT.unpack_from(effects, i * 5)
+        slots.append((type_, (hour, minute), (w, r, g, b), runtime))
+
+    return _TIMER_TIME.unpack_from(timers), slots
+
+
+
+
+def encode_random(now, start, stop, run_min, run_max, color):
+
+    w, r, g, b = color
+    return _RANDOM.pack(now.second, now.minute, now.hour,
+                        start[0], start[1],
+                        stop[0], stop[1],
+                        run_min, run_max,
+                        w, r, g, b)
+
+
+
+
+def decode_random(buf):
+
+    status, sh, sm, eh, em, run_min, run_max, w, r, g, b \
+        = _RANDOM_READ.unpack_from(buf)
+    return status, (sh, sm), (eh, em), run_min, run_max, (w, r, g, b)
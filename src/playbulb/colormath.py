@@ -0,0 +1,276 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Batched color math over N x 4 wrgb colors.
+
+Every operation takes a list of colors, one [w, r, g, b] per bulb, and
+returns a new one with values clamped to 0 - 255. Factors, offsets and
+blend positions are either one number for all bulbs or one per bulb.
+
+Perceptual brightness uses CIE 1976 lightness: LIGHTNESS maps a channel
+value to one of 256 evenly perceived levels and LUMINANCE maps a level
+back. Both tables, like the gamma tables, are computed once so that
+conversions are plain lookups.
+
+If the colors are passed as a numpy array, the operation runs
+vectorized on numpy and returns an uint8 array. numpy is never imported
+here, so plain lists keep the command line start fast.
+"""
+
+import functools
+import itertools
+import sys
+
+
+# CIE constants
+_EPSILON = 216 / 24389.0
+_KAPPA = 24389 / 27.0
+
+
+
+
+def _lightness_table():
+
+    table = []
+    for v in range(256):
+        y = v / 255.0
+        l = 116.0 * y ** (1 / 3.0) - 16 if y > _EPSILON else _KAPPA * y
+        table.append(int(round(l * 2.55)))
+
+    return tuple(table)
+
+
+
+
+def _luminance_table():
+
+    table = []
+    for level in range(256):
+        l = level / 2.55
+        y = ((l + 16) / 116.0) ** 3 if l > _KAPPA * _EPSILON else l / _KAPPA
+        table.append(int(round(y * 255)))
+
+    return tuple(table)
+
+
+
+
+LIGHTNESS = _lightness_table()
+LUMINANCE = _luminance_table()
+
+
+
+
+@functools.lru_cache(maxsize = 32)
+def _gamma_table(exponent):
+    return tuple(int(round(255.0 * (v / 255.0) ** exponent))
+                 for v in range(256))
+
+
+
+
+@functools.lru_cache(maxsize = 32)
+def _array(np, table):
+    return np.asarray(table, dtype = np.uint8)
+
+
+
+
+def _numpy(colors):
+
+    np = sys.modules.get("numpy", None)
+    if np is not None and isinstance(colors, np.ndarray):
+        return np
+
+    return None
+
+
+
+
+def _per_row(np, values):
+
+    values = np.asarray(values, dtype = float)
+    return values[:, None] if values.ndim == 1 else values
+
+
+
+
+def _per_color(values):
+
+    if isinstance(values, (int, float)):
+        return itertools.repeat(values)
+
+    return values
+
+
+
+
+def _clamp(v):
+    return 255 if v > 255 else 0 if v < 0 else int(v)
+
+
+
+
+def _indices(np, values):
+
+    # as _clamp, float values, e.g. of blend(), are cut to table indices
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+
+
+def clamp(colors):
+
+    np = _numpy(colors)
+    if np is not None:
+        return np.clip(colors, 0, 255).astype(np.uint8)
+
+    return [[_clamp(v) for v in color] for color in colors]
+
+
+
+
+def scale(colors, factor):
+
+    np = _numpy(colors)
+    if np is not None:
+        return np.clip(colors * _per_row(np, factor),
+                       0, 255).astype(np.uint8)
+
+    return [[_clamp(v * f) for v in color]
+            for color, f in zip(colors, _per_color(factor))]
+
+
+
+
+def offset(colors, incr):
+
+    np = _numpy(colors)
+    if np is not None:
+        return np.clip(colors.astype(int) + _per_row(np, incr),
+                       0, 255).astype(np.uint8)
+
+    return [[_clamp(v + i) for v in color]
+            for color, i in zip(colors, _per_color(incr))]
+
+
+
+
+def _lookup(colors, table):
+
+    np = _numpy(colors)
+    if np is not None:
+        return _array(np, table)[_indices(np, colors)]
+
+    return [[table[_clamp(v)] for v in color] for color in colors]
+
+
+
+
+def gamma(colors, exponent):
+
+    if isinstance(exponent, (int, float)):
+        return _lookup(colors, _gamma_table(float(exponent)))
+
+    np = _numpy(colors)
+    if np is not None:
+        return np.rint(255.0 * (_indices(np, colors) / 255.0)
+                       ** _per_row(np, exponent)).astype(np.uint8)
+
+    return [[_gamma_table(float(e))[_clamp(v)] for v in color]
+            for color, e in zip(colors, exponent)]
+
+
+
+
+def lightness(colors):
+    return _lookup(colors, LIGHTNESS)
+
+
+
+
+def luminance(colors):
+    return _lookup(colors, LUMINANCE)
+
+
+
+
+def level(colors):
+
+    np = _numpy(colors)
+    if np is not None:
+        return _array(np, LIGHTNESS)[_indices(np, colors).max(axis = 1)]
+
+    return [LIGHTNESS[_clamp(max(color))] for color in colors]
+
+
+
+
+def at_level(colors, levels):
+
+    np = _numpy(colors)
+    if np is not None:
+        colors = _indices(np, colors).astype(int)
+        levels = _indices(np, levels)
+        if levels.ndim == 0:
+            levels = np.full(len(colors), levels)
+
+        # rounded in integers like the lists
+        target = _array(np, LUMINANCE)[levels].astype(int)[:, None]
+        peak = colors.max(axis = 1)[:, None]
+        return ((colors * target + peak // 2)
+                // np.maximum(peak, 1)).astype(np.uint8)
+
+    # keep the hue, scale the brightest channel to the level
+    result = []
+    for color, _level in zip(colors, _per_color(levels)):
+        color = [_clamp(v) for v in color]
+        peak = max(color)
+        target = LUMINANCE[_clamp(_level)]
+        result.append([(v * target + peak // 2) // peak if peak else 0
+                       for v in color])
+
+    return result
+
+
+
+
+def perceptual_blend(colors1, colors2, x):
+    return luminance(blend(lightness(colors1), lightness(colors2), x))
+
+
+
+
+def blend(colors1, colors2, x):
+
+    np = _numpy(colors1)
+    if np is not None:
+        colors1 = colors1.astype(float)
+        return np.clip(np.rint(colors1 + (np.asarray(colors2) - colors1)
+                               * _per_row(np, x)), 0, 255).astype(np.uint8)
+
+    return [[_clamp(round(a + (b - a) * _x)) for a, b in zip(c1, c2)]
+            for c1, c2, _x in zip(colors1, colors2, _per_color(x))]
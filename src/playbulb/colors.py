@@ -0,0 +1,223 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Conversion of color temperature, hsv, hex, rgb and named colors to wrgb.
+
+The grey part of an rgb color, i.e. the minimum of red, green and blue,
+is moved to the white led of the bulb, which is brighter and renders
+white more naturally than mixing it.
+
+parse() accepts:
+
+    [w, r, g, b]            as it is
+    [r, g, b]               rgb
+    "#rrggbb", "#wwrrggbb"  hex
+    "2700K"                 color temperature in Kelvin
+    "hsv(30, 1.0, 0.5)"     hue 0 - 360, saturation and value 0 - 1
+    "warmwhite"             name, see NAMES and warmwhite, coldwhite,
+                            daylight
+
+Color temperatures are looked up in a table with a resolution of 100K
+and hues in a table of full degrees, both built on first use. Parsed
+strings are memoized.
+"""
+
+import functools
+import math
+import re
+
+
+NAMES = {
+    "off"       : [0, 0, 0, 0],
+    "black"     : [0, 0, 0, 0],
+    "white"     : [255, 0, 0, 0],
+    "red"       : [0, 255, 0, 0],
+    "yellow"    : [0, 255, 255, 0],
+    "green"     : [0, 0, 255, 0],
+    "cyan"      : [0, 0, 255, 255],
+    "blue"      : [0, 0, 0, 255],
+    "magenta"   : [0, 255, 0, 255],
+    "orange"    : [0, 255, 47, 0],
+    "purple"    : [0, 128, 0, 128],
+    "pink"      : [0, 255, 20, 147]
+}
+
+_ALIASES = {
+    "warmwhite" : "2700K",
+    "coldwhite" : "6500K",
+    "daylight"  : "5500K"
+}
+
+_KELVIN_MIN = 1000
+_KELVIN_MAX = 40000
+_KELVIN_STEP = 100
+
+_HSV = re.compile(r"^hsv\(\s*([0-9.]+)\s*,\s*([0-9.]+)\s*,\s*([0-9.]+)\s*\)$")
+_KELVIN = re.compile(r"^([0-9]+)\s*[kK]$")
+_HEX = re.compile(r"^#([0-9a-fA-F]{6}|[0-9a-fA-F]{8})$")
+
+
+
+
+def from_rgb(r, g, b):
+
+    w = min(r, g, b)
+    return [w, r - w, g - w, b - w]
+
+
+
+
+def _clamp(v):
+    return int(round(max(0.0, min(255.0, v))))
+
+
+
+
+def _kelvin_to_rgb(kelvin):
+
+    # approximation of the black body curve by Tanner Helland
+    t = kelvin / 100.0
+
+    if t <= 66:
+        r = 255
+        g = 99.4708025861 * math.log(t) - 161.1195681661
+    else:
+        r = 329.698727446 * (t - 60) ** -0.1332047592
+        g = 288.1221695283 * (t - 60) ** -0.0755148492
+
+    if t >= 66:
+        b = 255
+    elif t <= 19:
+        b = 0
+    else:
+        b = 138.5177312231 * math.log(t - 10) - 305.0447927307
+
+    return _clamp(r), _clamp(g), _clamp(b)
+
+
+
+
+@functools.lru_cache(maxsize = 1)
+def _kelvin_table():
+
+    return [from_rgb(*_kelvin_to_rgb(k))
+            for k in range(_KELVIN_MIN, _KELVIN_MAX + 1, _KELVIN_STEP)]
+
+
+
+
+def from_kelvin(kelvin, brightness = 255):
+
+    kelvin = max(_KELVIN_MIN, min(_KELVIN_MAX, kelvin))
+    color = _kelvin_table()[
+        int(round((kelvin - _KELVIN_MIN) / float(_KELVIN_STEP)))]
+
+    if brightness == 255:
+        return list(color)
+
+    return [(v * brightness + 127) // 255 for v in color]
+
+
+
+
+@functools.lru_cache(maxsize = 1)
+def _hue_table():
+
+    # rgb of the pure hue of each degree, 0.0 - 1.0
+    table = []
+    for h in range(360):
+        x = 1 - abs((h / 60.0) % 2 - 1)
+        table.append([
+            (1, x, 0), (x, 1, 0), (0, 1, x),
+            (0, x, 1), (x, 0, 1), (1, 0, x)][h // 60])
+
+    return table
+
+
+
+
+def from_hsv(h, s, v):
+
+    r, g, b = _hue_table()[int(round(h)) % 360]
+    s = max(0.0, min(1.0, s))
+    v = max(0.0, min(1.0, v)) * 255
+
+    return from_rgb(_clamp(v * (1 - s + s * r)),
+                    _clamp(v * (1 - s + s * g)),
+                    _clamp(v * (1 - s + s * b)))
+
+
+
+
+def from_hex(s):
+
+    value = int(s.lstrip("#"), 16)
+    if len(s.lstrip("#")) == 8:
+        return [value >> 24 & 0xff, value >> 16 & 0xff,
+                value >> 8 & 0xff, value & 0xff]
+
+    return from_rgb(value >> 16 & 0xff, value >> 8 & 0xff, value & 0xff)
+
+
+
+
+@functools.lru_cache(maxsize = 1024)
+def _parse_str(s):
+
+    s = s.strip()
+    s = _ALIASES.get(s.lower(), s)
+
+    if s.lower() in NAMES:
+        return NAMES[s.lower()]
+
+    if _HEX.match(s):
+        return from_hex(s)
+
+    match = _KELVIN.match(s)
+    if match:
+        return from_kelvin(int(match.group(1)))
+
+    match = _HSV.match(s.lower())
+    if match:
+        return from_hsv(*[float(v) for v in match.groups()])
+
+    raise ValueError("unknown color <%s>" % s)
+
+
+
+
+def parse(color):
+
+    if isinstance(color, str):
+        return list(_parse_str(color))
+
+    if len(color) == 3:
+        return from_rgb(*color)
+
+    if len(color) == 4:
+        return list(color)
+
+    raise ValueError("unknown color <%s>" % str(color))
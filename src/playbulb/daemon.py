@@ -0,0 +1,206 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Daemon which keeps bulbs connected and serves commands on a unix socket.
+
+The daemon owns a BulbPool, so bulbs stay connected with their cached
+state, and a command costs a single write instead of a gatttool start
+and a connect.
+
+The protocol is one json object per line in both directions:
+
+    { "mac" : "AF:66:4B:0D:AC:E6", "cmd" : "color", "params" : [...] }
+
+is answered by
+
+    { "ok" : true, "output" : ... }  or  { "ok" : false, "error" : "..." }
+
+A client may send many requests on one connection. Commands are run by
+the handler that the daemon is created with, e.g. the one of mipow_cli,
+so that the daemon understands exactly the commands of the client.
+
+The socket is $MIPOW_SOCKET or mipow.sock in $XDG_RUNTIME_DIR (or /tmp),
+for daemon and clients alike. A bulb whose link fails is disconnected,
+so the next request connects again. A client waits at most
+DEFAULT_TIMEOUT seconds for a reply, so a daemon which hangs does not
+hang its clients.
+
+Importing this module loads nothing but os, so that the command line can
+look up DEFAULT_SOCKET before it knows whether a daemon is running.
+"""
+
+import os
+
+
+DEFAULT_SOCKET = os.environ.get("MIPOW_SOCKET", None) \
+    or os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "mipow.sock")
+
+DEFAULT_TIMEOUT = 30.0
+
+
+
+
+def _server(path, owner):
+
+    import json
+    import socketserver
+
+    class _Handler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+
+            for line in self.rfile:
+                if len(line.strip()) == 0:
+                    continue
+
+                self.wfile.write((json.dumps(self.server.owner.perform(
+                    line.decode("utf-8"))) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+    class _Server(socketserver.ThreadingUnixStreamServer):
+
+        daemon_threads = True
+
+    server = _Server(path, _Handler)
+    server.owner = owner
+
+    return server
+
+
+
+
+class Daemon():
+
+    def __init__(self, handler, path = DEFAULT_SOCKET, pool = None):
+
+        from playbulb.pool import BulbPool
+
+        self._handler = handler
+        self._path = path
+        self._pool = pool if pool is not None else BulbPool()
+        self._server = None
+
+
+
+
+    def perform(self, line):
+
+        import json
+        from gatttool.bledevice import BluetoothLEError
+
+        try:
+            request = json.loads(line)
+            with self._pool.session(request["mac"]) as bulb:
+                try:
+                    output = self._handler(bulb, request["cmd"],
+                                           request.get("params", []))
+
+                # gatttool has lost the bulb, connect again next time
+                except BluetoothLEError:
+                    bulb.disconnect()
+                    raise
+
+            return { "ok" : True, "output" : output }
+
+        except Exception as e:
+            return { "ok" : False, "error" : str(e) }
+
+
+
+
+    def _running(self):
+
+        import socket
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(self._path)
+            return True
+        except (ConnectionError, FileNotFoundError):
+            return False
+        finally:
+            client.close()
+
+
+
+
+    def serve_forever(self):
+
+        if self._running():
+            raise IOError("daemon is already running on <%s>" % self._path)
+
+        # a socket left over by a daemon which has died
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+        self._server = _server(self._path, self)
+        os.chmod(self._path, 0o600)
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.unlink(self._path)
+            self._pool.close()
+
+
+
+
+    def shutdown(self):
+
+        if self._server is not None:
+            self._server.shutdown()
+
+
+
+
+def request(mac, cmd, params, path = DEFAULT_SOCKET,
+            timeout = DEFAULT_TIMEOUT):
+
+    import json
+    import socket
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+        client.sendall((json.dumps({
+            "mac"    : mac,
+            "cmd"    : cmd,
+            "params" : params
+        }) + "\n").encode("utf-8"))
+
+        client.shutdown(socket.SHUT_WR)
+        reply = client.makefile("rb").readline()
+    except socket.timeout:
+        raise IOError("no reply from daemon within %s seconds" % timeout)
+    finally:
+        client.close()
+
+    if len(reply) == 0:
+        raise IOError("no reply from daemon")
+
+    return json.loads(reply.decode("utf-8"))
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Delivery of state changes of bulbs to listeners.
+
+A bulb publishes an Event for each field of its state that has changed,
+see Bulb.subscribe(). Events are not delivered in the thread which has
+changed the bulb but by one dispatcher thread for all bulbs. The
+dispatcher collects the events of a short window and calls each
+listener once with the list of its events, in the order they happened.
+A slow or failing listener therefore neither blocks the bulb nor other
+bulbs' writes.
+"""
+
+from collections import namedtuple
+import queue
+import threading
+import time
+
+
+Event = namedtuple("Event", ["bulb", "field", "old", "new", "time"])
+
+# events within this time are delivered in one batch
+_WINDOW = 0.02
+
+
+
+
+class Dispatcher():
+
+    def __init__(self, window = _WINDOW):
+
+        self._window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+
+
+
+    def publish(self, listeners, events):
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target = self._run,
+                                                daemon = True)
+                self._thread.start()
+
+        self._queue.put((listeners, events))
+
+
+
+
+    def _collect(self):
+
+        items = [self._queue.get()]
+
+        end = time.monotonic() + self._window
+        while True:
+            timeout = end - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout = max(0, timeout)))
+            except queue.Empty:
+                return items
+
+
+
+
+    def _run(self):
+
+        while True:
+            batches = {}
+            order = []
+            for listeners, events in self._collect():
+                for listener, fields in listeners:
+                    _events = [e for e in events
+                               if fields is None or e.field in fields]
+                    if len(_events) == 0:
+                        continue
+
+                    if listener not in batches:
+                        batches[listener] = []
+                        order.append(listener)
+
+                    batches[listener] += _events
+
+            for listener in order:
+                try:
+                    listener(batches[listener])
+                except Exception:
+                    pass
+
+
+
+
+_dispatcher = Dispatcher()
+
+
+
+
+def dispatcher():
+    return _dispatcher
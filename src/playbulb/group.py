@@ -0,0 +1,396 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Group of bulbs which are controlled together.
+
+BulbGroup mirrors the api of Bulb. Each call runs on all bulbs of the
+group concurrently on a bounded thread pool, so a room of bulbs changes
+in about the time of the slowest bulb. Bulbs come from a BulbPool and
+stay connected between calls.
+
+Every call returns a GroupResult with the return value of each bulb and
+the exception of each bulb that failed, both by mac address. A bulb
+which cannot be reached fails with IOError. A failing bulb does not
+stop the others.
+
+commit() applies a state in step on all bulbs. It first measures the
+link latency of each bulb by timed reads, then sends each bulb its
+writes early by its latency, so that all bulbs change at the same
+instant. The writes are acknowledged by the bulbs, which gives the time
+each change has landed and so the skew that has actually been achieved.
+Bulbs which fail are reported as errors and are not part of the skew.
+The skew can only be kept if the group is not larger than the workers.
+
+status() synchronizes all bulbs under a deadline. Bulbs which have not
+been read by then are returned with their cached state, if any, and
+are listed as stale with the age of their last fresh state.
+"""
+
+from collections import OrderedDict
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import copy
+import time
+
+from playbulb.mipow import Bulb
+from playbulb.mipow import Plan
+from playbulb.pool import BulbPool
+
+
+GroupResult = namedtuple("GroupResult", ["results", "errors"])
+
+CommitResult = namedtuple("CommitResult",
+                          ["results", "errors", "latency", "skew"])
+
+StatusResult = namedtuple("StatusResult", ["states", "stale", "errors"])
+
+SYNC_ALL = Bulb.INIT_COLOR + Bulb.INIT_DEVICE + Bulb.INIT_EFFECT \
+    + Bulb.INIT_TIMER + Bulb.INIT_RANDOM
+
+# time to hand the writes over to the workers
+_LEAD = 0.05
+
+# weight of a new latency sample against the previous ones
+_ALPHA = 0.5
+
+# probe at most this many times the requested probes
+_MAX_PROBES = 4
+
+
+
+
+class BulbGroup():
+
+    DEFAULT_WORKERS = 8
+    DEFAULT_SKEW = 0.02
+    DEFAULT_DEADLINE = 5.0
+
+    def __init__(self, macs, pool = None, workers = DEFAULT_WORKERS):
+
+        self.macs = list(macs)
+        self._pool = pool if pool is not None else BulbPool(
+            size = max(len(self.macs), BulbPool.DEFAULT_SIZE))
+        self._executor = ThreadPoolExecutor(max_workers = workers)
+        self._latency = {}
+        self._synced = {}
+
+
+
+
+    def _call(self, mac, name, args, kwargs):
+
+        with self._pool.session(mac) as bulb:
+            result = getattr(bulb, name)(*args, **kwargs)
+
+        # methods of Bulb return False if the bulb is not reachable
+        # or has not taken a verified change
+        if result is False:
+            raise IOError("%s of bulb <%s> has failed" % (name, mac))
+
+        return result
+
+
+
+
+    def call(self, name, *args, **kwargs):
+
+        futures = OrderedDict(
+            (mac, self._executor.submit(self._call, mac, name, args, kwargs))
+            for mac in self.macs)
+
+        results, errors = self._wait(futures)
+
+        return GroupResult(results = results, errors = errors)
+
+
+
+
+    def _wait(self, futures):
+
+        results = OrderedDict()
+        errors = OrderedDict()
+        for mac, future in futures.items():
+            try:
+                results[mac] = future.result()
+            except Exception as e:
+                errors[mac] = e
+
+        return results, errors
+
+
+
+
+    def _learn(self, mac, latency):
+
+        if mac in self._latency:
+            latency = _ALPHA * latency + (1 - _ALPHA) * self._latency[mac]
+
+        self._latency[mac] = latency
+
+
+
+
+    def _prepare(self, mac, state, skew, probes):
+
+        with self._pool.session(mac) as bulb:
+
+            # a read is a round trip, half of it is the way to the bulb.
+            # Probe more often while the link is too jittery for the skew.
+            rtts = []
+            while len(rtts) < probes or (max(rtts) - min(rtts)) / 2 > skew \
+                    and len(rtts) < probes * _MAX_PROBES:
+                sent = time.monotonic()
+                if not bulb.sync(Bulb.INIT_COLOR, True):
+                    raise IOError("bulb <%s> is not connected" % mac)
+
+                rtts.append(time.monotonic() - sent)
+
+            self._learn(mac, sorted(rtts)[len(rtts) // 2] / 2)
+
+            # acknowledged writes tell when the bulb got them
+            plan = bulb.plan(state)
+            acked = Plan()
+            acked.state = plan.state
+            acked.sync = plan.sync
+            for write in plan:
+                acked.add(write.characteristic, write.value, True)
+
+            return acked
+
+
+
+
+    def _commit(self, mac, plan, at):
+
+        latency = self._latency[mac]
+
+        with self._pool.session(mac) as bulb:
+
+            # the last of n acknowledged writes arrives 2n - 1 ways later
+            delay = at - (2 * len(plan) - 1) * latency - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            head = Plan()
+            for write in plan.writes[:-1]:
+                head.add(*write)
+
+            if not bulb._execute(head):
+                raise IOError("bulb <%s> is not reachable" % mac)
+
+            last = plan.writes[-1]
+            plan.writes = [last]
+            sent = time.monotonic()
+            if not bulb._execute(plan):
+                raise IOError("bulb <%s> is not reachable" % mac)
+
+            rtt = time.monotonic() - sent
+
+            self._learn(mac, rtt / 2)
+
+            return sent + rtt / 2 - at
+
+
+
+
+    def commit(self, state, skew = DEFAULT_SKEW, probes = 3):
+
+        futures = OrderedDict(
+            (mac, self._executor.submit(self._prepare, mac, state, skew,
+                                        probes))
+            for mac in self.macs)
+
+        plans, errors = self._wait(futures)
+
+        results = OrderedDict((mac, None) for mac, plan in plans.items()
+                              if len(plan) == 0)
+        plans = OrderedDict((mac, plan) for mac, plan in plans.items()
+                            if len(plan) > 0)
+
+        if len(plans) == 0:
+            return CommitResult(results = results, errors = errors,
+                                latency = dict(self._latency), skew = 0.0)
+
+        lead = max((2 * len(plan) - 1) * self._latency[mac]
+                   for mac, plan in plans.items())
+        at = time.monotonic() + lead + _LEAD
+
+        # the bulb that has to start first is handed over first
+        order = sorted(plans, key = lambda mac: (2 * len(plans[mac]) - 1)
+                       * -self._latency[mac])
+
+        futures = OrderedDict(
+            (mac, self._executor.submit(self._commit, mac, plans[mac], at))
+            for mac in order)
+
+        landed, failed = self._wait(futures)
+        errors.update(failed)
+        results.update(landed)
+
+        return CommitResult(
+            results = OrderedDict((mac, results[mac]) for mac in self.macs
+                                  if mac in results),
+            errors = errors,
+            latency = dict((mac, self._latency[mac]) for mac in self.macs
+                           if mac in self._latency),
+            skew = max(landed.values()) - min(landed.values())
+            if landed else 0.0)
+
+
+
+
+    def sync(self, level, force = True):
+        return self.call("sync", level, force)
+
+
+
+
+    def _status(self, mac, level):
+
+        with self._pool.session(mac) as bulb:
+            if not bulb.sync(level, True):
+                raise IOError("bulb <%s> is not reachable" % mac)
+
+            self._synced[mac] = time.monotonic()
+            return copy.deepcopy(bulb.bulb)
+
+
+
+
+    def _cached(self, mac):
+
+        bulb = self._pool.bulbs().get(mac, None)
+        if bulb is None or bulb.bulb[Bulb._SYNC] == 0:
+            return None
+
+        # may be synchronized just now by a late worker, it is stale anyway
+        try:
+            return copy.deepcopy(bulb.bulb)
+        except RuntimeError:
+            return None
+
+
+
+
+    def status(self, level = SYNC_ALL, deadline = DEFAULT_DEADLINE):
+
+        end = time.monotonic() + deadline
+
+        futures = OrderedDict(
+            (mac, self._executor.submit(self._status, mac, level))
+            for mac in self.macs)
+
+        wait(futures.values(), timeout = max(0, end - time.monotonic()))
+
+        states = OrderedDict()
+        stale = OrderedDict()
+        errors = OrderedDict()
+        now = time.monotonic()
+
+        for mac, future in futures.items():
+
+            # bulbs which have not been reached yet are not tried anymore
+            if future.cancel() or not future.done():
+                states[mac] = self._cached(mac)
+                stale[mac] = now - self._synced[mac] \
+                    if mac in self._synced else None
+
+            elif future.exception() is not None:
+                errors[mac] = future.exception()
+                states[mac] = self._cached(mac)
+                stale[mac] = now - self._synced[mac] \
+                    if mac in self._synced else None
+
+            else:
+                states[mac] = future.result()
+
+        return StatusResult(states = states, stale = stale, errors = errors)
+
+
+
+
+    def apply(self, state, verify = True):
+        return self.call("apply", state, verify)
+
+
+
+
+    def color(self, color = None):
+        return self.call("color", color)
+
+
+
+
+    def on(self):
+        return self.call("on")
+
+
+
+
+    def off(self):
+        return self.call("off")
+
+
+
+
+    def toggle(self):
+        return self.call("toggle")
+
+
+
+
+    def dim(self, incr = None, factor = None):
+        return self.call("dim", incr, factor)
+
+
+
+
+    def effect(self, effect = Bulb.EFFECT_HALT, hold = 255, color = None):
+        return self.call("effect", effect, hold, color)
+
+
+
+
+    def set_timer(self, timer = 1, start = None, minutes = 0,
+                  color = Bulb.COLOR_WHITE):
+        return self.call("set_timer", timer, start, minutes, color)
+
+
+
+
+    def unset_timer(self, timer):
+        return self.call("unset_timer", timer)
+
+
+
+
+    def close(self, wait = True):
+
+        # without waiting, bulbs still in progress are left to the caller
+        self._executor.shutdown(wait = wait, cancel_futures = not wait)
+        if wait:
+            self._pool.close()
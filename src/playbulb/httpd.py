@@ -0,0 +1,387 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Local HTTP server with a json api for bulbs and groups of bulbs.
+
+    GET  /bulbs/<mac>       state of a bulb, see Bulb.dump_bulb_to_json()
+    GET  /groups/<name>     states of all bulbs of a group by mac
+    POST /bulbs/<mac>       run a command on a bulb
+    POST /groups/<name>     run a command on all bulbs of a group
+    POST /batch             run a list of commands, each with a "target"
+
+A command is either a (partial) desired state, see Bulb.apply(), or a
+call of a method of the bulb:
+
+    { "state" : { "Color" : [ 0, 255, 0, 0 ] } }
+    { "call" : "effect", "args" : [ 4, 10, [ 0, 0, 0, 255 ] ] }
+    { "target" : "living", "call" : "off" }
+
+States are served from the cached state of the bulb, a bulb is only
+read when it has not been synchronized yet or if ?sync=1 is given.
+Every state has an ETag, so polling with If-None-Match is answered with
+304 without a body as long as nothing has changed.
+
+Commands are answered per bulb with { "ok" : true, "result" : ... } or
+{ "ok" : false, "error" : "..." }, e.g. if a bulb is not reachable. The
+status is 502 if any command has failed.
+
+Connections are kept alive (HTTP/1.1). Commands of a batch are grouped
+by bulb and run on one connection per bulb, bulbs run concurrently.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import json
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+from playbulb import service
+
+
+_SYNC_ALL = Bulb.INIT_COLOR + Bulb.INIT_DEVICE + Bulb.INIT_EFFECT \
+    + Bulb.INIT_TIMER + Bulb.INIT_RANDOM
+
+
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        self.status = status
+        self.message = message
+
+
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    # keep-alive
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+
+
+
+    def _send(self, status, body = None, etag = None):
+
+        data = b"" if body is None else json.dumps(
+            body, sort_keys = True).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+
+        self.end_headers()
+        self.wfile.write(data)
+
+
+
+
+    def _route(self):
+
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p != ""]
+
+        return parts, parse_qs(url.query)
+
+
+
+
+    def do_GET(self):
+
+        try:
+            parts, query = self._route()
+            sync = query.get("sync", ["0"])[0] == "1"
+
+            if len(parts) == 2 and parts[0] == "bulbs":
+                body = self.server.owner.state(parts[1], sync)
+            elif len(parts) == 2 and parts[0] == "groups":
+                body = self.server.owner.states(parts[1], sync)
+            else:
+                raise HttpError(404, "not found")
+
+            etag = Server.etag(body)
+            if self.headers.get("If-None-Match", None) == etag:
+                self._send(304, etag = etag)
+            else:
+                self._send(200, body, etag)
+
+        except HttpError as e:
+            self._send(e.status, { "error" : e.message })
+
+        except Exception as e:
+            self._send(500, { "error" : str(e) })
+
+
+
+
+    def do_POST(self):
+
+        try:
+            parts, query = self._route()
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length).decode("utf-8"))
+            except ValueError:
+                raise HttpError(400, "invalid json")
+
+            if len(parts) == 1 and parts[0] == "batch":
+                if type(body) is not list:
+                    raise HttpError(400, "list of commands expected")
+                commands = body
+
+            elif len(parts) == 2 and parts[0] in ["bulbs", "groups"]:
+                commands = [dict(body, target = parts[1])]
+
+            else:
+                raise HttpError(404, "not found")
+
+            results = self.server.owner.perform(commands)
+
+            # the bulbs are the upstream of this gateway
+            failed = any(not result["ok"] for _results in results
+                         for result in _results.values())
+            self._send(502 if failed else 200,
+                       results if parts[0] == "batch" else results[0])
+
+        except HttpError as e:
+            self._send(e.status, { "error" : e.message })
+
+        except Exception as e:
+            self._send(500, { "error" : str(e) })
+
+
+
+
+class _Server(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+
+
+
+class Server():
+
+    DEFAULT_PORT = 8080
+    DEFAULT_WORKERS = 8
+
+    def __init__(self, groups = None, pool = None,
+                 address = ("127.0.0.1", DEFAULT_PORT),
+                 workers = DEFAULT_WORKERS):
+
+        self._groups = groups if groups is not None else {}
+        self._pool = pool if pool is not None else BulbPool()
+        self._executor = ThreadPoolExecutor(max_workers = workers)
+        self._address = address
+        self._server = None
+
+
+
+
+    @staticmethod
+    def etag(body):
+
+        return '"%s"' % hashlib.sha1(json.dumps(
+            body, sort_keys = True).encode("utf-8")).hexdigest()
+
+
+
+
+    def _macs(self, target):
+
+        if target in self._groups:
+            return list(self._groups[target])
+
+        return [target]
+
+
+
+
+    def state(self, mac, sync = False):
+
+        with self._pool.session(mac) as bulb:
+
+            # sync() connects even if everything is cached already
+            if (sync or bulb.bulb[Bulb._SYNC] & _SYNC_ALL != _SYNC_ALL) \
+                    and not bulb.sync(_SYNC_ALL, sync):
+                raise HttpError(504, "bulb <%s> is not reachable" % mac)
+
+            return json.loads(bulb.dump_bulb_to_json())
+
+
+
+
+    def states(self, group, sync = False):
+
+        if group not in self._groups:
+            raise HttpError(404, "unknown group <%s>" % group)
+
+        futures = OrderedDict(
+            (mac, self._executor.submit(self.state, mac, sync))
+            for mac in self._groups[group])
+
+        states = OrderedDict()
+        for mac, future in futures.items():
+            try:
+                states[mac] = future.result()
+            except Exception as e:
+                states[mac] = { "error" : str(e) }
+
+        return states
+
+
+
+
+    def _run(self, bulb, command):
+
+        if "state" in command:
+            result = bulb.apply(command["state"],
+                                command.get("verify", False))
+        else:
+            result = service.call(bulb, command["call"],
+                                  command.get("args", []))
+
+        # methods of Bulb return False if the bulb has not taken a change
+        if result is False:
+            raise IOError("bulb <%s> has not taken the command"
+                          % bulb.bulb[Bulb._DEV_MAC])
+
+        return result
+
+
+
+
+    def _perform(self, mac, commands):
+
+        results = []
+        try:
+            with self._pool.session(mac) as bulb:
+                for i, command in commands:
+                    try:
+                        results.append((i, {
+                            "ok"     : True,
+                            "result" : self._run(bulb, command)
+                        }))
+                    except Exception as e:
+                        results.append((i, { "ok"    : False,
+                                             "error" : str(e) }))
+
+        # the bulb could not be set up, all of its commands fail
+        except Exception as e:
+            done = [i for i, result in results]
+            results += [(i, { "ok" : False, "error" : str(e) })
+                        for i, command in commands if i not in done]
+
+        return results
+
+
+
+
+    def perform(self, commands):
+
+        for command in commands:
+            if "target" not in command:
+                raise HttpError(400, "command without target")
+
+            if "call" in command and command["call"] not in service.CALLS:
+                raise HttpError(400, "invalid call <%s>" % command["call"])
+
+            if "call" not in command and "state" not in command:
+                raise HttpError(400, "command requires call or state")
+
+        # all commands of a bulb in order on one session
+        per_bulb = OrderedDict()
+        for i, command in enumerate(commands):
+            for mac in self._macs(command["target"]):
+                per_bulb.setdefault(mac, []).append((i, command))
+
+        futures = OrderedDict(
+            (mac, self._executor.submit(self._perform, mac, _commands))
+            for mac, _commands in per_bulb.items())
+
+        results = [OrderedDict() for command in commands]
+        for mac, future in futures.items():
+            for i, result in future.result():
+                results[i][mac] = result
+
+        return results
+
+
+
+
+    def serve_forever(self):
+
+        self._server = _Server(self._address, _Handler)
+        self._server.owner = self
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._executor.shutdown()
+            self._pool.close()
+
+
+
+
+    def shutdown(self):
+
+        if self._server is not None:
+            self._server.shutdown()
+
+
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    if len(sys.argv) > 3:
+        print("Usage: python -m playbulb.httpd [<port>] [<groups.json>]")
+        sys.exit(1)
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else Server.DEFAULT_PORT
+
+    groups = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r") as _file:
+            groups = json.load(_file)
+
+    server = Server(groups = groups, address = ("127.0.0.1", port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
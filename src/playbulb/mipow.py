@@ -23,15 +23,62 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
+from collections import namedtuple
 from datetime import datetime
 from datetime import timedelta
-from gatttool import bledevice
+from playbulb import codec
+from playbulb import colormath
+from playbulb import colors
 
-import json
+import copy
 import os.path
 import re
-import subprocess
-from mx.Tools.mxTools.test import start
+
+
+
+
+GattWrite = namedtuple("GattWrite", ["characteristic", "value", "response"])
+
+
+
+
+class Plan():
+
+    def __init__(self):
+
+        self.writes = []
+        self.state = {}
+        self.sync = 0
+
+
+
+
+    def add(self, characteristic, value, response = False):
+
+        self.writes.append(GattWrite(characteristic, value, response))
+
+
+
+
+    def __len__(self):
+        return len(self.writes)
+
+
+
+
+    def __iter__(self):
+        return iter(self.writes)
+
+
+
+
+    def __repr__(self):
+
+        return "Plan(%s)" % ", ".join(
+            "%s:%s%s" % (w.characteristic,
+                         "".join("%02x" % b for b in w.value),
+                         "!" if w.response else "")
+            for w in self.writes)
 
 
 
@@ -39,6 +86,7 @@ from mx.Tools.mxTools.test import start
 class Bulb():
 
     _TIMEOUT = 1
+    _DISCOVERY_TIMEOUT = 30
 
     _CHARACTERISTIC_DEV_ID       = "00002a25"
     _CHARACTERISTIC_DEV_VERSION  = "00002a26"
@@ -121,6 +169,17 @@ class Bulb():
     INIT_RANDOM    = 8
     INIT_DEVICE    = 16
 
+    # state which is published to the listeners, see subscribe()
+    _OBSERVED = [_COLOR, _EFFECT, _TIMER, _RANDOMMODE, _CONNECTED]
+    _NOTIFIED = [_CHARACTERISTIC_COLOR, _CHARACTERISTIC_EFFECT]
+
+    _VERIFY = {
+        _CHARACTERISTIC_COLOR      : INIT_COLOR + INIT_EFFECT,
+        _CHARACTERISTIC_EFFECT     : INIT_COLOR + INIT_EFFECT,
+        _CHARACTERISTIC_TIMER      : INIT_TIMER,
+        _CHARACTERISTIC_RANDOMMODE : INIT_RANDOM
+    }
+
     _GATT_READ = "--char-read"
     _GATT_WRITE_CMD = "--char-write"
     _GATT_WRITE_REQ = "--char-write-req"
@@ -205,15 +264,33 @@ class Bulb():
 
 
 
-    def __init__(self, name = "", mac = "", hci_device = "hci0"):
+    def __init__(self, name = "", mac = "", hci_device = "hci0",
+                 handles = None, rediscover = False):
         
         self._hci_device = hci_device
+
+        # state of this bulb, not shared with other instances
+        self.bulb = copy.deepcopy(Bulb.bulb)
         self.bulb[Bulb._DEV_MAC] = mac
+        self._listeners = []
         
         _mac = mac.replace(":", "_")
         self._hnd_file = "/tmp/bulb-%s.py.hnd" % _mac
 
-        self._init_handles()
+        # handles of an earlier discovery are not trusted when set up
+        if rediscover and os.path.isfile(self._hnd_file):
+            os.remove(self._hnd_file)
+
+        # known handles, e.g. from the registry, save the discovery
+        if handles is not None:
+            self.bulb[Bulb._HANDLES].update(handles)
+        else:
+            self._init_handles()
+
+            # a bulb which is set up must not keep the default handles
+            if rediscover and not os.path.isfile(self._hnd_file):
+                raise IOError("bulb <%s> has failed to discover its "
+                              "characteristics" % mac)
 
 
 
@@ -223,6 +300,9 @@ class Bulb():
         if not os.path.isfile(self._hnd_file):
             self._setup_characteristics()
 
+        # discovery has failed, keep the default handles
+        if not os.path.isfile(self._hnd_file):
+            return
 
         matcher = re.compile(".*char value handle = 0x([A-Fa-f0-9]+), " \
                              "uuid = ([0-9A-Za-z]+)")
@@ -230,51 +310,168 @@ class Bulb():
         with open(self._hnd_file, "r") as _file:
             for line in _file:
                 match = matcher.match(line)
+                if match is None:
+                    continue
+
                 self.bulb[Bulb._HANDLES][match.group(2)] = int(
                     match.group(1), 16)
 
-        _file.close()
-
         
 
 
     def _setup_characteristics(self):
-        
-        cmd = ' '.join(['gatttool',
+
+        import subprocess
+
+        cmd = ['gatttool',
              '-b', self.bulb[Bulb._DEV_MAC],
              '-i', self._hci_device,
-             '--characteristics > %s' % self._hnd_file
-        ])
-        
-        p = subprocess.Popen(cmd, shell=True)
-        os.waitpid(p.pid, 0)
+             '--characteristics'
+        ]
+
+        # a failed discovery must not leave an empty file for the next run
+        try:
+            output = subprocess.run(cmd, stdout = subprocess.PIPE,
+                                    stderr = subprocess.DEVNULL,
+                                    timeout = Bulb._DISCOVERY_TIMEOUT).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            return
+
+        if b"char value handle" not in output:
+            return
+
+        with open(self._hnd_file, "wb") as _file:
+            _file.write(output)
 
 
 
     
+    def subscribe(self, listener, fields = None):
+
+        # listener(events) is called with lists of events.Event
+        self._listeners.append((listener, fields))
+
+
+
+
+    def unsubscribe(self, listener):
+
+        self._listeners = [(l, f) for l, f in self._listeners
+                           if l != listener]
+
+
+
+
+    def _snapshot(self):
+
+        if len(self._listeners) == 0:
+            return None
+
+        return copy.deepcopy(
+            dict((field, self.bulb[field]) for field in Bulb._OBSERVED))
+
+
+
+
+    def _publish(self, before):
+
+        if before is None:
+            return
+
+        # loaded with the first listener only, it starts a thread
+        from playbulb import events
+
+        now = datetime.now()
+        _events = [events.Event(self, field, before[field],
+                                copy.deepcopy(self.bulb[field]), now)
+                   for field in Bulb._OBSERVED
+                   if before[field] != self.bulb[field]]
+
+        if len(_events) > 0:
+            events.dispatcher().publish(list(self._listeners), _events)
+
+
+
+
     def connect(self):
         
         if self.bulb[Bulb._CONNECTED]:
             return True
-        
+
+        # pexpect is only loaded when the bulb is really talked to
+        from gatttool import bledevice
+
+        before = self._snapshot()
+
         self._btle_device = bledevice.BTLEDevice(
-            self.bulb[Bulb._DEV_MAC])
+            self.bulb[Bulb._DEV_MAC], self._hci_device)
         
         try:
             self._btle_device.connect(Bulb._TIMEOUT)
             self.bulb[Bulb._CONNECTED] = True 
         except bledevice.NotConnectedError:
             self.bulb[Bulb._CONNECTED] = False 
+
+        self._publish(before)
         
         return self.bulb[Bulb._CONNECTED]
 
 
 
 
+    def disconnect(self):
+
+        before = self._snapshot()
+
+        if self._btle_device is not None:
+            self._btle_device.stop()
+            self._btle_device = None
+
+        self.bulb[Bulb._CONNECTED] = False
+
+        self._publish(before)
+
+
+
+
+    def notify(self, characteristics = None):
+
+        # changes which the bulb notifies by itself, if it supports it
+        if not self.connect():
+            return False
+
+        for characteristic in (characteristics if characteristics is not None
+                               else Bulb._NOTIFIED):
+            self._btle_device.subscribe(
+                self.bulb[Bulb._HANDLES][characteristic],
+                self._on_notification)
+
+        return True
+
+
+
+
+    def _on_notification(self, handle, value):
+
+        before = self._snapshot()
+
+        handles = self.bulb[Bulb._HANDLES]
+        if handle == handles[Bulb._CHARACTERISTIC_COLOR]:
+            self._read_color(value)
+        elif handle == handles[Bulb._CHARACTERISTIC_EFFECT]:
+            self._read_effect(value)
+
+        self._publish(before)
+
+
+
+
     def sync(self, level, force = True):
         
         if not self.connect():
             return False
+
+        before = self._snapshot()
             
         if level & Bulb.INIT_DEVICE \
                 and (not self.bulb[Bulb._SYNC] & Bulb.INIT_DEVICE \
@@ -300,6 +497,8 @@ class Bulb():
                 and (not self.bulb[Bulb._SYNC] & Bulb.INIT_RANDOM \
                      or force):        
             self._read_randommode()
+
+        self._publish(before)
         
         return True
 
@@ -309,22 +508,15 @@ class Bulb():
     def _read_hnd_as_str(self, hnd):
         
         _b = self._btle_device.char_read_hnd(hnd)
-        _s = str(_b).replace("\x00", "")
+        _s = bytes(_b).decode("utf-8", "replace").replace("\x00", "")
         return _s
 
 
     
     
-    def _read_hnd_as_int_array(self, hnd):
-        
-        _ba = self._btle_device.char_read_hnd(hnd)
+    def _read_hnd(self, hnd):
         
-        _i = []
-        
-        for _b in _ba:
-            _i += [_b]
-            
-        return _i
+        return memoryview(self._btle_device.char_read_hnd(hnd))
         
         
        
@@ -364,12 +556,15 @@ class Bulb():
 
             
 
-    def _read_color(self):
+    def _read_color(self, data = None):
 
-        color = self._read_hnd_as_int_array(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_COLOR])
+        if data is None:
+            data = self._read_hnd(
+                self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_COLOR])
+
+        color = codec.decode_color(data)
         
-        self._store_color(color)
+        self._store_color(list(color))
         
         
         
@@ -381,15 +576,18 @@ class Bulb():
 
 
     
-    def _read_effect(self):
+    def _read_effect(self, data = None):
+
+        if data is None:
+            data = self._read_hnd(
+                self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_EFFECT])
 
-        _hex = self._read_hnd_as_int_array(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_EFFECT])
+        color, effect, hold = codec.decode_effect(data)
 
         _effect = {
-            Bulb._COLOR     : _hex[:4],
-            Bulb._EFFECT    : _hex[4],
-            Bulb._HOLD      : _hex[6]
+            Bulb._COLOR     : list(color),
+            Bulb._EFFECT    : effect,
+            Bulb._HOLD      : hold
         }
         
         self._store_effect(_effect)
@@ -412,24 +610,23 @@ class Bulb():
 
     def _read_timers(self):
 
-        _hex_timers = self._read_hnd_as_int_array(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_TIMER])
-    
-        _hex_timer_fx = self._read_hnd_as_int_array(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_TIMER_EFFECT])
+        time, slots = codec.decode_timers(
+            self._read_hnd(
+                self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_TIMER]),
+            self._read_hnd(
+                self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_TIMER_EFFECT]))
     
-    
-        self.bulb[Bulb._TIME] = _hex_timers[12:14]
+        self.bulb[Bulb._TIME] = list(time)
         
         _timers = []
         
-        for i in range(4):
+        for i, (status, start, color, runtime) in enumerate(slots):
             _timer = {
                 Bulb._INDEX  : i + 1,
-                Bulb._STATUS : _hex_timers[i * 3 + 0],
-                Bulb._START  : _hex_timers[i * 3 + 1:i * 3 + 3],
-                Bulb._COLOR     : _hex_timer_fx[i * 5 + 0:i * 5 + 4],
-                Bulb._RUNTIME   : _hex_timer_fx[i * 5 + 4]
+                Bulb._STATUS : status,
+                Bulb._START  : list(start),
+                Bulb._COLOR     : list(color),
+                Bulb._RUNTIME   : runtime
             }
             
             _timers += [_timer]
@@ -444,17 +641,17 @@ class Bulb():
     
     def _read_randommode(self):
 
-        _hex_randommode = self._read_hnd_as_int_array(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_RANDOMMODE])
-        
+        status, start, stop, run_min, run_max, color = codec.decode_random(
+            self._read_hnd(
+                self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_RANDOMMODE]))
         
         self.bulb[Bulb._RANDOMMODE] = {
-            Bulb._STATUS   : _hex_randommode[0],
-            Bulb._START    : _hex_randommode[3:5],
-            Bulb._STOP     : _hex_randommode[5:7],
-            Bulb._MIN      : _hex_randommode[7],
-            Bulb._MAX      : _hex_randommode[8],
-            Bulb._COLOR    : _hex_randommode[9:13]
+            Bulb._STATUS   : status,
+            Bulb._START    : list(start),
+            Bulb._STOP     : list(stop),
+            Bulb._MIN      : run_min,
+            Bulb._MAX      : run_max,
+            Bulb._COLOR    : list(color)
         }
         
         self.bulb[Bulb._SYNC] |= Bulb.INIT_RANDOM
@@ -462,73 +659,377 @@ class Bulb():
 
 
 
+    def plan(self, state, now = None):
+
+        return Bulb._plan(self.bulb, state,
+                          now if now is not None else datetime.now())
+
+
+
+
+    @staticmethod
+    def _plan(current, desired, now):
+
+        plan = Plan()
+        synced = current[Bulb._SYNC]
+
+        # effect first, color write afterwards, see off()
+        effect = desired.get(Bulb._EFFECT, None)
+        if effect is not None:
+            effect = Bulb._normalize_effect(effect, current)
+            if not synced & Bulb.INIT_EFFECT \
+                    or effect != current[Bulb._EFFECT]:
+                plan.add(Bulb._CHARACTERISTIC_EFFECT,
+                         codec.encode_effect(effect[Bulb._COLOR],
+                                             effect[Bulb._EFFECT],
+                                             effect[Bulb._HOLD]))
+                plan.state[Bulb._EFFECT] = effect
+                plan.state[Bulb._PREV_COLOR] = effect[Bulb._COLOR]
+                plan.sync |= Bulb.INIT_EFFECT
+
+            running = effect[Bulb._EFFECT] != Bulb.EFFECT_HALT
+            if running:
+                plan.state[Bulb._COLOR] = effect[Bulb._COLOR]
+                plan.sync |= Bulb.INIT_COLOR
+
+        else:
+            # an effect that is not synchronized may still be running
+            running = not synced & Bulb.INIT_EFFECT \
+                or current[Bulb._EFFECT][Bulb._EFFECT] != Bulb.EFFECT_HALT
+
+        color = desired.get(Bulb._COLOR, None)
+        if color is not None and not (effect is not None and running):
+            color = list(color)
+            if running or not synced & Bulb.INIT_COLOR \
+                    or color != current[Bulb._COLOR]:
+                plan.add(Bulb._CHARACTERISTIC_COLOR,
+                         codec.encode_color(color))
+                # off is no color to come back to, see toggle() and dim()
+                if current[Bulb._COLOR] != Bulb.COLOR_OFF:
+                    plan.state.setdefault(Bulb._PREV_COLOR,
+                                          current[Bulb._COLOR])
+                plan.state[Bulb._COLOR] = color
+                plan.sync |= Bulb.INIT_COLOR
+
+                # writing a color halts a running effect
+                if effect is None and synced & Bulb.INIT_EFFECT and running:
+                    _effect = dict(current[Bulb._EFFECT])
+                    _effect[Bulb._EFFECT] = Bulb.EFFECT_HALT
+                    plan.state[Bulb._EFFECT] = _effect
+
+        timers = desired.get(Bulb._TIMER, None)
+        if timers is not None:
+            _timers = list(current[Bulb._TIMER])
+            written = len(plan)
+            for slot, timer in enumerate(timers):
+                if timer is None:
+                    continue
+
+                timer = Bulb._normalize_timer(slot, timer)
+                if synced & Bulb.INIT_TIMER \
+                        and Bulb._same_timer(timer, current[Bulb._TIMER][slot]):
+                    continue
+
+                plan.add(Bulb._CHARACTERISTIC_TIMER,
+                         Bulb._timer_payload(slot, timer, now),
+                         True)
+                _timers[slot] = timer
+
+            if len(plan) > written:
+                plan.state[Bulb._TIMER] = _timers
+                plan.state[Bulb._TIME] = [now.hour, now.minute]
+
+        randommode = desired.get(Bulb._RANDOMMODE, None)
+        if randommode is not None:
+            randommode = Bulb._normalize_random(randommode, now)
+            if not synced & Bulb.INIT_RANDOM \
+                    or not Bulb._same_random(randommode,
+                                             current[Bulb._RANDOMMODE]):
+                plan.add(Bulb._CHARACTERISTIC_RANDOMMODE,
+                         Bulb._random_payload(randommode, now),
+                         True)
+                plan.state[Bulb._RANDOMMODE] = randommode
+                plan.state[Bulb._TIME] = [now.hour, now.minute]
+
+        return plan
+
+
+
+
+    @staticmethod
+    def _normalize_effect(effect, current):
+
+        color = effect.get(Bulb._COLOR, None)
+        if color is None or len(color) == 0:
+            color = current[Bulb._COLOR]
+
+        _effect = effect.get(Bulb._EFFECT, Bulb.EFFECT_HALT)
+        hold = effect.get(Bulb._HOLD, 255)
+
+        if _effect == Bulb.EFFECT_CANDLE:
+            hold = 1 if hold > 0 else 0
+
+        return {
+            Bulb._COLOR     : list(color),
+            Bulb._EFFECT    : _effect,
+            Bulb._HOLD      : hold
+        }
+
+
+
+
+    @staticmethod
+    def _normalize_timer(slot, timer):
+
+        start = list(timer.get(Bulb._START, [0xff, 0xff]))
+        status = timer.get(Bulb._STATUS, None)
+
+        # a slot which is off, e.g. has fired, keeps its start but is not
+        # armed again, e.g. when a snapshot is restored
+        if status == 4:
+            start = [0xff, 0xff]
+
+        unset = start == [0xff, 0xff]
+        color = Bulb.COLOR_OFF if unset \
+            else list(timer.get(Bulb._COLOR, Bulb.COLOR_WHITE))
+
+        if unset:
+            status = 4
+        elif status is None:
+            status = 2 if color == Bulb.COLOR_OFF else 0
+
+        return {
+            Bulb._INDEX   : slot + 1,
+            Bulb._STATUS  : status,
+            Bulb._START   : start,
+            Bulb._COLOR   : color,
+            Bulb._RUNTIME : 0 if unset \
+                else min(timer.get(Bulb._RUNTIME, 0), 255)
+        }
+
+
+
+
+    @staticmethod
+    def _same_timer(t1, t2):
+
+        # a slot which is off does nothing, whether it has a start or not
+        if t1[Bulb._START] == [0xff, 0xff]:
+            return t2[Bulb._START] == [0xff, 0xff] or t2[Bulb._STATUS] == 4
+
+        if t2[Bulb._START] == [0xff, 0xff]:
+            return False
+
+        # a slot which has fired is reported off and has to be armed again
+        return t1[Bulb._START] == t2[Bulb._START] \
+            and t1[Bulb._STATUS] == t2[Bulb._STATUS] \
+            and t1[Bulb._COLOR] == t2[Bulb._COLOR] \
+            and t1[Bulb._RUNTIME] == t2[Bulb._RUNTIME]
+
+
+
+
+    @staticmethod
+    def _timer_payload(slot, timer, now):
+
+        unset = timer[Bulb._START] == [0xff, 0xff]
+
+        return codec.encode_timer(slot,
+                                  2 if timer[Bulb._STATUS] != 0 else 0,
+                                  now,
+                                  0xff if unset else 0,
+                                  timer[Bulb._START],
+                                  timer[Bulb._COLOR],
+                                  timer[Bulb._RUNTIME])
+
+
+
+
+    @staticmethod
+    def _normalize_random(randommode, now):
+
+        start = list(randommode.get(Bulb._START, [0xff, 0xff]))
+        status = randommode.get(Bulb._STATUS, None)
+
+        # as read, a random mode is on with a status above 2 only
+        unset = start == [0xff, 0xff] or status is not None and status <= 2
+
+        if unset:
+            return {
+                Bulb._STATUS   : 0,
+                Bulb._START    : [0xff, 0xff],
+                Bulb._STOP     : [0xff, 0xff],
+                Bulb._MIN      : 0xff,
+                Bulb._MAX      : 0xff,
+                Bulb._COLOR    : Bulb.COLOR_OFF
+            }
+
+        return {
+            Bulb._STATUS   : now.second,
+            Bulb._START    : start,
+            Bulb._STOP     : list(randommode[Bulb._STOP]),
+            Bulb._MIN      : randommode.get(Bulb._MIN, 0),
+            Bulb._MAX      : randommode.get(Bulb._MAX, 0),
+            Bulb._COLOR    : list(randommode.get(Bulb._COLOR,
+                                                 Bulb.COLOR_WHITE))
+        }
+
+
+
+
+    @staticmethod
+    def _same_random(r1, r2):
+
+        if r1[Bulb._START] == [0xff, 0xff] and r2[Bulb._STATUS] is not None \
+                and r2[Bulb._STATUS] <= 2:
+            return True
+
+        for key in [Bulb._START, Bulb._STOP, Bulb._MIN, Bulb._MAX,
+                    Bulb._COLOR]:
+            if r1[key] != r2[key]:
+                return False
+
+        return True
+
+
+
+
+    @staticmethod
+    def _random_payload(randommode, now):
+
+        return codec.encode_random(now,
+                                   randommode[Bulb._START],
+                                   randommode[Bulb._STOP],
+                                   randommode[Bulb._MIN],
+                                   randommode[Bulb._MAX],
+                                   randommode[Bulb._COLOR])
+
+
+
+
+    def _execute(self, plan, pipelined = False):
+
+        if len(plan) > 0 and not self.connect():
+            return False
+
+        before = self._snapshot()
+
+        for write in plan:
+            self._char_write(
+                self.bulb[Bulb._HANDLES][write.characteristic],
+                write.value,
+                write.response and not pipelined)
+
+        self.bulb.update(plan.state)
+        self.bulb[Bulb._SYNC] |= plan.sync
+
+        self._publish(before)
+
+        return True
+
+
+
+
+    def apply(self, state, verify = True):
+
+        plan = self.plan(state)
+
+        # writes are sent back to back if they get verified by reading anyway
+        if not self._execute(plan, verify):
+            return False
+
+        if not verify or len(plan) == 0:
+            return True
+
+        # read back what has been written and diff again
+        level = 0
+        for write in plan:
+            level |= Bulb._VERIFY[write.characteristic]
+
+        if not self.sync(level, True):
+            return False
+
+        return len(self.plan(state)) == 0
+
+
+
+
     def color(self, color = None):
-        
-        self.sync(Bulb.INIT_COLOR, False)
-        
-        self._char_write(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_COLOR], 
-            bytearray(color))
 
-        self.bulb[Bulb._PREV_COLOR] = self.bulb[Bulb._COLOR]
-        self.bulb[Bulb._COLOR] = color
-        
-        self.bulb[Bulb._SYNC] |= Bulb.INIT_COLOR
+        return self.apply({
+            Bulb._COLOR : colors.parse(color)
+        }, False)
+
 
 
 
-    
     def on(self):
-        self.color(Bulb.COLOR_WHITE)
+        return self.color(Bulb.COLOR_WHITE)
 
 
 
 
     def off(self):
-        self.sync(Bulb.INIT_COLOR, False)
-        self.effect(color=self.bulb[Bulb._COLOR])
-        self.color(Bulb.COLOR_OFF)
+
+        if not self.sync(Bulb.INIT_COLOR, False):
+            return False
+
+        state = {
+            Bulb._COLOR : Bulb.COLOR_OFF
+        }
+
+        # remember current color in halted effect, see toggle()
+        if self.bulb[Bulb._COLOR] != Bulb.COLOR_OFF:
+            state[Bulb._EFFECT] = {
+                Bulb._COLOR  : self.bulb[Bulb._COLOR],
+                Bulb._EFFECT : Bulb.EFFECT_HALT
+            }
+
+        return self.apply(state, False)
     
     
     
     
     def toggle(self):
         
-        self.sync(Bulb.INIT_COLOR + Bulb.INIT_EFFECT, False)
+        if not self.sync(Bulb.INIT_COLOR + Bulb.INIT_EFFECT, False):
+            return False
         
         if self.bulb[Bulb._COLOR] == [0, 0, 0, 0]:
             if self.bulb[Bulb._PREV_COLOR] == [0, 0, 0, 0]:
-                self.color(Bulb.COLOR_WHITE)
+                return self.color(Bulb.COLOR_WHITE)
             else:
-                self.color(self.bulb[Bulb._PREV_COLOR])
+                return self.color(self.bulb[Bulb._PREV_COLOR])
         else:
-            self.off()
+            return self.off()
             
     
 
 
     def dim(self, incr = None, factor = None):
         
-        self.sync(Bulb.INIT_COLOR, False)
+        if not self.sync(Bulb.INIT_COLOR, False):
+            return False
     
-        current_color = self.bulb[Bulb._COLOR]
-        new_color = [] 
+        color = self.bulb[Bulb._COLOR]
+        level = colormath.level([color])[0]
 
-        for c in current_color:
-            
-            if incr is not None:
-                _c = c + incr
-            elif factor is not None:
-                _c = c * factor
-            else:
-                _c = c
+        # come back from off with the previous color
+        if color == Bulb.COLOR_OFF:
+            color = self.bulb[Bulb._PREV_COLOR]
+            if color == Bulb.COLOR_OFF:
+                color = Bulb.COLOR_WHITE
 
-            _c = 255 if _c > 255 else _c
-            _c = 0 if _c < 0 else _c
-            
-            new_color += [int(_c)]
-            
-        self.color(new_color)
+        # steps in perceived brightness, the hue is kept
+        if incr is not None:
+            level += incr
+        elif factor is not None:
+            level *= factor
+
+        new_color = colormath.at_level([color], int(level))[0]
+
+        if not self.color(new_color):
+            return False
         
         return new_color
         
@@ -537,22 +1038,20 @@ class Bulb():
         
     def effect(self, effect = EFFECT_HALT,
                hold = 255, color = None):
-        
-        self.sync(Bulb.INIT_COLOR + Bulb.INIT_EFFECT, False)
-        
+
         if color is None or len(color) == 0:
-            color = self.bulb[Bulb._COLOR]
-        
-        if effect == Bulb.EFFECT_CANDLE:
-            hold = 1 if hold > 0 else 0
-        
-        self._char_write(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_EFFECT], 
-            bytearray(color + [effect, 0, hold, 0]))
-        
-        self.bulb[Bulb._COLOR] = color
+            if not self.sync(Bulb.INIT_COLOR, False):
+                return False
+        else:
+            color = colors.parse(color)
 
-        self.bulb[Bulb._SYNC] |= Bulb.INIT_COLOR
+        return self.apply({
+            Bulb._EFFECT : {
+                Bulb._COLOR  : color,
+                Bulb._EFFECT : effect,
+                Bulb._HOLD   : hold
+            }
+        }, False)
 
 
 
@@ -576,155 +1075,84 @@ class Bulb():
 
 
     def set_timer(self, timer = 1, start = None, minutes = 0, color = COLOR_WHITE):
-        
-        now = datetime.now()
-        target = 2 if color == Bulb.COLOR_OFF else 0
-        setter = 0
-        
+
         start = self._opt_start(start)
-        
-        minutes = minutes if minutes < 256 else 255
-        
-        data = bytearray([timer % 4,
-                   target, 
-                   now.second, 
-                   now.minute, 
-                   now.hour,
-                   setter,
-                   start.minute,
-                   start.hour] 
-                  + color 
-                  + [minutes])
-        
-        self._char_write(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_TIMER], 
-            data,
-            True)
-
-        self.bulb[Bulb._TIMER][timer % 4] = {
-                Bulb._INDEX   : timer % 4,
-                Bulb._STATUS  : setter,
-                Bulb._START   : [start.hour, start.minute],
-                Bulb._COLOR   : color,
-                Bulb._RUNTIME : minutes % 255
-            }
-        
-        self.bulb[Bulb._TIME] = [now.hour, now.second]
+
+        timers = [None] * 4
+        timers[timer % 4] = {
+            Bulb._START   : [start.hour, start.minute],
+            Bulb._COLOR   : color,
+            Bulb._RUNTIME : minutes
+        }
+
+        return self.apply({
+            Bulb._TIMER : timers
+        }, False)
 
 
 
 
     def unset_timer(self, timer):
-        
-        now = datetime.now()
-        
-        data = bytearray([timer % 4,
-                   2, 
-                   now.second, 
-                   now.minute, 
-                   now.hour,
-                   255,
-                   255,
-                   255] 
-                  + Bulb.COLOR_OFF 
-                  + [0])
-        
-        self._char_write(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_TIMER], 
-            data,
-            True)
-
-        self.bulb[Bulb._TIMER][timer % 4] = {
-                Bulb._INDEX   : timer % 4,
-                Bulb._STATUS  : 2,
-                Bulb._START   : [255, 255],
-                Bulb._COLOR   : Bulb.COLOR_OFF,
-                Bulb._RUNTIME : 0
-            }
-        
-        self.bulb[Bulb._TIME] = [now.hour, now.second]
 
-    
-    
-    
+        timers = [None] * 4
+        timers[timer % 4] = {
+            Bulb._START : [0xff, 0xff]
+        }
+
+        return self.apply({
+            Bulb._TIMER : timers
+        }, False)
+
+
+
+
+    def set_timers(self, timers, verify = True):
+
+        return self.apply({
+            Bulb._TIMER : timers
+        }, verify)
+
+
+
+
     def unset_all_timers(self):
-        
-        for i in range(4):
-            self.unset_timer(i)
-        
 
-        
-        
+        return self.set_timers([{ Bulb._START : [0xff, 0xff] }] * 4)
+
+
+
+
     def set_random(self, start = None, end = None, 
                    run_min = 0, run_max = 0, 
                    color = COLOR_WHITE):
-        
-        now = datetime.now()
 
         start = self._opt_start(start)
         end = self._opt_start(end, offset = start)
-            
-        data = bytearray([
-                   now.second, 
-                   now.minute, 
-                   now.hour,
-                   start.hour,
-                   start.minute,
-                   end.hour,
-                   end.minute,
-                   run_min % 255,
-                   run_max % 255] 
-                  + color)
-
-        self._char_write(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_RANDOMMODE], 
-            data,
-            True)
 
-        self.bulb[Bulb._RANDOMMODE] = {
-            Bulb._STATUS   : now.second,
-            Bulb._START    : [start.hour, start.minute],
-            Bulb._STOP     : [end.hour, end.minute],
-            Bulb._MIN      : run_min,
-            Bulb._MAX      : run_max,
-            Bulb._COLOR    : color
-        }
+        return self.apply({
+            Bulb._RANDOMMODE : {
+                Bulb._START : [start.hour, start.minute],
+                Bulb._STOP  : [end.hour, end.minute],
+                Bulb._MIN   : run_min % 255,
+                Bulb._MAX   : run_max % 255,
+                Bulb._COLOR : color
+            }
+        }, False)
 
-        self.bulb[Bulb._TIME] = [now.hour, now.second]
 
 
-        
 
     def unset_random(self):
-        
-        now = datetime.now()
 
-        data = bytearray([
-                   now.second, 
-                   now.minute, 
-                   now.hour,
-                   255, 255, 255, 255, 255, 255] 
-                  + Bulb.COLOR_OFF)
+        return self.apply({
+            Bulb._RANDOMMODE : {
+                Bulb._START : [0xff, 0xff]
+            }
+        }, False)
+
 
-        self._char_write(
-            self.bulb[Bulb._HANDLES][Bulb._CHARACTERISTIC_RANDOMMODE], 
-            data,
-            True)
 
-        self.bulb[Bulb._RANDOMMODE] = {
-            Bulb._STATUS   : 0,
-            Bulb._START    : [255, 255],
-            Bulb._STOP     : [255, 255],
-            Bulb._MIN      : 255,
-            Bulb._MAX      : 255,
-            Bulb._COLOR    : Bulb.COLOR_OFF
-        }
 
-        self.bulb[Bulb._TIME] = [now.hour, now.second]        
- 
- 
-    
-    
     def ambient(self, period, start):
 
         start1 = self._opt_start(start)
@@ -733,23 +1161,31 @@ class Bulb():
         start2 = start1 + timedelta(minutes = period1 - 1)
         period2 = period * 4 / 60
 
-        self.set_timer(timer = 3, 
-                       start = start2, 
-                       minutes = period2, 
-                       color = Bulb.COLOR_OFF)
-
-        self.set_timer(timer = 2, 
-                       start = start1, 
-                       minutes = period1, 
-                       color = [0, 255, 47, 0])
-
-        self.unset_timer(1)
-        self.unset_timer(0)
+        return self.set_timers([
+            {
+                Bulb._START   : [0xff, 0xff]
+            },
+            {
+                Bulb._START   : [0xff, 0xff]
+            },
+            {
+                Bulb._START   : [start1.hour, start1.minute],
+                Bulb._COLOR   : [0, 255, 47, 0],
+                Bulb._RUNTIME : int(period1)
+            },
+            {
+                Bulb._START   : [start2.hour, start2.minute],
+                Bulb._COLOR   : Bulb.COLOR_OFF,
+                Bulb._RUNTIME : int(period2)
+            }
+        ])
 
 
   
     
     def dump_bulb_to_json(self):
+
+        import json
         return json.dumps(self.bulb, indent = 2, sort_keys = True)
         
     
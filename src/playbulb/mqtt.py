@@ -0,0 +1,332 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Bridge between MQTT and bulbs.
+
+Messages to <prefix>/<alias>/set control a bulb, the alias is looked up
+in the aliases given to the bridge or taken as mac address. A payload
+is one of
+
+    red, 2700K, #ff8000, hsv(30,1,1)    color, see playbulb.colors
+    on, off, toggle                     as the methods of Bulb
+    { "state" : { ... } }               desired state, see Bulb.apply()
+    { "call" : "effect", "args" : [...] }
+
+After a change the state of the bulb is published retained to
+<prefix>/<alias>/state, but only if it differs from the last one. A
+command which fails, e.g. since the bulb is not reachable, publishes
+
+    { "error" : "...", "command" : { ... } }
+
+to <prefix>/<alias>/error.
+
+A payload which cannot be parsed publishes
+
+    { "error" : "...", "payload" : "..." }
+
+to the error topic as well.
+
+Messages are queued per bulb and run in order. While a bulb is busy,
+a state is merged into a state queued right before it, so a burst of
+colors results in one more write instead of a queue of writes. Calls,
+e.g. toggle, are never merged, as running them once is not the same as
+running them many times. Bulbs are served concurrently by a thread pool
+and stay connected through a BulbPool.
+
+paho-mqtt is only needed if no other client is passed to the bridge.
+Any client with subscribe(), publish(), loop_forever(), disconnect()
+and an on_message(topic, payload) attribute will do.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+
+from playbulb import colors
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+from playbulb import service
+
+
+DEFAULT_PREFIX = "mipow"
+
+_CALL_PAYLOADS = ["on", "off", "toggle"]
+
+# published part of the state of a bulb
+_PUBLISHED = [Bulb._COLOR, Bulb._EFFECT, Bulb._TIMER, Bulb._RANDOMMODE]
+
+
+
+
+class _PahoClient():
+
+    def __init__(self, host, port):
+
+        import paho.mqtt.client as mqtt
+
+        # paho 2 requires to choose the callback api
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            self._client = mqtt.Client()
+
+        self._topics = []
+        self.on_message = None
+
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._client.connect(host, port)
+
+
+
+
+    def _on_connect(self, client, userdata, *args):
+
+        # subscriptions are lost when the broker reconnects
+        for topic in self._topics:
+            self._client.subscribe(topic)
+
+
+
+
+    def _on_message(self, client, userdata, message):
+        self.on_message(message.topic, message.payload)
+
+
+
+
+    def subscribe(self, topic):
+
+        self._topics.append(topic)
+        self._client.subscribe(topic)
+
+
+
+
+    def publish(self, topic, payload, retain = False):
+        self._client.publish(topic, payload, retain = retain)
+
+
+
+
+    def loop_forever(self):
+        self._client.loop_forever()
+
+
+
+
+    def disconnect(self):
+        self._client.disconnect()
+
+
+
+
+class Bridge():
+
+    DEFAULT_WORKERS = 8
+
+    def __init__(self, aliases = None, prefix = DEFAULT_PREFIX,
+                 client = None, pool = None, workers = DEFAULT_WORKERS,
+                 host = "localhost", port = 1883):
+
+        self._aliases = aliases if aliases is not None else {}
+        self._prefix = prefix
+        self._client = client if client is not None \
+            else _PahoClient(host, port)
+        self._pool = pool if pool is not None else BulbPool()
+        self._executor = ThreadPoolExecutor(max_workers = workers)
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._busy = set()
+        self._published = {}
+
+        self._client.on_message = self._on_message
+        self._client.subscribe("%s/+/set" % self._prefix)
+
+
+
+
+    @staticmethod
+    def parse(payload):
+
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+
+        payload = payload.strip()
+
+        if payload.startswith("{"):
+            command = json.loads(payload)
+            if "call" in command and command["call"] not in service.CALLS:
+                raise ValueError("invalid call <%s>" % command["call"])
+
+            if "call" not in command and "state" not in command:
+                raise ValueError("command requires call or state")
+
+            return command
+
+        if payload.lower() in _CALL_PAYLOADS:
+            return { "call" : payload.lower() }
+
+        return { "state" : { Bulb._COLOR : colors.parse(payload) } }
+
+
+
+
+    @staticmethod
+    def _coalesce(pending, command):
+
+        # a newer state overrides the keys of a state queued right before
+        if len(pending) > 0 and "call" not in pending[-1] \
+                and "call" not in command:
+            state = dict(pending[-1]["state"])
+            state.update(command["state"])
+            pending[-1] = dict(pending[-1], state = state)
+
+        else:
+            pending.append(command)
+
+
+
+
+    def _publish_error(self, alias, error, **kwargs):
+
+        kwargs["error"] = str(error)
+        self._client.publish("%s/%s/error" % (self._prefix, alias),
+                             json.dumps(kwargs, sort_keys = True))
+
+
+
+
+    def _on_message(self, topic, payload):
+
+        parts = topic.split("/")
+        if len(parts) < 3 or parts[-1] != "set":
+            return
+
+        alias = parts[-2]
+        try:
+            command = Bridge.parse(payload)
+        except ValueError as e:
+            self._publish_error(alias, e, payload = payload.decode(
+                "utf-8", "replace") if isinstance(payload, bytes)
+                else payload)
+            return
+
+        with self._lock:
+            Bridge._coalesce(self._pending.setdefault(alias, deque()),
+                             command)
+
+            if alias in self._busy:
+                return
+
+            self._busy.add(alias)
+
+        self._executor.submit(self._drain, alias)
+
+
+
+
+    def _drain(self, alias):
+
+        mac = self._aliases.get(alias, alias)
+
+        while True:
+            with self._lock:
+                pending = self._pending.get(alias, None)
+                if not pending:
+                    self._pending.pop(alias, None)
+                    self._busy.discard(alias)
+                    return
+
+                command = pending.popleft()
+
+            try:
+                with self._pool.session(mac) as bulb:
+                    # False if the bulb is not reachable
+                    ok = True
+                    if "state" in command:
+                        ok = bulb.apply(command["state"],
+                                        command.get("verify", False))
+
+                    if ok and "call" in command:
+                        ok = service.call(bulb, command["call"],
+                                          command.get("args", [])) is not False
+
+                    if not ok:
+                        raise IOError("bulb <%s> is not reachable" % mac)
+
+                    state = json.dumps(dict(
+                        (key, bulb.bulb[key]) for key in _PUBLISHED),
+                        sort_keys = True)
+
+            except Exception as e:
+                self._publish_error(alias, e, command = command)
+                continue
+
+            if self._published.get(alias, None) != state:
+                self._published[alias] = state
+                self._client.publish("%s/%s/state" % (self._prefix, alias),
+                                     state, retain = True)
+
+
+
+
+    def run(self):
+        self._client.loop_forever()
+
+
+
+
+    def stop(self):
+
+        self._client.disconnect()
+        self._executor.shutdown()
+        self._pool.close()
+
+
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    if len(sys.argv) > 3:
+        print("Usage: python -m playbulb.mqtt [<host>] [<aliases.json>]")
+        sys.exit(1)
+
+    aliases = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r") as _file:
+            aliases = json.load(_file)
+
+    bridge = Bridge(aliases = aliases,
+                    host = sys.argv[1] if len(sys.argv) > 1 else "localhost")
+    try:
+        bridge.run()
+    except KeyboardInterrupt:
+        bridge.stop()
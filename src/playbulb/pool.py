@@ -0,0 +1,133 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Pool of warm bulb connections.
+
+A bulb is created once per mac address and keeps its cached state for
+the lifetime of the pool. At most `size` bulbs stay connected, idle
+ones are disconnected least recently used first. A session locks its
+bulb, so concurrent users of the pool never interleave commands on the
+same gatttool connection.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+
+from playbulb.mipow import Bulb
+
+
+
+
+class BulbPool():
+
+    DEFAULT_SIZE = 8
+
+    def __init__(self, size = DEFAULT_SIZE, hci_device = "hci0",
+                 factory = None):
+
+        self._size = size
+        self._hci_device = hci_device
+        self._factory = factory if factory is not None \
+            else lambda mac, hci_device: Bulb(mac = mac,
+                                              hci_device = hci_device)
+
+        self._bulbs = {}
+        self._locks = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+
+
+
+    def get(self, mac):
+
+        with self._lock:
+            if mac not in self._bulbs:
+                self._locks[mac] = threading.RLock()
+                self._bulbs[mac] = None
+
+            lock = self._locks[mac]
+
+        # setting up a bulb may take a while, do not block the pool
+        with lock:
+            if self._bulbs[mac] is None:
+                self._bulbs[mac] = self._factory(mac, self._hci_device)
+
+            return self._bulbs[mac]
+
+
+
+
+    def bulbs(self):
+
+        with self._lock:
+            return dict((mac, bulb) for mac, bulb in self._bulbs.items()
+                        if bulb is not None)
+
+
+
+
+    @contextmanager
+    def session(self, mac):
+
+        bulb = self.get(mac)
+
+        with self._locks[mac]:
+            try:
+                yield bulb
+            finally:
+                with self._lock:
+                    self._recent.pop(mac, None)
+                    self._recent[mac] = bulb
+
+        self._evict()
+
+
+
+
+    def _evict(self):
+
+        with self._lock:
+            connected = [mac for mac, bulb in self._recent.items()
+                         if bulb.bulb[Bulb._CONNECTED]]
+
+        for mac in connected[:max(0, len(connected) - self._size)]:
+            lock = self._locks[mac]
+            if lock.acquire(False):
+                try:
+                    self._bulbs[mac].disconnect()
+                finally:
+                    lock.release()
+
+
+
+
+    def close(self):
+
+        for mac, bulb in self.bulbs().items():
+            with self._locks[mac]:
+                bulb.disconnect()
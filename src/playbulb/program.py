@@ -0,0 +1,243 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Long running color programs compiled onto the bulb's timers.
+
+A program is a list of keyframes (minute, color). The first keyframe is
+the color the bulb shows when the program starts, every following one
+becomes a timer that fades to its color over the minutes since the
+previous keyframe, like Bulb.ambient() does. The bulb then runs the
+program on its own without any host traffic.
+
+compile() keeps the last of keyframes within the same minute, drops
+keyframes which a single fade already passes within a tolerance and
+splits fades longer than the 255 minutes a timer can run. load() shows
+the color of the first keyframe, see first(), and programs the four
+hardware timers. A program with more steps needs a TimerScheduler which
+reprograms each slot just in time after it has fired, so load() never
+waits for the bulb's timers.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from datetime import timedelta
+
+from playbulb import colormath
+from playbulb.mipow import Bulb
+
+
+Step = namedtuple("Step", ["start", "minutes", "color"])
+
+_MAX_RUNTIME = 255
+_TOLERANCE = 4
+_SLOTS = 4
+
+
+WAKEUP = [
+    (0.0,  Bulb.COLOR_OFF),
+    (0.25, [0, 32, 8, 0]),
+    (0.5,  [0, 128, 48, 0]),
+    (0.75, [64, 255, 96, 0]),
+    (1.0,  Bulb.COLOR_WHITE)
+]
+
+DOZE = [
+    (0.0,  [64, 255, 96, 0]),
+    (0.25, [0, 128, 48, 0]),
+    (0.5,  [0, 32, 8, 0]),
+    (0.75, [0, 8, 2, 0]),
+    (1.0,  Bulb.COLOR_OFF)
+]
+
+
+
+
+def scale(curve, minutes, brightness = 255):
+
+    colors = colormath.scale([color for t, color in curve],
+                             brightness / 255.0)
+
+    return [(int(round(t * minutes)), color)
+            for (t, _), color in zip(curve, colors)]
+
+
+
+
+def wakeup(minutes):
+    return scale(WAKEUP, minutes)
+
+
+
+
+def doze(minutes, color = None):
+
+    keyframes = scale(DOZE, minutes)
+    if color is not None:
+        keyframes[0] = (0, color)
+
+    return keyframes
+
+
+
+
+def bgr(minutes, brightness = 255):
+
+    return scale([
+        (0.0,  Bulb.COLOR_OFF),
+        (0.25, Bulb.COLOR_BLUE),
+        (0.5,  Bulb.COLOR_GREEN),
+        (0.75, Bulb.COLOR_RED),
+        (1.0,  Bulb.COLOR_OFF)
+    ], minutes, brightness)
+
+
+
+
+def fade(minutes, color, current = Bulb.COLOR_OFF):
+    return [(0, current), (minutes, color)]
+
+
+
+
+def _lerp(k0, k1, t):
+
+    (t0, c0), (t1, c1) = k0, k1
+    if t1 == t0:
+        return list(c1)
+
+    x = float(t - t0) / (t1 - t0)
+    return colormath.blend([c0], [c1], x)[0]
+
+
+
+
+def _simplify(keyframes, tolerance):
+
+    # greedily extend each fade as long as it passes all skipped keyframes
+    result = [keyframes[0]]
+    i = 0
+    while i < len(keyframes) - 1:
+        j = i + 1
+        while j + 1 < len(keyframes):
+            k0, k1 = keyframes[i], keyframes[j + 1]
+            if k1[0] - k0[0] > _MAX_RUNTIME:
+                break
+
+            if any(max(abs(a - b) for a, b in zip(
+                        _lerp(k0, k1, keyframes[k][0]), keyframes[k][1]))
+                    > tolerance for k in range(i + 1, j + 1)):
+                break
+
+            j += 1
+
+        result.append(keyframes[j])
+        i = j
+
+    return result
+
+
+
+
+def _keyframes(keyframes):
+
+    # in order of time only, keyframes of the same minute keep their order
+    keyframes = sorted(((int(t), list(c)) for t, c in keyframes),
+                       key = lambda k: k[0])
+
+    # a timer cannot fade within no time, the last keyframe of a minute wins
+    return [k0 for k0, k1 in zip(keyframes, keyframes[1:] + [None])
+            if k1 is None or k1[0] != k0[0]]
+
+
+
+
+def first(keyframes):
+    return _keyframes(keyframes)[0][1]
+
+
+
+
+def compile(keyframes, start = None, tolerance = _TOLERANCE):
+
+    if start is None:
+        start = datetime.now() + timedelta(minutes = 1)
+
+    keyframes = _simplify(_keyframes(keyframes), tolerance)
+
+    steps = []
+    for k0, k1 in zip(keyframes, keyframes[1:]):
+        t, end = k0[0], k1[0]
+        while True:
+            minutes = min(end - t, _MAX_RUNTIME)
+            steps.append(Step(start + timedelta(minutes = t),
+                              minutes,
+                              _lerp(k0, k1, t + minutes)))
+            t += minutes
+            if t >= end:
+                break
+
+    return steps
+
+
+
+
+def _timer(step):
+
+    return {
+        Bulb._START   : [step.start.hour, step.start.minute],
+        Bulb._COLOR   : step.color,
+        Bulb._RUNTIME : step.minutes
+    }
+
+
+
+
+def load(bulb, steps, verify = True, scheduler = None, color = None):
+
+    if len(steps) > _SLOTS and scheduler is None:
+        raise ValueError("program needs %i timers, more than %i "
+                         "require a scheduler" % (len(steps), _SLOTS))
+
+    # the color the program starts with, e.g. first(keyframes)
+    if color is not None and not bulb.color(color):
+        return False
+
+    if len(steps) > _SLOTS:
+
+        # the program replaces what has been scheduled for the bulb
+        for entry in scheduler.entries(bulb):
+            scheduler.cancel(bulb, entry)
+
+        for step in steps:
+            scheduler.add(bulb, step.start, step.minutes, step.color)
+
+        return True
+
+    timers = [{ Bulb._START : [0xff, 0xff] }] * _SLOTS
+    for i, step in enumerate(steps):
+        timers[i] = _timer(step)
+
+    return bulb.set_timers(timers, verify)
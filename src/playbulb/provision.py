@@ -0,0 +1,147 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Setup of many bulbs at once.
+
+Each bulb is set up like by the setup command: its characteristics are
+discovered, its device info is read and its profile is stored in the
+registry. Bulbs are set up concurrently, spread over the given
+bluetooth adapters with at most `limit` bulbs per adapter at a time.
+The registry remembers the adapter each bulb has been set up with.
+
+Every bulb gets a SetupResult with the time it took and the exception
+if it has failed. A failing bulb does not stop the others, a bulb whose
+characteristics cannot be discovered fails and is not stored.
+
+scan() returns only the devices which advertise the name of a
+PLAYBULB, other devices around are not set up.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import time
+
+from playbulb.mipow import Bulb
+from playbulb import registry
+
+
+SetupResult = namedtuple("SetupResult",
+                         ["mac", "alias", "hci_device", "seconds", "error"])
+
+DEFAULT_LIMIT = 4
+
+# advertised names start with one of these, e.g. PLAYBULB CANDLE
+_NAMES = ("PLAYBULB", "MIPOW")
+
+
+
+
+def is_playbulb(device):
+
+    name = device.get("name", None)
+    return name is not None and name.upper().startswith(_NAMES)
+
+
+
+
+def scan(timeout = 5):
+
+    from gatttool import bledevice
+
+    return [(device["address"], None)
+            for device in bledevice.le_scan(timeout = timeout)
+            if is_playbulb(device)]
+
+
+
+
+def _target(bulb):
+
+    # mac, (mac, alias) or a device found by scanning
+    if isinstance(bulb, str):
+        return bulb, None
+
+    if isinstance(bulb, dict):
+        return bulb["address"], None
+
+    return tuple(bulb)
+
+
+
+
+def _setup(_registry, mac, alias, adapters, factory):
+
+    hci_device = adapters.get()
+    begin = time.monotonic()
+
+    bulb = None
+    error = None
+    try:
+        bulb = factory(mac, hci_device)
+        if not bulb.sync(Bulb.INIT_DEVICE, True):
+            raise IOError("bulb <%s> is not reachable" % mac)
+
+        _registry.put(registry.profile(bulb), alias)
+
+    except Exception as e:
+        error = e
+
+    finally:
+        if bulb is not None:
+            bulb.disconnect()
+
+        adapters.put(hci_device)
+
+    return SetupResult(mac = mac,
+                       alias = alias,
+                       hci_device = hci_device,
+                       seconds = time.monotonic() - begin,
+                       error = error)
+
+
+
+
+def setup(_registry, bulbs, adapters = ["hci0"], limit = DEFAULT_LIMIT,
+          factory = None):
+
+    if factory is None:
+        factory = lambda mac, hci_device: Bulb(mac = mac,
+                                               hci_device = hci_device,
+                                               rediscover = True)
+
+    # one token per connection an adapter may hold at a time
+    tokens = queue.Queue()
+    for i in range(limit):
+        for hci_device in adapters:
+            tokens.put(hci_device)
+
+    with ThreadPoolExecutor(max_workers = limit * len(adapters)) as executor:
+        futures = [executor.submit(_setup, _registry, mac, alias, tokens,
+                                   factory)
+                   for mac, alias in [_target(b) for b in bulbs]]
+
+        return [future.result() for future in futures]
@@ -0,0 +1,277 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Registry of known bulbs.
+
+For each bulb that has been set up, the registry keeps a profile with
+its mac address, the bluetooth adapter, the handles of its
+characteristics and its device info, optionally under an alias:
+
+    {
+      "mac"        : "AF:66:4B:0D:AC:E6",
+      "alias"      : "desk",
+      "hci_device" : "hci0",
+      "handles"    : { "0000fffc" : 27, ... },
+      "device"     : { "Device name" : "Desk", ... }
+    }
+
+The registry is a dbm database, so looking up a bulb by alias or mac
+address is a keyed read instead of a scan of a file, and a bulb built
+from its profile needs no discovery of its characteristics.
+
+Groups name lists of mac addresses and are stored in the same database.
+A target which is neither registered nor a mac address is an error, so
+a mistyped alias is never taken for a bulb. Mac addresses are stored
+and looked up in upper case.
+
+All registries of a database file share one lock. A database which is
+locked by another process, e.g. by gdbm, is opened again for a while
+before the error is raised, so a busy database is never taken for an
+empty one.
+"""
+
+import dbm
+import errno
+import json
+import os
+import re
+import threading
+import time
+
+from playbulb.mipow import Bulb
+
+
+DEFAULT_FILE = "~/.known_bulbs"
+
+_ALIAS = "alias:"
+_GROUP = "group:"
+_MAC = "mac:"
+
+_MAC_PATTERN = re.compile(r"^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$")
+
+# opening a database locked by another process is retried this long
+_LOCK_TIMEOUT = 2.0
+_LOCK_RETRY = 0.05
+
+# one lock per database file
+_locks = {}
+_locks_lock = threading.Lock()
+
+_DEVICE_INFO = [Bulb._DEV_NAME, Bulb._DEV_VENDOR, Bulb._DEV_ID,
+                Bulb._DEV_VERSION, Bulb._DEV_SOFTWARE, Bulb._DEV_CPU]
+
+
+
+
+def profile(bulb):
+
+    return {
+        "mac"        : bulb.bulb[Bulb._DEV_MAC],
+        "hci_device" : bulb._hci_device,
+        "handles"    : dict(bulb.bulb[Bulb._HANDLES]),
+        "device"     : dict((key, bulb.bulb[key]) for key in _DEVICE_INFO)
+    }
+
+
+
+
+class Registry():
+
+    def __init__(self, filename = DEFAULT_FILE):
+
+        self._filename = os.path.realpath(os.path.expanduser(filename))
+
+        with _locks_lock:
+            self._lock = _locks.setdefault(self._filename, threading.Lock())
+
+
+
+
+    def _open(self, flag):
+
+        end = time.monotonic() + _LOCK_TIMEOUT
+        while True:
+            try:
+                return dbm.open(self._filename, flag)
+
+            except dbm.error as e:
+                if getattr(e, "errno", None) not in [errno.EAGAIN,
+                                                     errno.EACCES] \
+                        or time.monotonic() > end:
+                    raise
+
+            time.sleep(_LOCK_RETRY)
+
+
+
+
+    def _exists(self):
+
+        # nothing has been set up yet
+        return dbm.whichdb(self._filename) is not None
+
+
+
+
+    @staticmethod
+    def _get(db, key):
+
+        value = db.get(key.encode("utf-8"), None)
+        return None if value is None else json.loads(value.decode("utf-8"))
+
+
+
+
+    @staticmethod
+    def _put(db, key, value):
+        db[key.encode("utf-8")] = json.dumps(value).encode("utf-8")
+
+
+
+
+    def get(self, target):
+
+        with self._lock:
+            if not self._exists():
+                return None
+
+            with self._open("r") as db:
+                mac = Registry._get(db, _ALIAS + target)
+                return Registry._get(db, _MAC + (mac or target.upper()))
+
+
+
+
+    def mac(self, target):
+
+        _profile = self.get(target)
+        if _profile is not None:
+            return _profile["mac"]
+
+        if _MAC_PATTERN.match(target) is None:
+            raise ValueError("unknown bulb <%s>" % target)
+
+        return target.upper()
+
+
+
+
+    def put(self, _profile, alias = None):
+
+        mac = _profile["mac"].upper()
+        _profile = dict(_profile, mac = mac)
+
+        with self._lock, self._open("c") as db:
+
+            old = Registry._get(db, _MAC + mac)
+            if alias is None and old is not None:
+                alias = old.get("alias", None)
+
+            # an alias names one bulb only
+            if old is not None and old.get("alias", None) not in [None,
+                                                                   alias]:
+                del db[(_ALIAS + old["alias"]).encode("utf-8")]
+
+            if alias is not None:
+                other = Registry._get(db, _ALIAS + alias)
+                if other is not None and other != mac:
+                    _other = Registry._get(db, _MAC + other)
+                    Registry._put(db, _MAC + other,
+                                  dict(_other, alias = None))
+
+                Registry._put(db, _ALIAS + alias, mac)
+
+            Registry._put(db, _MAC + mac, dict(_profile, alias = alias))
+
+
+
+
+    def remove(self, target):
+
+        with self._lock, self._open("c") as db:
+
+            mac = Registry._get(db, _ALIAS + target) or target.upper()
+            _profile = Registry._get(db, _MAC + mac)
+            if _profile is None:
+                return False
+
+            if _profile.get("alias", None) is not None:
+                del db[(_ALIAS + _profile["alias"]).encode("utf-8")]
+
+            del db[(_MAC + mac).encode("utf-8")]
+            return True
+
+
+
+
+    def profiles(self):
+
+        with self._lock:
+            if not self._exists():
+                return []
+
+            with self._open("r") as db:
+                return [json.loads(db[key].decode("utf-8"))
+                        for key in sorted(db.keys())
+                        if key.startswith(_MAC.encode("utf-8"))]
+
+
+
+
+    def group(self, name):
+
+        with self._lock:
+            if not self._exists():
+                return None
+
+            with self._open("r") as db:
+                return Registry._get(db, _GROUP + name)
+
+
+
+
+    def set_group(self, name, targets):
+
+        macs = [self.mac(target) for target in targets]
+
+        with self._lock, self._open("c") as db:
+            if len(macs) > 0:
+                Registry._put(db, _GROUP + name, macs)
+            elif (_GROUP + name).encode("utf-8") in db:
+                del db[(_GROUP + name).encode("utf-8")]
+
+
+
+
+    def bulb(self, target, hci_device = "hci0"):
+
+        _profile = self.get(target)
+        if _profile is None:
+            return Bulb(mac = self.mac(target), hci_device = hci_device)
+
+        return Bulb(mac = _profile["mac"],
+                    hci_device = _profile["hci_device"],
+                    handles = _profile["handles"])
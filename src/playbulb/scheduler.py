@@ -0,0 +1,356 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Virtual timers on top of the four hardware timers of a bulb.
+
+Every bulb keeps any number of timer entries in a min-heap. Only the
+next four entries are programmed onto the hardware slots; a slot is
+refilled with the next pending entry as soon as its timer has fired.
+Entries further away than a day are held back since the bulb only
+knows the time of day of a timer.
+
+One global heap holds the points in time at which a bulb has to be
+looked at again, so adding or cancelling an entry and processing a
+fired timer are O(log n).
+
+Slots are written on a thread pool, so an unreachable bulb does not
+delay the others. The scheduler takes the slots as programmed only
+after a successful write, a failed write is retried later. Pass a
+`session` to share bulbs with other users, e.g. BulbPool.session by
+mac address, since one gatttool connection must not be used
+concurrently.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timedelta
+import heapq
+import itertools
+import threading
+
+from playbulb.mipow import Bulb
+
+
+_SLOTS = 4
+
+# wait for a timer to fire before its slot is reused
+_MARGIN = timedelta(seconds = 5)
+
+# hardware timers only know hh:mm, so never map anything a day ahead
+_WINDOW = timedelta(hours = 23)
+
+# retry of a failed write
+_RETRY = timedelta(seconds = 60)
+
+
+
+
+@contextmanager
+def _no_session(bulb):
+    yield bulb
+
+
+
+
+class TimerEntry():
+
+    __slots__ = ["start", "minutes", "color", "seq", "cancelled"]
+
+    def __init__(self, start, minutes, color, seq):
+
+        self.start = start
+        self.minutes = minutes
+        self.color = color
+        self.seq = seq
+        self.cancelled = False
+
+
+
+
+    def __lt__(self, other):
+        return (self.start, self.seq) < (other.start, other.seq)
+
+
+
+
+    def __repr__(self):
+        return "TimerEntry(%s, %d, %s)" % (self.start.strftime("%H:%M"),
+                                           self.minutes, self.color)
+
+
+
+
+class _BulbTimers():
+
+    def __init__(self, bulb):
+
+        self.bulb = bulb
+        self.pending = []
+        self.slots = [None] * _SLOTS
+
+        # a write is in flight, look again when it is done
+        self.writing = False
+        self.again = False
+
+
+
+
+class TimerScheduler():
+
+    DEFAULT_WORKERS = 8
+
+    def __init__(self, verify = True, clock = datetime.now,
+                 workers = DEFAULT_WORKERS, session = None):
+
+        self._verify = verify
+        self._clock = clock
+        self._session = session if session is not None else _no_session
+        self._executor = ThreadPoolExecutor(max_workers = workers)
+        self._bulbs = {}
+        self._events = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._running = False
+
+
+
+
+    def add(self, bulb, start, minutes = 0, color = Bulb.COLOR_WHITE):
+
+        with self._lock:
+            state = self._bulbs.get(bulb, None)
+            if state is None:
+                state = self._bulbs[bulb] = _BulbTimers(bulb)
+
+            entry = TimerEntry(start, min(minutes, 255), list(color),
+                               next(self._seq))
+            heapq.heappush(state.pending, entry)
+            self._wakeup(state, self._clock())
+
+        return entry
+
+
+
+
+    def cancel(self, bulb, entry):
+
+        with self._lock:
+            entry.cancelled = True
+            if entry in self._bulbs[bulb].slots:
+                self._wakeup(self._bulbs[bulb], self._clock())
+
+
+
+
+    def entries(self, bulb):
+
+        with self._lock:
+            state = self._bulbs.get(bulb, None)
+            if state is None:
+                return []
+
+            # an entry displaced by a write in flight is in both
+            return sorted(set(e for e in state.pending + state.slots
+                              if e is not None and not e.cancelled))
+
+
+
+
+    def _wakeup(self, state, when):
+
+        heapq.heappush(self._events, (when, next(self._seq), state))
+        self._changed.notify()
+
+
+
+
+    def _refill(self, state, now):
+
+        # mapped entries which are still to come
+        live = [e for e in state.slots
+                if e is not None and not e.cancelled and e.start > now]
+
+        while state.pending:
+            entry = state.pending[0]
+            if entry.cancelled or entry.start <= now:
+                heapq.heappop(state.pending)
+                continue
+
+            if entry.start - now > _WINDOW:
+                self._wakeup(state, entry.start - _WINDOW)
+                break
+
+            if len(live) == _SLOTS:
+                latest = max(live)
+                if not entry < latest:
+                    break
+
+                live.remove(latest)
+                heapq.heappush(state.pending, latest)
+
+            live.append(heapq.heappop(state.pending))
+
+        # keep entries in their slots, put new ones into free slots
+        slots = [e if e in live else None for e in state.slots]
+        for entry in live:
+            if entry not in slots:
+                slots[slots.index(None)] = entry
+
+        timers = [None] * _SLOTS
+        for i in range(_SLOTS):
+            if slots[i] is state.slots[i]:
+                continue
+
+            elif slots[i] is None:
+                timers[i] = { Bulb._START : [0xff, 0xff] }
+
+            else:
+                timers[i] = {
+                    Bulb._START   : [slots[i].start.hour,
+                                     slots[i].start.minute],
+                    Bulb._COLOR   : slots[i].color,
+                    Bulb._RUNTIME : slots[i].minutes
+                }
+
+        if timers == [None] * _SLOTS:
+            state.slots = slots
+            return None
+
+        return slots, timers
+
+
+
+
+    def _written(self, state, slots, ok):
+
+        with self._lock:
+            state.writing = False
+            now = self._clock()
+
+            if ok:
+                for entry in slots:
+                    if entry is not None and entry not in state.slots:
+                        self._wakeup(state, entry.start + _MARGIN)
+
+                state.slots = slots
+
+            else:
+                # entries taken for the slots are pending again
+                for entry in slots:
+                    if entry is not None and entry not in state.slots:
+                        heapq.heappush(state.pending, entry)
+
+                state.pending = [e for e in state.pending
+                                 if e not in state.slots]
+                heapq.heapify(state.pending)
+                self._wakeup(state, now + _RETRY)
+
+            if state.again:
+                state.again = False
+                self._wakeup(state, now)
+
+
+
+
+    def _write(self, state, slots, timers):
+
+        ok = False
+        try:
+            with self._session(state.bulb) as bulb:
+                ok = bulb.set_timers(timers, self._verify)
+        except Exception:
+            pass
+
+        finally:
+            self._written(state, slots, ok)
+
+        return ok
+
+
+
+
+    def tick(self, block = False):
+
+        now = self._clock()
+        writes = []
+
+        with self._lock:
+            # a bulb woken up many times is refilled once, in order
+            due = OrderedDict()
+            while self._events and self._events[0][0] <= now:
+                _, _, state = heapq.heappop(self._events)
+                due.setdefault(id(state), state)
+
+            for state in due.values():
+                if state.writing:
+                    state.again = True
+                    continue
+
+                refill = self._refill(state, now)
+                if refill is not None:
+                    state.writing = True
+                    writes.append((state,) + refill)
+
+        futures = [self._executor.submit(self._write, *write)
+                   for write in writes]
+        if block:
+            wait(futures)
+
+        return len(futures)
+
+
+
+
+    def run(self):
+
+        self._running = True
+
+        while self._running:
+            self.tick()
+
+            with self._lock:
+                timeout = 60
+                if self._events:
+                    timeout = min(timeout, (self._events[0][0]
+                                            - self._clock()).total_seconds())
+
+                if self._running and timeout > 0:
+                    self._changed.wait(timeout)
+
+
+
+
+    def stop(self):
+
+        with self._lock:
+            self._running = False
+            self._changed.notify()
+
+        self._executor.shutdown()
@@ -0,0 +1,426 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Scheduler service for a fleet of bulbs.
+
+The schedule file is json:
+
+    {
+      "location" : { "latitude" : 52.52, "longitude" : 13.40 },
+      "groups"   : { "living" : [ "AF:66:4B:0D:AC:E6", "AF:66:4B:0D:AC:E7" ] },
+      "schedule" : [
+        { "cron" : "30 6 * * 1-5", "targets" : [ "living" ],
+          "call" : "wakeup", "args" : [ 30 ] },
+        { "sunset" : -15, "targets" : [ "AF:66:4B:0D:AC:E6" ],
+          "state" : { "Color" : [ 0, 255, 47, 0 ] } },
+        { "cron" : "0 23 * * *", "targets" : [ "living" ], "call" : "off" }
+      ]
+    }
+
+An entry fires either by a five field cron expression or at sunrise /
+sunset plus an offset in minutes. It either applies a (partial) desired
+state, see Bulb.apply(), or calls a method of the bulb.
+
+All entries due in the same minute are grouped by bulb: their states are
+merged into one apply() and their calls follow on the same connection.
+Bulbs run concurrently on a thread pool and stay connected through a
+BulbPool between runs. Programs with more steps than the bulb has
+timers are handed to a TimerScheduler which runs next to the service.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+import json
+import math
+import threading
+import time
+
+from playbulb import program
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+from playbulb.scheduler import TimerScheduler
+
+
+# methods of a bulb which may be called by name, see call()
+CALLS = ["on", "off", "toggle", "color", "dim", "effect",
+          "set_timer", "unset_timer", "unset_all_timers",
+          "set_random", "unset_random", "ambient",
+          "wakeup", "doze", "bgr", "fade"]
+
+_PROGRAMS = {
+    "wakeup" : program.wakeup,
+    "doze"   : program.doze,
+    "bgr"    : program.bgr,
+    "fade"   : program.fade
+}
+
+# minute, hour, day of month, month, day of week
+_CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+_ZENITH = 90.833
+
+
+
+
+def _parse_cron_field(field, low, high):
+
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+
+        if part == "*":
+            first, last = low, high
+        elif "-" in part:
+            first, last = [int(v) for v in part.split("-")]
+        else:
+            first = last = int(part)
+
+        if first < low or last > high or first > last or step < 1:
+            raise ValueError("invalid cron field <%s>" % field)
+
+        values.update(range(first, last + 1, step))
+
+    return values
+
+
+
+
+class Cron():
+
+    def __init__(self, expression):
+
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("invalid cron expression <%s>" % expression)
+
+        self._minute, self._hour, self._day, self._month, self._weekday = [
+            _parse_cron_field(f, low, high)
+            for f, (low, high) in zip(fields, _CRON_RANGES)]
+
+        # sunday is 0 or 7
+        if 7 in self._weekday:
+            self._weekday.add(0)
+
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+
+
+
+    def match(self, t):
+
+        if t.minute not in self._minute or t.hour not in self._hour \
+                or t.month not in self._month:
+            return False
+
+        day = t.day in self._day
+        weekday = t.isoweekday() % 7 in self._weekday
+
+        # like cron, restricted day and weekday match either of them
+        if not self._any_day and not self._any_weekday:
+            return day or weekday
+
+        return day and weekday
+
+
+
+
+def call(bulb, name, args, scheduler = None):
+
+    if name not in CALLS:
+        raise ValueError("invalid call <%s>" % name)
+
+    # a fade starts from the color the bulb shows
+    if name in _PROGRAMS:
+        keyframes = _PROGRAMS[name](*args)
+        return program.load(bulb, program.compile(keyframes),
+                            scheduler = scheduler,
+                            color = program.first(keyframes)
+                            if name != "fade" else None)
+
+    elif type(args) is dict:
+        return getattr(bulb, name)(**args)
+
+    else:
+        return getattr(bulb, name)(*args)
+
+
+
+
+def sun(date, latitude, longitude, rising = True, zenith = _ZENITH):
+
+    # sunrise/sunset algorithm of the Almanac for Computers, 1990
+    n = date.timetuple().tm_yday
+    lng_hour = longitude / 15.0
+    t = n + ((6 if rising else 18) - lng_hour) / 24.0
+
+    m = 0.9856 * t - 3.289
+    l = (m + 1.916 * math.sin(math.radians(m))
+         + 0.020 * math.sin(math.radians(2 * m)) + 282.634) % 360
+
+    ra = math.degrees(math.atan(0.91764 * math.tan(math.radians(l)))) % 360
+    ra += math.floor(l / 90) * 90 - math.floor(ra / 90) * 90
+    ra /= 15
+
+    sin_dec = 0.39782 * math.sin(math.radians(l))
+    cos_dec = math.cos(math.asin(sin_dec))
+
+    cos_h = (math.cos(math.radians(zenith))
+             - sin_dec * math.sin(math.radians(latitude))) \
+        / (cos_dec * math.cos(math.radians(latitude)))
+
+    # polar day or night
+    if cos_h > 1 or cos_h < -1:
+        return None
+
+    h = math.degrees(math.acos(cos_h))
+    h = (360 - h if rising else h) / 15
+
+    # local mean time belongs to the date, in UT it may be the day
+    # before (east) or after (west)
+    ut = (h + ra - 0.06571 * t - 6.622) % 24 - lng_hour
+
+    utc = datetime(date.year, date.month, date.day, tzinfo = timezone.utc) \
+        + timedelta(hours = ut)
+
+    return utc.astimezone().replace(tzinfo = None, second = 0,
+                                    microsecond = 0)
+
+
+
+
+class Service():
+
+    DEFAULT_WORKERS = 8
+
+    def __init__(self, schedule, pool = None, workers = DEFAULT_WORKERS,
+                 verify = False):
+
+        self._location = schedule.get("location", None)
+        self._groups = schedule.get("groups", {})
+        self._entries = [self._compile(e) for e in schedule["schedule"]]
+
+        self._pool = pool if pool is not None else BulbPool()
+        self._executor = ThreadPoolExecutor(max_workers = workers)
+        self._verify = verify
+        self._sun = {}
+        self._running = threading.Event()
+
+        # refills of long programs share the connections of the pool
+        self._timers = TimerScheduler(
+            verify, workers = workers,
+            session = lambda bulb: self._pool.session(
+                bulb.bulb[Bulb._DEV_MAC]))
+
+
+
+
+    @staticmethod
+    def load(filename, **kwargs):
+
+        with open(filename, "r") as _file:
+            return Service(json.load(_file), **kwargs)
+
+
+
+
+    def _compile(self, entry):
+
+        entry = dict(entry)
+
+        if "cron" in entry:
+            entry["cron"] = Cron(entry["cron"])
+
+        elif "sunrise" in entry or "sunset" in entry:
+            if self._location is None:
+                raise ValueError("sunrise and sunset require a location")
+
+        else:
+            raise ValueError("entry requires cron, sunrise or sunset")
+
+        if "call" in entry and entry["call"] not in CALLS:
+            raise ValueError("invalid call <%s>" % entry["call"])
+
+        if "call" not in entry and "state" not in entry:
+            raise ValueError("entry requires call or state")
+
+        return entry
+
+
+
+
+    def _targets(self, entry):
+
+        macs = []
+        for target in entry["targets"]:
+            for mac in self._groups.get(target, [target]):
+                if mac not in macs:
+                    macs.append(mac)
+
+        return macs
+
+
+
+
+    def _sun_time(self, date, rising):
+
+        key = (date, rising)
+        if key not in self._sun:
+            self._sun[key] = sun(date,
+                                 self._location["latitude"],
+                                 self._location["longitude"],
+                                 rising)
+
+        return self._sun[key]
+
+
+
+
+    def _is_due(self, entry, now):
+
+        if "cron" in entry:
+            return entry["cron"].match(now)
+
+        rising = "sunrise" in entry
+        offset = timedelta(minutes = entry["sunrise" if rising else "sunset"])
+
+        # the offset may shift the event to the day before or after
+        for days in [-1, 0, 1]:
+            t = self._sun_time(now.date() + timedelta(days = days), rising)
+            if t is not None and t + offset == now:
+                return True
+
+        return False
+
+
+
+
+    def due(self, now):
+
+        now = now.replace(second = 0, microsecond = 0)
+
+        actions = OrderedDict()
+        for entry in self._entries:
+            if self._is_due(entry, now):
+                for mac in self._targets(entry):
+                    actions.setdefault(mac, []).append(entry)
+
+        return actions
+
+
+
+
+    def _perform(self, mac, entries):
+
+        # coalesce all states due at the same instant into one apply
+        state = {}
+        for entry in entries:
+            state.update(entry.get("state", {}))
+
+        # methods of Bulb return False if the bulb has not taken a change
+        with self._pool.session(mac) as bulb:
+            if state and not bulb.apply(state, self._verify):
+                raise IOError("state of bulb <%s> has failed" % mac)
+
+            for entry in entries:
+                if "call" in entry and call(bulb, entry["call"],
+                                            entry.get("args", []),
+                                            self._timers) is False:
+                    raise IOError("%s of bulb <%s> has failed"
+                                  % (entry["call"], mac))
+
+
+
+
+    def run_once(self, now = None):
+
+        now = now if now is not None else datetime.now()
+
+        futures = OrderedDict(
+            (mac, self._executor.submit(self._perform, mac, entries))
+            for mac, entries in self.due(now).items())
+
+        results = OrderedDict()
+        for mac, future in futures.items():
+            try:
+                future.result()
+                results[mac] = None
+            except Exception as e:
+                results[mac] = e
+
+        return results
+
+
+
+
+    def run(self):
+
+        threading.Thread(target = self._timers.run, daemon = True).start()
+
+        self._running.set()
+        minute = datetime.now().replace(second = 0, microsecond = 0)
+
+        while self._running.is_set():
+            self.run_once(minute)
+
+            # every minute once, even if a run took longer
+            minute += timedelta(minutes = 1)
+            delay = (minute - datetime.now()).total_seconds()
+            if delay > 0:
+                time.sleep(delay)
+
+
+
+
+    def stop(self):
+
+        self._running.clear()
+        self._timers.stop()
+        self._executor.shutdown()
+        self._pool.close()
+
+
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python -m playbulb.service <schedule.json>")
+        sys.exit(1)
+
+    service = Service.load(sys.argv[1])
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        service.stop()
@@ -0,0 +1,200 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Snapshots of the state of many bulbs as NDJSON.
+
+export() writes one compact json line per bulb as soon as the bulb has
+been read, in the order the bulbs answer, e.g.
+
+    {"state":{"Color":[0,255,0,0],"Effect":{...},...},"target":"AF:..."}
+    {"error":"bulb <AF:...> is not reachable","target":"AF:..."}
+
+Only the state that can be restored is written, i.e. color, effect,
+timers and random mode. restore() reads such lines one by one and
+applies each state to its bulb. The current state of the bulb is read
+first, so only what differs gets written, see Bulb.apply(). Lines with
+errors are skipped.
+
+Neither side holds more than the bulbs in progress in memory, so
+snapshots of large fleets can be piped from one to the other.
+"""
+
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import json
+import threading
+
+from playbulb.mipow import Bulb
+
+
+RestoreResult = namedtuple("RestoreResult", ["mac", "writes", "error"])
+
+DEFAULT_WORKERS = 8
+
+# restorable state and what has to be read to restore it minimally
+_SAVED = {
+    Bulb._COLOR      : Bulb.INIT_COLOR + Bulb.INIT_EFFECT,
+    Bulb._EFFECT     : Bulb.INIT_COLOR + Bulb.INIT_EFFECT,
+    Bulb._TIMER      : Bulb.INIT_TIMER,
+    Bulb._RANDOMMODE : Bulb.INIT_RANDOM
+}
+
+
+
+
+def _level(keys):
+
+    level = 0
+    for key in keys:
+        level |= _SAVED[key]
+
+    return level
+
+
+
+
+def _bulb(mac, factory, hci_device):
+
+    if factory is None:
+        return Bulb(mac = mac, hci_device = hci_device)
+
+    return factory(mac, hci_device)
+
+
+
+
+def _export(mac, out, lock, factory, hci_device):
+
+    record = { "target" : mac }
+
+    bulb = None
+    try:
+        bulb = _bulb(mac, factory, hci_device)
+        if not bulb.sync(_level(_SAVED), True):
+            raise IOError("bulb <%s> is not reachable" % mac)
+
+        record["state"] = dict((key, bulb.bulb[key]) for key in _SAVED)
+
+    except Exception as e:
+        record["error"] = str(e)
+
+    finally:
+        if bulb is not None:
+            bulb.disconnect()
+
+    line = json.dumps(record, separators = (",", ":"), sort_keys = True)
+    with lock:
+        out.write(line + "\n")
+        out.flush()
+
+    return "error" not in record
+
+
+
+
+def export(macs, out, workers = DEFAULT_WORKERS, factory = None,
+           hci_device = "hci0"):
+
+    lock = threading.Lock()
+
+    # each worker writes its line itself, no state is kept until the end
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        futures = [executor.submit(_export, mac, out, lock, factory,
+                                   hci_device)
+                   for mac in macs]
+
+        return all([future.result() for future in futures])
+
+
+
+
+def _restore(mac, state, verify, factory, hci_device):
+
+    bulb = None
+    try:
+        bulb = _bulb(mac, factory, hci_device)
+        if not bulb.sync(_level(state), True):
+            raise IOError("bulb <%s> is not reachable" % mac)
+
+        writes = len(bulb.plan(state))
+        if not bulb.apply(state, verify):
+            raise IOError("state of bulb <%s> has not been restored" % mac)
+
+        return RestoreResult(mac = mac, writes = writes, error = None)
+
+    except Exception as e:
+        return RestoreResult(mac = mac, writes = None, error = e)
+
+    finally:
+        if bulb is not None:
+            bulb.disconnect()
+
+
+
+
+def _records(lines):
+
+    for i, line in enumerate(lines):
+        if len(line.strip()) == 0:
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError("line %i: invalid json" % (i + 1))
+
+        if record.get("state", None) is None:
+            continue
+
+        state = dict((key, value) for key, value in record["state"].items()
+                     if key in _SAVED)
+        yield record["target"], state
+
+
+
+
+def restore(lines, workers = DEFAULT_WORKERS, verify = False,
+            factory = None, hci_device = "hci0"):
+
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+
+        # read ahead no further than the workers can take
+        pending = set()
+        for mac, state in _records(lines):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+            pending.add(executor.submit(_restore, mac, state, verify,
+                                        factory, hci_device))
+
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
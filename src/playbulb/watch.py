@@ -0,0 +1,204 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Watch a bulb for changes of its color and effect.
+
+The bulb does not notify about changes, so the watcher polls the color
+and effect characteristics on one connection. A poll only reads the raw
+values and compares them with the last ones, values are decoded only if
+they have changed. While nothing changes the poll interval doubles up
+to a maximum, by default DEFAULT_BACKOFF times the base interval, and
+falls back to the base interval on the next change, so reads follow the
+changes rather than the time.
+
+A poll which fails on the link, i.e. with IOError or an error of
+gatttool or pexpect, reports the bulb as disconnected and connects
+again on the next poll. Any other error is raised.
+
+changes() yields only the fields that have changed, effects down to
+their single values, e.g.
+
+    { "Color" : [ 0, 255, 0, 0 ] }
+    { "Effect" : { "Hold" : 20 } }
+    { "Connected" : false }
+
+The first poll yields the full watched state.
+"""
+
+from datetime import datetime
+import threading
+
+from playbulb.mipow import Bulb
+
+
+# volatile characteristics and the state each of them is decoded into
+_WATCHED = [
+    (Bulb._CHARACTERISTIC_COLOR, Bulb._read_color, Bulb._COLOR),
+    (Bulb._CHARACTERISTIC_EFFECT, Bulb._read_effect, Bulb._EFFECT)
+]
+
+
+
+
+def diff(old, new):
+
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            sub = diff(old[key], value)
+            if sub:
+                changes[key] = sub
+
+        elif old[key] != value:
+            changes[key] = value
+
+    return changes
+
+
+
+
+def _link_errors():
+
+    # gatttool and with it pexpect are loaded by the first connect anyway
+    import pexpect
+    from gatttool.bledevice import BluetoothLEError
+
+    return (IOError, BluetoothLEError, pexpect.ExceptionPexpect)
+
+
+
+
+class Watcher():
+
+    DEFAULT_INTERVAL = 1.0
+    DEFAULT_BACKOFF = 8
+
+    def __init__(self, bulb, interval = DEFAULT_INTERVAL,
+                 max_interval = None):
+
+        self._bulb = bulb
+        self._interval = interval
+        self._max_interval = interval * Watcher.DEFAULT_BACKOFF \
+            if max_interval is None else max(interval, max_interval)
+        self._raw = {}
+        self._state = {}
+        self._stop = threading.Event()
+
+
+
+
+    def stop(self):
+        self._stop.set()
+
+
+
+
+    def poll(self):
+
+        if not self._bulb.connect():
+            raise IOError("bulb <%s> is not reachable"
+                          % self._bulb.bulb[Bulb._DEV_MAC])
+
+        handles = self._bulb.bulb[Bulb._HANDLES]
+
+        before = self._bulb._snapshot()
+
+        changed = False
+        for characteristic, decode, key in _WATCHED:
+            raw = bytes(self._bulb._read_hnd(handles[characteristic]))
+            if self._raw.get(characteristic, None) != raw:
+                self._raw[characteristic] = raw
+                decode(self._bulb, raw)
+                changed = True
+
+        self._bulb._publish(before)
+
+        if not changed:
+            return {}
+
+        state = dict((key, self._bulb.bulb[key]) for c, d, key in _WATCHED)
+        state[Bulb._CONNECTED] = True
+
+        changes = diff(self._state, state)
+        self._state = state
+
+        return changes
+
+
+
+
+    def _lost(self):
+
+        self._bulb.disconnect()
+        self._raw = {}
+
+        if not self._state.get(Bulb._CONNECTED, True):
+            return {}
+
+        self._state = { Bulb._CONNECTED : False }
+        return dict(self._state)
+
+
+
+
+    def changes(self):
+
+        errors = _link_errors()
+
+        self._stop.clear()
+        interval = self._interval
+
+        while not self._stop.is_set():
+
+            try:
+                changes = self.poll()
+            except errors:
+                changes = self._lost()
+
+            if changes:
+                interval = self._interval
+                yield changes
+            else:
+                interval = min(interval * 2, self._max_interval)
+
+            self._stop.wait(interval)
+
+
+
+
+def lines(watcher, mac):
+
+    import json
+
+    for changes in watcher.changes():
+        yield json.dumps({
+            "target"  : mac,
+            "time"    : datetime.now().isoformat(timespec = "milliseconds"),
+            "changes" : changes
+        }, separators = (",", ":"), sort_keys = True)
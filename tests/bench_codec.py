@@ -0,0 +1,81 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Micro benchmark of playbulb.codec against the list based code.
+
+    python tests/bench_codec.py [<number>]
+"""
+
+from datetime import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import legacy
+from playbulb import codec
+
+
+_NOW = datetime(2026, 1, 1, 6, 30, 15)
+_COLOR = (0, 255, 128, 0)
+_TIMERS = memoryview(bytes(range(14)))
+_EFFECTS = memoryview(bytes(range(20)))
+_RANDOM = memoryview(bytes(range(13)))
+
+_CASES = [
+    ("encode effect",
+     lambda m: m.encode_effect(_COLOR, 1, 20)),
+    ("decode effect",
+     lambda m: m.decode_effect(_EFFECTS)),
+    ("encode timer",
+     lambda m: m.encode_timer(1, 0, _NOW, 0, (7, 0), _COLOR, 30)),
+    ("decode timers",
+     lambda m: m.decode_timers(_TIMERS, _EFFECTS)),
+    ("encode random",
+     lambda m: m.encode_random(_NOW, (7, 0), (22, 0), 5, 30, _COLOR)),
+    ("decode random",
+     lambda m: m.decode_random(_RANDOM))
+]
+
+
+
+
+def bench(number):
+
+    print("%-16s %10s %10s" % ("us per call", "legacy", "codec"))
+    for name, case in _CASES:
+        times = [min(timeit.repeat(lambda: case(module), number = number,
+                                   repeat = 5)) / number * 1e6
+                 for module in [legacy, codec]]
+        print("%-16s %10.2f %10.2f" % (name, times[0], times[1]))
+
+
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Micro benchmark of playbulb.colors: tables and memoized strings against
+computing each color on every call.
+
+    python tests/bench_colors.py [<number>]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from playbulb import colors
+
+
+_CASES = [
+    ("kelvin",
+     lambda: colors.from_rgb(*colors._kelvin_to_rgb(2700)),
+     lambda: colors.from_kelvin(2700)),
+    ("parse kelvin",
+     lambda: list(colors._parse_str.__wrapped__("2700K")),
+     lambda: colors.parse("2700K")),
+    ("parse hsv",
+     lambda: list(colors._parse_str.__wrapped__("hsv(30, 1.0, 0.5)")),
+     lambda: colors.parse("hsv(30, 1.0, 0.5)")),
+    ("parse hex",
+     lambda: list(colors._parse_str.__wrapped__("#ff8000")),
+     lambda: colors.parse("#ff8000"))
+]
+
+
+
+
+def bench(number):
+
+    print("%-16s %10s %10s" % ("us per call", "computed", "cached"))
+    for name, computed, cached in _CASES:
+        times = [min(timeit.repeat(case, number = number,
+                                   repeat = 5)) / number * 1e6
+                 for case in [computed, cached]]
+        print("%-16s %10.2f %10.2f" % (name, times[0], times[1]))
+
+
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Fixtures for the tests, which run without bluetooth.
+
+FakeDevice stands in for gatttool.bledevice.BTLEDevice. It keeps the
+value of each handle and records every read and write. Color and effect
+are read back as written, timers and the random mode are read back in
+their read layouts, like the bulb does, the other characteristics keep
+their value. A device which is not reachable fails to connect.
+
+The devices fixture makes Bulb.connect() create FakeDevices, so bulbs
+built by the code under test, e.g. from the registry, run on fakes.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from playbulb.mipow import Bulb
+
+
+
+
+def handle(characteristic):
+    return Bulb.bulb[Bulb._HANDLES][characteristic]
+
+
+
+
+class FakeDevice():
+
+    def __init__(self, values = None, reachable = True):
+
+        self.values = dict(values) if values is not None else {}
+        self.reachable = reachable
+        self.echo = [handle(Bulb._CHARACTERISTIC_COLOR),
+                     handle(Bulb._CHARACTERISTIC_EFFECT)]
+        self.timer = handle(Bulb._CHARACTERISTIC_TIMER)
+        self.timer_effect = handle(Bulb._CHARACTERISTIC_TIMER_EFFECT)
+        self.random = handle(Bulb._CHARACTERISTIC_RANDOMMODE)
+        self.reads = []
+        self.writes = []
+        self.stopped = False
+
+
+
+
+    def connect(self, timeout = None):
+
+        if not self.reachable:
+            from gatttool import bledevice
+            raise bledevice.NotConnectedError("not reachable")
+
+
+
+
+    def stop(self):
+        self.stopped = True
+
+
+
+
+    def char_read_hnd(self, handle):
+
+        self.reads.append(handle)
+        return bytearray(self.values.get(handle, bytes(20)))
+
+
+
+
+    def char_write(self, handle, value, wait_for_response = False):
+
+        self.writes.append((handle, bytes(value), wait_for_response))
+        if handle in self.echo:
+            self.values[handle] = bytes(value)
+        elif handle == self.timer:
+            self._write_timer(bytes(value))
+        elif handle == self.random:
+            self._write_random(bytes(value))
+
+
+
+
+    def _write_timer(self, value):
+
+        # slot, type, now (s m h), setter, start (m h), w r g b, runtime
+        slot, type_ = value[0], value[1]
+
+        timers = bytearray(self.values.get(self.timer, bytes(20)))
+        timers[slot * 3:slot * 3 + 3] = bytes([type_, value[7], value[6]])
+        timers[12:14] = bytes([value[4], value[3]])
+        self.values[self.timer] = bytes(timers)
+
+        effects = bytearray(self.values.get(self.timer_effect, bytes(20)))
+        effects[slot * 5:slot * 5 + 5] = value[8:13]
+        self.values[self.timer_effect] = bytes(effects)
+
+
+
+
+    def _write_random(self, value):
+
+        # now (s m h), start (h m), stop (h m), min, max, w r g b
+        status = 0 if value[3:5] == bytes([0xff, 0xff]) else 3
+        self.values[self.random] = bytes([status, 0, 0]) + value[3:13]
+
+
+
+
+def connected(values = None, mac = "AF:66:4B:0D:AC:E6"):
+
+    # known handles, no discovery
+    bulb = Bulb(mac = mac, handles = {})
+    bulb._btle_device = FakeDevice(values)
+    bulb.bulb[Bulb._CONNECTED] = True
+
+    return bulb
+
+
+
+
+@pytest.fixture
+def bulb():
+    return connected({
+        handle(Bulb._CHARACTERISTIC_EFFECT) : bytes([0, 0, 0, 0,
+                                                     255, 0, 0, 0])
+    })
+
+
+
+
+@pytest.fixture
+def devices(monkeypatch):
+
+    # FakeDevice of each mac address, created on the first connect
+    from gatttool import bledevice
+
+    _devices = {}
+    monkeypatch.setattr(bledevice, "BTLEDevice",
+                        lambda mac, hci_device = "hci0":
+                        _devices.setdefault(mac, FakeDevice()))
+
+    return _devices
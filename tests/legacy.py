@@ -0,0 +1,112 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Payload code of mipow.py before playbulb.codec, as reference.
+
+Payloads were built by concatenating int lists and decoded by slicing
+the int list of a read characteristic.
+"""
+
+
+
+
+def encode_color(color):
+    return bytearray(color)
+
+
+
+
+def decode_color(data):
+    return [b for b in data]
+
+
+
+
+def encode_effect(color, effect, hold):
+    return bytearray(list(color) + [effect, 0, hold, 0])
+
+
+
+
+def decode_effect(data):
+
+    _hex = [b for b in data]
+    return _hex[:4], _hex[4], _hex[6]
+
+
+
+
+def encode_timer(slot, type_, now, setter, start, color, runtime):
+
+    return bytearray([slot,
+                      type_,
+                      now.second,
+                      now.minute,
+                      now.hour,
+                      setter,
+                      start[1],
+                      start[0]]
+                     + list(color)
+                     + [runtime])
+
+
+
+
+def decode_timers(timers, effects):
+
+    _hex_timers = [b for b in timers]
+    _hex_timer_fx = [b for b in effects]
+
+    slots = []
+    for i in range(4):
+        slots.append((_hex_timers[i * 3 + 0],
+                      _hex_timers[i * 3 + 1:i * 3 + 3],
+                      _hex_timer_fx[i * 5 + 0:i * 5 + 4],
+                      _hex_timer_fx[i * 5 + 4]))
+
+    return _hex_timers[12:14], slots
+
+
+
+
+def encode_random(now, start, stop, run_min, run_max, color):
+
+    return bytearray([now.second,
+                      now.minute,
+                      now.hour]
+                     + list(start)
+                     + list(stop)
+                     + [run_min, run_max]
+                     + list(color))
+
+
+
+
+def decode_random(data):
+
+    _hex = [b for b in data]
+    return (_hex[0], _hex[3:5], _hex[5:7], _hex[7], _hex[8],
+            _hex[9:13])
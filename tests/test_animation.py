@@ -0,0 +1,163 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of Animation with a clock under control of the test.
+"""
+
+import pytest
+
+from conftest import connected
+from playbulb.animation import Animation
+from playbulb.mipow import Bulb
+
+
+_RED = [0, 255, 0, 0]
+
+
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+
+
+class FrameBulb():
+
+    # records color() at the time of the clock, each write takes `write`
+    def __init__(self, clock, write = 0.0, reachable = True):
+
+        self.clock = clock
+        self.write = write
+        self.reachable = reachable
+        self.frames = []
+        self.bulb = { Bulb._DEV_MAC : "AF:66:4B:0D:AC:E6" }
+
+    def color(self, color):
+
+        if not self.reachable:
+            return False
+
+        self.frames.append((self.clock.now, color))
+        self.clock.now += self.write
+        return True
+
+
+
+
+def animation(bulb, clock, fps):
+
+    animation = Animation(bulb, fps = fps, clock = clock)
+
+    def wait(delay):
+        clock.now += delay
+        return False
+
+    animation._stop.wait = wait
+
+    return animation
+
+
+
+
+def test_frames_on_time():
+
+    clock = Clock()
+    bulb = FrameBulb(clock)
+
+    stats = animation(bulb, clock, 4).play([(0, Bulb.COLOR_OFF),
+                                            (2, _RED)])
+
+    assert [t for t, c in bulb.frames] == [i * 0.25 for i in range(9)]
+    assert bulb.frames[0][1] == Bulb.COLOR_OFF
+    assert bulb.frames[-1][1] == _RED
+    assert stats.frames == 9
+    assert stats.dropped == 0
+    assert stats.late == 0.0
+    assert stats.jitter == 0.0
+
+
+
+
+def test_slow_link_drops_stale_frames():
+
+    clock = Clock()
+    bulb = FrameBulb(clock, write = 0.625)
+
+    stats = animation(bulb, clock, 4).play([(0, Bulb.COLOR_OFF),
+                                            (2, _RED)])
+
+    # frames 0, 2, 5 and 7 are sent late by the writes before them
+    assert [t for t, c in bulb.frames] == [0.0, 0.625, 1.25, 1.875, 2.5]
+    assert bulb.frames[-1][1] == _RED
+    assert stats.frames == 5
+    assert stats.dropped == 6
+    assert stats.late == 0.125
+
+
+
+
+def test_same_colors_are_sent_once():
+
+    clock = Clock()
+    bulb = FrameBulb(clock)
+
+    stats = animation(bulb, clock, 4).play([(0, _RED), (2, _RED)])
+
+    assert bulb.frames == [(0.0, _RED)]
+    assert stats.frames == 1
+
+
+
+
+def test_unreachable_bulb():
+
+    clock = Clock()
+
+    with pytest.raises(IOError):
+        animation(FrameBulb(clock, reachable = False), clock, 4) \
+            .play([(0, Bulb.COLOR_OFF), (2, _RED)])
+
+
+
+
+def test_fade_starts_from_the_color_of_the_bulb():
+
+    bulb = connected()
+    bulb._btle_device.values[bulb.bulb[Bulb._HANDLES][
+        Bulb._CHARACTERISTIC_COLOR]] = bytes([0, 0, 255, 0])
+
+    clock = Clock()
+    animation(bulb, clock, 4).fade(_RED, 1)
+
+    writes = bulb._btle_device.writes
+    assert writes[0][1][:4] == bytes([0, 0, 255, 0])
+    assert writes[-1][1][:4] == bytes(_RED)
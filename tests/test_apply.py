@@ -0,0 +1,167 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of Bulb.apply() and the methods built on it, on a FakeDevice.
+"""
+
+from conftest import connected
+from conftest import handle
+from playbulb import codec
+from playbulb.mipow import Bulb
+
+
+_COLOR = handle(Bulb._CHARACTERISTIC_COLOR)
+_EFFECT = handle(Bulb._CHARACTERISTIC_EFFECT)
+_TIMER = handle(Bulb._CHARACTERISTIC_TIMER)
+
+
+
+
+class DeafDevice():
+
+    # takes every write but keeps reporting the old values
+    def __init__(self, device):
+        self._device = device
+        self.writes = []
+
+    def char_read_hnd(self, handle):
+        return self._device.char_read_hnd(handle)
+
+    def char_write(self, handle, value, wait_for_response = False):
+        self.writes.append((handle, bytes(value), wait_for_response))
+
+    def stop(self):
+        pass
+
+
+
+
+def test_apply_writes_only_once(bulb):
+
+    # a color is always written while an effect may be running
+    bulb.sync(Bulb.INIT_COLOR + Bulb.INIT_EFFECT)
+
+    assert bulb.apply({ Bulb._COLOR : Bulb.COLOR_RED }, False)
+    assert bulb.apply({ Bulb._COLOR : Bulb.COLOR_RED }, False)
+
+    writes = bulb._btle_device.writes
+    assert writes == [(_COLOR, codec.encode_color(Bulb.COLOR_RED), False)]
+    assert bulb.bulb[Bulb._COLOR] == Bulb.COLOR_RED
+
+
+
+
+def test_apply_verifies_by_reading_back(bulb):
+
+    assert bulb.apply({ Bulb._COLOR : Bulb.COLOR_BLUE }, True)
+
+    device = bulb._btle_device
+    assert _COLOR in device.reads
+    assert bulb.bulb[Bulb._SYNC] & Bulb.INIT_COLOR
+
+
+
+
+def test_apply_reports_a_change_not_taken(bulb):
+
+    bulb._btle_device = DeafDevice(bulb._btle_device)
+
+    assert not bulb.apply({ Bulb._COLOR : Bulb.COLOR_BLUE }, True)
+    assert len(bulb._btle_device.writes) == 1
+
+
+
+
+def test_verified_timers_are_pipelined(bulb):
+
+    timers = [{ Bulb._START   : [7, i],
+                Bulb._COLOR   : Bulb.COLOR_WHITE,
+                Bulb._RUNTIME : 5 } for i in range(4)]
+
+    assert bulb.apply({ Bulb._TIMER : timers }, True) is True
+
+    writes = [w for w in bulb._btle_device.writes if w[0] == _TIMER]
+    assert len(writes) == 4
+    assert not any(response for h, v, response in writes)
+
+    # without verification each write waits for its response
+    other = connected()
+    other.apply({ Bulb._TIMER : timers }, False)
+    assert all(response for h, v, response in other._btle_device.writes)
+
+
+
+
+def test_verified_random_mode(bulb):
+
+    randommode = { Bulb._START : [20, 0],
+                   Bulb._STOP  : [23, 30],
+                   Bulb._MIN   : 5,
+                   Bulb._MAX   : 30,
+                   Bulb._COLOR : Bulb.COLOR_RED }
+
+    assert bulb.apply({ Bulb._RANDOMMODE : randommode }, True) is True
+    assert bulb.apply({ Bulb._RANDOMMODE : {} }, True) is True
+
+
+
+
+def test_unreachable_bulb(bulb):
+
+    bulb.bulb[Bulb._CONNECTED] = False
+    bulb.connect = lambda: False
+
+    assert bulb.apply({ Bulb._COLOR : Bulb.COLOR_RED }, False) is False
+    assert bulb.color(Bulb.COLOR_RED) is False
+    assert bulb.off() is False
+    assert bulb.toggle() is False
+    assert bulb.dim(incr = 32) is False
+    assert bulb._btle_device.writes == []
+
+
+
+
+def test_nothing_to_do_needs_no_connection(bulb):
+
+    bulb.sync(Bulb.INIT_COLOR + Bulb.INIT_EFFECT)
+    bulb.apply({ Bulb._COLOR : Bulb.COLOR_RED }, False)
+    bulb.connect = lambda: False
+
+    assert bulb.apply({ Bulb._COLOR : Bulb.COLOR_RED }, False)
+
+
+
+
+def test_off_and_toggle_restore_the_color(bulb):
+
+    bulb.color(Bulb.COLOR_GREEN)
+    assert bulb.off()
+    assert bulb.bulb[Bulb._COLOR] == Bulb.COLOR_OFF
+
+    assert bulb.toggle()
+    assert bulb.bulb[Bulb._COLOR] == Bulb.COLOR_GREEN
+    assert bulb._btle_device.values[_COLOR] \
+        == codec.encode_color(Bulb.COLOR_GREEN)
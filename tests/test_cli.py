@@ -0,0 +1,189 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of mipow_cli on fake devices, without daemon.
+"""
+
+import json
+import time
+
+import pytest
+
+import mipow_cli
+from conftest import FakeDevice
+from conftest import connected
+from playbulb import registry
+
+
+_DESK = "AF:66:4B:0D:AC:E6"
+_SHELF = "AF:66:4B:0D:AC:E7"
+
+
+
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch, devices):
+
+    _registry = registry.Registry(str(tmp_path / "bulbs"))
+    for mac, alias in [(_DESK, "desk"), (_SHELF, "shelf")]:
+        _registry.put(registry.profile(connected(mac = mac)), alias)
+
+    monkeypatch.setattr(mipow_cli, "_registry", lambda: _registry)
+    monkeypatch.setattr(mipow_cli, "DEFAULT_SOCKET",
+                        str(tmp_path / "mipow.sock"))
+
+    return devices
+
+
+
+
+def _perform(*args):
+    return mipow_cli.perform(["mipow"] + list(args))
+
+
+
+
+def test_command(cli, capsys):
+
+    assert _perform("desk", "color", "red") is not False
+    assert cli[_DESK].writes[-1][1][:4] == bytes([0, 255, 0, 0])
+
+
+
+
+def test_animate(cli, capsys):
+
+    assert _perform("desk", "animate", "0", "0", "255", "0", "0") is not False
+    assert cli[_DESK].writes[-1][1][:4] == bytes([0, 255, 0, 0])
+
+
+
+
+def test_unreachable_bulb_fails(cli, capsys):
+
+    cli[_DESK] = FakeDevice(reachable = False)
+
+    assert _perform("desk", "off") is False
+    assert "ERROR: bulb <%s>" % _DESK in capsys.readouterr().err
+
+
+
+
+def test_unreachable_bulb_of_many_fails(cli, capsys):
+
+    cli[_SHELF] = FakeDevice(reachable = False)
+
+    assert _perform("desk,shelf", "color", "red") is False
+
+    out = capsys.readouterr().out.splitlines()
+    assert out == [ "%s ok" % _DESK,
+                    "%s ERROR: bulb <%s> has failed to color, it may not "
+                    "be reachable" % (_SHELF, _SHELF) ]
+
+
+
+
+def test_ndjson_status_of_unreachable_bulb(cli, capsys):
+
+    cli[_DESK] = FakeDevice(reachable = False)
+
+    assert _perform("--ndjson", "desk", "status") is False
+
+    record = json.loads(capsys.readouterr().out)
+    assert record["target"] == _DESK
+    assert record["ok"] is False
+    assert record["output"] is None
+
+
+
+
+@pytest.mark.parametrize("args", [
+    [ "--ndjson" ], [ "desk" ], [ "--ndjson", "desk" ]
+])
+def test_missing_command(cli, args):
+
+    with pytest.raises(mipow_cli.HelpException):
+        _perform(*args)
+
+
+
+
+
+def test_batch_of_unreachable_bulb(cli, tmp_path, capsys):
+
+    cli[_SHELF] = FakeDevice(reachable = False)
+
+    lines = tmp_path / "scene"
+    lines.write_text("desk color red\nshelf on\nshelf color blue\n"
+                     "desk off\n")
+
+    assert _perform("batch", str(lines)) is False
+
+    # the bulb is not tried again after its first failure
+    error = "bulb <%s> has failed to on, it may not be reachable" % _SHELF
+    assert capsys.readouterr().err.splitlines() == [
+        "ERROR: Line 2: " + error,
+        "ERROR: Line 3: " + error ]
+    assert cli[_DESK].writes[-1][1][:4] == bytes([0, 0, 0, 0])
+
+
+
+
+class SlowDevice(FakeDevice):
+
+    def char_read_hnd(self, handle):
+
+        time.sleep(0.5)
+        return FakeDevice.char_read_hnd(self, handle)
+
+
+
+
+def test_fleet_returns_at_the_deadline(cli, capsys):
+
+    cli[_SHELF] = SlowDevice()
+
+    started = time.monotonic()
+    assert _perform("fleet", "desk,shelf", "0.2") is False
+    assert time.monotonic() - started < 0.5
+
+    records = [json.loads(line)
+               for line in capsys.readouterr().out.splitlines()]
+    assert [(r["target"], r["stale"]) for r in records] == [
+        (_DESK, False), (_SHELF, True) ]
+
+
+
+
+def test_fleet_of_unreachable_bulb(cli, capsys):
+
+    cli[_SHELF] = FakeDevice(reachable = False)
+
+    assert _perform("fleet", "desk,shelf") is False
+
+    records = [json.loads(line)
+               for line in capsys.readouterr().out.splitlines()]
+    assert records[1]["error"] == "bulb <%s> is not reachable" % _SHELF
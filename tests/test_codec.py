@@ -0,0 +1,169 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Round trips of playbulb.codec against the list based code it replaced.
+"""
+
+from datetime import datetime
+import random
+import struct
+
+import pytest
+
+import legacy
+from playbulb import codec
+
+
+_RUNS = 500
+
+
+
+
+def _byte(rnd):
+    return rnd.randrange(256)
+
+
+
+
+def _color(rnd):
+    return tuple(_byte(rnd) for i in range(4))
+
+
+
+
+def _time(rnd):
+    return (rnd.randrange(24), rnd.randrange(60))
+
+
+
+
+def _now(rnd):
+    return datetime(2026, 1, 1, *_time(rnd), rnd.randrange(60))
+
+
+
+
+@pytest.fixture
+def rnd():
+    return random.Random(29)
+
+
+
+
+def test_color(rnd):
+
+    for i in range(_RUNS):
+        color = _color(rnd)
+        data = codec.encode_color(color)
+
+        assert data == legacy.encode_color(color)
+        assert codec.decode_color(data) == color
+        assert list(codec.decode_color(memoryview(data))) \
+            == legacy.decode_color(data)
+
+
+
+
+def test_effect(rnd):
+
+    for i in range(_RUNS):
+        color, effect, hold = _color(rnd), _byte(rnd), _byte(rnd)
+        data = codec.encode_effect(color, effect, hold)
+
+        assert data == legacy.encode_effect(color, effect, hold)
+        assert codec.decode_effect(data) == (color, effect, hold)
+
+        _color_, _effect, _hold = codec.decode_effect(memoryview(data))
+        assert (list(_color_), _effect, _hold) \
+            == legacy.decode_effect(data)
+
+
+
+
+def test_timer(rnd):
+
+    for i in range(_RUNS):
+        args = (rnd.randrange(4), _byte(rnd), _now(rnd), _byte(rnd),
+                _time(rnd), _color(rnd), _byte(rnd))
+
+        assert codec.encode_timer(*args) == legacy.encode_timer(*args)
+
+
+
+
+def test_decode_timers(rnd):
+
+    for i in range(_RUNS):
+        timers = bytes(_byte(rnd) for i in range(14))
+        effects = bytes(_byte(rnd) for i in range(20))
+
+        time, slots = codec.decode_timers(memoryview(timers),
+                                          memoryview(effects))
+        _time, _slots = legacy.decode_timers(timers, effects)
+
+        assert list(time) == _time
+        assert [(t, list(s), list(c), r) for t, s, c, r in slots] == _slots
+
+
+
+
+def test_random(rnd):
+
+    for i in range(_RUNS):
+        args = (_now(rnd), _time(rnd), _time(rnd), _byte(rnd), _byte(rnd),
+                _color(rnd))
+
+        assert codec.encode_random(*args) == legacy.encode_random(*args)
+
+
+
+
+def test_decode_random(rnd):
+
+    for i in range(_RUNS):
+        data = bytes(_byte(rnd) for i in range(13))
+
+        status, start, stop, run_min, run_max, color \
+            = codec.decode_random(memoryview(data))
+
+        assert (status, list(start), list(stop), run_min, run_max,
+                list(color)) == legacy.decode_random(data)
+
+
+
+
+def test_decode_ignores_trailing_bytes():
+
+    # gatttool reads may be longer than the layout
+    assert codec.decode_color(bytes([1, 2, 3, 4, 5, 6])) == (1, 2, 3, 4)
+
+
+
+
+def test_encode_rejects_values_out_of_range():
+
+    with pytest.raises(struct.error):
+        codec.encode_color((256, 0, 0, 0))
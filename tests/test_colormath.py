@@ -0,0 +1,147 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of playbulb.colormath, the list and the numpy path give the same
+results.
+"""
+
+import random
+
+import pytest
+
+from playbulb import colormath
+
+
+_RUNS = 200
+
+
+
+
+def _colors(rnd, n, floats = False):
+
+    # beyond 0 - 255 on purpose, everything is clamped
+    value = (lambda: rnd.uniform(-20, 275)) if floats \
+        else (lambda: rnd.randint(0, 255))
+
+    return [[value() for i in range(4)] for j in range(n)]
+
+
+
+
+def test_tables():
+
+    assert colormath.LIGHTNESS[0] == 0 and colormath.LIGHTNESS[255] == 255
+    assert colormath.LUMINANCE[0] == 0 and colormath.LUMINANCE[255] == 255
+    assert list(colormath.LIGHTNESS) == sorted(colormath.LIGHTNESS)
+
+    # a level maps back to about the value it came from
+    for v in range(256):
+        assert abs(colormath.LUMINANCE[colormath.LIGHTNESS[v]] - v) <= 2
+
+
+
+
+def test_at_level_keeps_the_hue():
+
+    assert colormath.at_level([[0, 255, 128, 0]], 255) == [[0, 255, 128, 0]]
+    assert colormath.at_level([[0, 0, 0, 0]], 128) == [[0, 0, 0, 0]]
+
+    color = colormath.at_level([[0, 255, 128, 0]], 128)[0]
+    assert colormath.level([color])[0] == pytest.approx(128, abs = 2)
+    assert color[2] == pytest.approx(color[1] / 2, abs = 1)
+
+
+
+
+def test_blend():
+
+    assert colormath.blend([[0, 0, 0, 0]], [[255, 255, 0, 100]], 0.5) \
+        == [[128, 128, 0, 50]]
+    assert colormath.perceptual_blend([[0, 0, 0, 0]], [[255, 0, 0, 0]], 0) \
+        == [[0, 0, 0, 0]]
+
+
+
+
+def _operations(rnd, n):
+
+    factor = rnd.uniform(0, 2)
+    factors = [rnd.uniform(0, 2) for i in range(n)]
+    levels = [rnd.randint(-10, 265) for i in range(n)]
+
+    return [
+        ("clamp",            lambda c, o: colormath.clamp(c)),
+        ("scale",            lambda c, o: colormath.scale(c, factor)),
+        ("scale per color",  lambda c, o: colormath.scale(c, factors)),
+        ("offset",           lambda c, o: colormath.offset(c, -40)),
+        ("gamma",            lambda c, o: colormath.gamma(c, 2.2)),
+        ("gamma per color",  lambda c, o: colormath.gamma(c, factors)),
+        ("lightness",        lambda c, o: colormath.lightness(c)),
+        ("luminance",        lambda c, o: colormath.luminance(c)),
+        ("level",            lambda c, o: colormath.level(c)),
+        ("at level",         lambda c, o: colormath.at_level(c, 100)),
+        ("at levels",        lambda c, o: colormath.at_level(c, levels)),
+        ("blend",            lambda c, o: colormath.blend(c, o, factor)),
+        ("blend per color",  lambda c, o: colormath.blend(c, o, factors)),
+        ("perceptual blend",
+         lambda c, o: colormath.perceptual_blend(c, o, factor))
+    ]
+
+
+
+
+@pytest.mark.parametrize("floats", [False, True])
+def test_lists_and_numpy_are_the_same(floats):
+
+    np = pytest.importorskip("numpy")
+    rnd = random.Random(35)
+
+    for run in range(_RUNS):
+        n = rnd.randint(1, 8)
+        colors = _colors(rnd, n, floats)
+        others = _colors(rnd, n)
+
+        for name, operation in _operations(rnd, n):
+            expected = operation(colors, others)
+            result = operation(np.asarray(colors), np.asarray(others))
+
+            assert result.dtype == np.uint8, name
+            assert result.tolist() == expected, name
+
+
+
+
+def test_lookup_of_blended_colors():
+
+    np = pytest.importorskip("numpy")
+
+    # blend() and float factors give floats, which index the tables too
+    colors = np.asarray([[0.0, 127.6, 255.0, 300.0]])
+    assert colormath.lightness(colors).tolist() \
+        == colormath.lightness(colors.tolist())
+    assert colormath.perceptual_blend(colors, colors * 0.5, 0.5).tolist() \
+        == colormath.perceptual_blend(colors.tolist(),
+                                      (colors * 0.5).tolist(), 0.5)
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of playbulb.colors.parse().
+"""
+
+import pytest
+
+from playbulb import colors
+
+
+
+
+@pytest.mark.parametrize("color, expected", [
+    ("red",          [0, 255, 0, 0]),
+    (" Blue ",       [0, 0, 0, 255]),
+    ("off",          [0, 0, 0, 0]),
+    ("#ff8000",      [0, 255, 128, 0]),
+    ("#808080",      [128, 0, 0, 0]),
+    ("#10ff8000",    [16, 255, 128, 0]),
+    ("hsv(0, 1, 1)", [0, 255, 0, 0]),
+    ("HSV(120,1.0,0.5)", [0, 0, 128, 0]),
+    ("hsv(240, 0, 1)", [255, 0, 0, 0]),
+    ([0, 10, 20, 30], [0, 10, 20, 30]),
+    ((40, 50, 60),   [40, 0, 10, 20])
+])
+def test_parse(color, expected):
+
+    assert colors.parse(color) == expected
+
+
+
+
+def test_kelvin():
+
+    # warm white is mainly white with some red, cold white is pure white
+    w, r, g, b = colors.parse("2700K")
+    assert w > 0 and r > g > 0 and b == 0
+
+    assert colors.parse("6600 k") == [255, 0, 0, 0]
+    assert colors.parse("warmwhite") == colors.parse("2700K")
+    assert colors.parse("coldwhite") == colors.parse("6500K")
+
+    # out of range temperatures are clamped
+    assert colors.parse("1K") == colors.parse("1000K")
+    assert colors.parse("99999K") == colors.parse("40000K")
+
+
+
+
+def test_kelvin_table_matches_formula():
+
+    for kelvin in range(1000, 40001, 100):
+        assert colors.from_kelvin(kelvin) \
+            == colors.from_rgb(*colors._kelvin_to_rgb(kelvin))
+
+
+
+
+def test_parse_returns_copies():
+
+    color = colors.parse("red")
+    color[0] = 255
+
+    assert colors.parse("red") == [0, 255, 0, 0]
+    assert colors.NAMES["red"] == [0, 255, 0, 0]
+
+
+
+
+@pytest.mark.parametrize("color", [
+    "nocolor", "#12345", "#gg0000", "hsv(1, 2)", "K", "", [1, 2], [1] * 5
+])
+def test_invalid(color):
+
+    with pytest.raises(ValueError):
+        colors.parse(color)
@@ -0,0 +1,192 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of the daemon protocol on a unix socket, with bulbs on fake devices.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from conftest import connected
+from playbulb import daemon
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+
+
+_MAC = "AF:66:4B:0D:AC:E6"
+
+
+
+
+def handler(bulb, cmd, params):
+
+    # echoes the command, fails like gatttool or like a bad command
+    if cmd == "lost":
+        from gatttool.bledevice import NoResponseError
+        raise NoResponseError("no response")
+
+    if cmd == "fail":
+        raise ValueError("unknown command")
+
+    return [bulb.bulb[Bulb._DEV_MAC], cmd] + params
+
+
+
+
+@pytest.fixture
+def running(tmp_path):
+
+    path = str(tmp_path / "mipow.sock")
+    pool = BulbPool(factory = lambda mac, hci_device: connected(mac = mac))
+    _daemon = daemon.Daemon(handler, path, pool)
+
+    thread = threading.Thread(target = _daemon.serve_forever)
+    thread.start()
+
+    while _daemon._server is None or not os.path.exists(path):
+        time.sleep(0.01)
+
+    yield path, pool
+
+    _daemon.shutdown()
+    thread.join()
+    assert not os.path.exists(path)
+
+
+
+
+def test_request(running):
+
+    path, pool = running
+
+    assert daemon.request(_MAC, "color", ["red"], path) \
+        == { "ok" : True, "output" : [_MAC, "color", "red"] }
+
+
+
+
+def test_many_requests_on_one_connection(running):
+
+    path, pool = running
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(path)
+    client.sendall(b'{ "mac" : "%s", "cmd" : "on" }\n\n'
+                   b'{ "mac" : "%s", "cmd" : "off" }\n' % (_MAC.encode(),
+                                                            _MAC.encode()))
+    client.shutdown(socket.SHUT_WR)
+    replies = [json.loads(line) for line in client.makefile("rb")]
+    client.close()
+
+    assert replies == [{ "ok" : True, "output" : [_MAC, "on"] },
+                       { "ok" : True, "output" : [_MAC, "off"] }]
+
+
+
+
+def test_errors_are_replied(running):
+
+    path, pool = running
+
+    assert daemon.request(_MAC, "fail", [], path) \
+        == { "ok" : False, "error" : "unknown command" }
+
+    reply = daemon.request(None, "on", [], path)
+    assert reply["ok"] is False
+
+
+
+
+def test_lost_link_disconnects_the_bulb(running):
+
+    path, pool = running
+
+    assert daemon.request(_MAC, "on", [], path)["ok"]
+    assert pool.get(_MAC).bulb[Bulb._CONNECTED]
+
+    assert daemon.request(_MAC, "lost", [], path) \
+        == { "ok" : False, "error" : "no response" }
+    assert not pool.get(_MAC).bulb[Bulb._CONNECTED]
+
+
+
+
+def test_second_daemon_is_refused(running):
+
+    path, pool = running
+
+    with pytest.raises(IOError):
+        daemon.Daemon(handler, path, pool).serve_forever()
+
+    # the socket of the running daemon is left alone
+    assert daemon.request(_MAC, "on", [], path)["ok"]
+
+
+
+
+def test_socket_of_a_dead_daemon_is_replaced(tmp_path):
+
+    path = str(tmp_path / "mipow.sock")
+
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    dead.bind(path)
+    dead.close()
+
+    _daemon = daemon.Daemon(handler, path, BulbPool(
+        factory = lambda mac, hci_device: connected(mac = mac)))
+    thread = threading.Thread(target = _daemon.serve_forever)
+    thread.start()
+
+    while _daemon._server is None:
+        time.sleep(0.01)
+
+    assert daemon.request(_MAC, "on", [], path)["ok"]
+
+    _daemon.shutdown()
+    thread.join()
+
+
+
+
+def test_client_times_out(tmp_path):
+
+    path = str(tmp_path / "mipow.sock")
+
+    # listens, but never replies
+    wedged = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    wedged.bind(path)
+    wedged.listen(1)
+
+    try:
+        with pytest.raises(IOError):
+            daemon.request(_MAC, "on", [], path, timeout = 0.1)
+    finally:
+        wedged.close()
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of Bulb.dim(), which steps in perceived brightness and keeps the hue.
+"""
+
+import pytest
+
+from conftest import connected
+from conftest import handle
+from playbulb import colormath
+from playbulb.mipow import Bulb
+
+
+_ORANGE = [0, 255, 128, 0]
+
+
+
+
+def showing(color):
+    return connected({ handle(Bulb._CHARACTERISTIC_COLOR) : bytes(color) })
+
+
+
+
+def written(bulb):
+    return list(bulb._btle_device.writes[-1][1][:4])
+
+
+
+
+def test_steps_are_even_in_lightness():
+
+    bulb = showing(_ORANGE)
+
+    levels = [colormath.level([_ORANGE])[0]]
+    while levels[-1] > 32:
+        levels.append(colormath.level([bulb.dim(incr = -32)])[0])
+
+    for l1, l2 in zip(levels, levels[1:]):
+        assert l1 - l2 == pytest.approx(32, abs = 2)
+
+
+
+
+def test_hue_is_kept():
+
+    bulb = showing(_ORANGE)
+
+    for incr in [-32, -64, 16]:
+        color = bulb.dim(incr = incr)
+        assert color == written(bulb)
+        assert color[0] == color[3] == 0
+        assert color[2] == pytest.approx(color[1] / 2, abs = 1)
+
+
+
+
+def test_factor():
+
+    bulb = showing(_ORANGE)
+
+    color = bulb.dim(factor = 0.5)
+    assert colormath.level([color])[0] == pytest.approx(128, abs = 2)
+
+
+
+
+def test_up_from_off_comes_back_with_the_color():
+
+    bulb = showing(_ORANGE)
+
+    # beyond off, once more than needed
+    for i in range(10):
+        bulb.dim(incr = -32)
+    assert written(bulb) == Bulb.COLOR_OFF
+
+    color = bulb.dim(incr = 64)
+    assert color[1] > 0 and color[2] == pytest.approx(color[1] / 2, abs = 1)
+    assert colormath.level([color])[0] == pytest.approx(64, abs = 2)
+
+
+
+
+def test_up_from_off_without_a_color_is_white():
+
+    bulb = showing(Bulb.COLOR_OFF)
+
+    color = bulb.dim(incr = 32)
+    assert color[0] > 0 and color[1:] == [0, 0, 0]
+
+
+
+
+def test_clamped_at_full_brightness():
+
+    bulb = showing(_ORANGE)
+
+    assert bulb.dim(incr = 32) == _ORANGE
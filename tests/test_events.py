@@ -0,0 +1,171 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of the delivery of bulb state changes in batches.
+"""
+
+import queue
+import threading
+
+from conftest import connected
+from playbulb import events
+from playbulb.mipow import Bulb
+
+
+_TIMEOUT = 5
+
+
+
+
+def event(field, old, new):
+    return events.Event(None, field, old, new, None)
+
+
+
+
+class Listener():
+
+    # collects the batches it is called with
+    def __init__(self, error = None):
+
+        self.error = error
+        self.batches = queue.Queue()
+
+    def __call__(self, events):
+
+        self.batches.put(events)
+        if self.error is not None:
+            raise self.error
+
+    def next(self):
+        return self.batches.get(timeout = _TIMEOUT)
+
+
+
+
+def test_events_of_a_window_are_one_batch():
+
+    dispatcher = events.Dispatcher(window = 0.2)
+    listener = Listener()
+
+    changes = [event(Bulb._COLOR, [0, 0, 0, 0], [0, 255, 0, 0]),
+               event(Bulb._COLOR, [0, 255, 0, 0], [0, 0, 255, 0]),
+               event(Bulb._CONNECTED, True, False)]
+
+    for change in changes:
+        dispatcher.publish([(listener, None)], [change])
+
+    assert listener.next() == changes
+    assert listener.batches.empty()
+
+
+
+
+def test_listeners_get_their_fields_only():
+
+    dispatcher = events.Dispatcher(window = 0.2)
+    colors = Listener()
+    connected_ = Listener()
+    timers = Listener()
+
+    color = event(Bulb._COLOR, [0, 0, 0, 0], [0, 255, 0, 0])
+    lost = event(Bulb._CONNECTED, True, False)
+
+    dispatcher.publish([(colors, [Bulb._COLOR]),
+                        (connected_, [Bulb._CONNECTED]),
+                        (timers, [Bulb._TIMER])], [color, lost])
+
+    assert colors.next() == [color]
+    assert connected_.next() == [lost]
+
+    # nothing to deliver, not called at all
+    dispatcher.publish([(timers, [Bulb._TIMER])], [color])
+    dispatcher.publish([(colors, None)], [lost])
+    assert colors.next() == [lost]
+    assert timers.batches.empty()
+
+
+
+
+def test_failing_listener_does_not_stop_others():
+
+    dispatcher = events.Dispatcher(window = 0.01)
+    failing = Listener(ValueError("bug"))
+    other = Listener()
+
+    color = event(Bulb._COLOR, [0, 0, 0, 0], [0, 255, 0, 0])
+
+    dispatcher.publish([(failing, None), (other, None)], [color])
+    assert failing.next() == [color]
+    assert other.next() == [color]
+
+    # the dispatcher goes on
+    dispatcher.publish([(failing, None)], [color])
+    assert failing.next() == [color]
+
+
+
+
+def test_bulb_publishes_changes():
+
+    bulb = connected()
+    listener = Listener()
+    bulb.subscribe(listener, [Bulb._COLOR, Bulb._CONNECTED])
+
+    bulb.color(Bulb.COLOR_RED)
+    bulb.disconnect()
+
+    received = []
+    while len(received) < 2:
+        received += listener.next()
+
+    assert all(e.bulb is bulb for e in received)
+    assert [(e.field, e.old, e.new) for e in received] \
+        == [(Bulb._COLOR, Bulb.COLOR_OFF, Bulb.COLOR_RED),
+            (Bulb._CONNECTED, True, False)]
+
+
+
+
+def test_unsubscribed_bulb_publishes_nothing():
+
+    bulb = connected()
+    listener = Listener()
+    bulb.subscribe(listener)
+    bulb.unsubscribe(listener)
+
+    assert bulb._snapshot() is None
+
+    # a listener of another bulb sees the dispatcher deliver in order
+    other = connected()
+    marker = Listener()
+    other.subscribe(marker)
+
+    bulb.color(Bulb.COLOR_RED)
+    other.color(Bulb.COLOR_RED)
+
+    assert marker.next()[0].bulb is other
+    assert listener.batches.empty()
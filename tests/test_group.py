@@ -0,0 +1,101 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of BulbGroup on fake devices.
+"""
+
+import pytest
+
+from conftest import connected
+from playbulb.group import BulbGroup
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+
+
+_MACS = ["AF:66:4B:0D:AC:E6", "AF:66:4B:0D:AC:E7", "AF:66:4B:0D:AC:E8"]
+
+
+
+
+def _group(macs = _MACS, factory = None):
+
+    bulbs = dict((mac, connected(mac = mac)) for mac in macs)
+    pool = BulbPool(size = len(macs),
+                    factory = factory if factory is not None
+                    else lambda mac, hci_device: bulbs[mac])
+
+    return BulbGroup(macs, pool = pool, workers = len(macs)), bulbs
+
+
+
+
+def _unreachable(bulb):
+
+    # the bulb has been lost between preparing and committing
+    bulb._execute = lambda plan, pipelined = False: False
+
+
+
+
+def test_commit():
+
+    group, bulbs = _group()
+
+    result = group.commit({ Bulb._COLOR : Bulb.COLOR_RED }, probes = 1)
+
+    assert list(result.results.keys()) == _MACS
+    assert len(result.errors) == 0
+    assert 0.0 <= result.skew < 0.05
+    for bulb in bulbs.values():
+        assert bulb.bulb[Bulb._COLOR] == Bulb.COLOR_RED
+
+
+
+
+def test_commit_reports_failed_bulbs_apart_from_the_skew():
+
+    group, bulbs = _group()
+    _unreachable(bulbs[_MACS[1]])
+
+    result = group.commit({ Bulb._COLOR : Bulb.COLOR_RED }, probes = 1)
+
+    assert list(result.results.keys()) == [_MACS[0], _MACS[2]]
+    assert list(result.errors.keys()) == [_MACS[1]]
+    assert isinstance(result.errors[_MACS[1]], IOError)
+    assert 0.0 <= result.skew < 0.05
+
+
+
+
+def test_call_of_unreachable_bulb():
+
+    group, bulbs = _group()
+    _unreachable(bulbs[_MACS[0]])
+
+    result = group.color(Bulb.COLOR_BLUE)
+
+    assert list(result.results.keys()) == _MACS[1:]
+    assert list(result.errors.keys()) == _MACS[:1]
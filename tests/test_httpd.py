@@ -0,0 +1,120 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of the http server on fake devices, served on a free local port.
+"""
+
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import connected
+from playbulb.httpd import Server
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+
+
+_DESK = "AF:66:4B:0D:AC:E6"
+_SHELF = "AF:66:4B:0D:AC:E7"
+
+
+
+
+@pytest.fixture
+def server():
+
+    bulbs = dict((mac, connected(mac = mac)) for mac in [_DESK, _SHELF])
+
+    # the shelf has lost its connection and does not come back
+    bulbs[_SHELF].connect = lambda: False
+    bulbs[_SHELF].bulb[Bulb._CONNECTED] = False
+
+    _server = Server(groups = { "room" : [_DESK, _SHELF] },
+                     pool = BulbPool(factory = lambda mac, hci_device:
+                                     bulbs[mac]),
+                     address = ("127.0.0.1", 0))
+    threading.Thread(target = _server.serve_forever, daemon = True).start()
+    while _server._server is None:
+        time.sleep(0.01)
+
+    yield _server
+
+    _server.shutdown()
+
+
+
+
+def _post(server, path, body):
+
+    connection = http.client.HTTPConnection(*server._server.server_address)
+    try:
+        connection.request("POST", path, json.dumps(body))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+    finally:
+        connection.close()
+
+
+
+
+def test_command(server):
+
+    # dim() returns the new color
+    status, body = _post(server, "/bulbs/" + _DESK, { "call" : "dim",
+                                                      "args" : [ 32 ] })
+
+    assert status == 200
+    assert body[_DESK]["ok"] is True
+    assert len(body[_DESK]["result"]) == 4
+    assert body[_DESK]["result"][0] > 0
+
+
+
+
+@pytest.mark.parametrize("command", [
+    { "call" : "off" }, { "state" : { "Color" : [ 0, 255, 0, 0 ] } }
+])
+def test_command_of_unreachable_bulb(server, command):
+
+    status, body = _post(server, "/bulbs/" + _SHELF, command)
+
+    assert status == 502
+    assert body[_SHELF]["ok"] is False
+    assert "error" in body[_SHELF]
+
+
+
+
+def test_group_with_unreachable_bulb(server):
+
+    status, body = _post(server, "/groups/room", { "call" : "on" })
+
+    assert status == 502
+    assert body[_DESK] == { "ok" : True, "result" : True }
+    assert body[_SHELF]["ok"] is False
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of the MQTT bridge with a stub client and fake devices.
+"""
+
+import json
+
+import pytest
+
+from conftest import connected
+from playbulb.mipow import Bulb
+from playbulb.mqtt import Bridge
+from playbulb.pool import BulbPool
+
+
+_DESK = "AF:66:4B:0D:AC:E6"
+_SHELF = "AF:66:4B:0D:AC:E7"
+
+
+
+
+class StubClient():
+
+    # stands in for paho, messages are delivered by the test
+    def __init__(self):
+
+        self.on_message = None
+        self.topics = []
+        self.published = []
+
+    def subscribe(self, topic):
+        self.topics.append(topic)
+
+    def publish(self, topic, payload, retain = False):
+        self.published.append((topic, json.loads(payload), retain))
+
+    def loop_forever(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def send(self, topic, payload):
+        self.on_message(topic, payload.encode("utf-8"))
+
+    def topic(self, topic):
+        return [(p, r) for t, p, r in self.published if t == topic]
+
+
+
+
+@pytest.fixture
+def bulbs():
+
+    bulbs = dict((mac, connected(mac = mac)) for mac in [_DESK, _SHELF])
+
+    # the shelf has lost its connection and does not come back
+    bulbs[_SHELF].connect = lambda: False
+    bulbs[_SHELF].bulb[Bulb._CONNECTED] = False
+
+    return bulbs
+
+
+
+
+@pytest.fixture
+def client(bulbs):
+
+    client = StubClient()
+    bridge = Bridge(aliases = { "desk" : _DESK, "shelf" : _SHELF },
+                    client = client, workers = 1,
+                    pool = BulbPool(factory = lambda mac, hci_device:
+                                    bulbs[mac]))
+    client.bridge = bridge
+
+    yield client
+
+    bridge.stop()
+
+
+
+
+def _queued(client, alias, payloads):
+
+    # the bulb is busy while the messages arrive
+    client.bridge._busy.add(alias)
+    for payload in payloads:
+        client.send("mipow/%s/set" % alias, payload)
+
+    return list(client.bridge._pending[alias])
+
+
+
+
+def test_state_is_published(client, bulbs):
+
+    assert client.topics == ["mipow/+/set"]
+
+    client.send("mipow/desk/set", "red")
+    client.bridge.stop()
+
+    state, retain = client.topic("mipow/desk/state")[0]
+    assert retain
+    assert state[Bulb._COLOR] == Bulb.COLOR_RED
+    assert bulbs[_DESK].bulb[Bulb._COLOR] == Bulb.COLOR_RED
+
+
+
+
+def test_states_are_merged(client):
+
+    assert _queued(client, "desk", [
+        "red", '{ "state" : { "Effect" : { "Effect" : 4 } } }', "blue"
+    ]) == [{ "state" : { Bulb._COLOR  : Bulb.COLOR_BLUE,
+                         Bulb._EFFECT : { Bulb._EFFECT : 4 } } }]
+
+
+
+
+def test_calls_are_not_merged(client, bulbs):
+
+    assert _queued(client, "desk", ["toggle", "toggle", "red", "toggle",
+                                    "blue", "green"]) == [
+        { "call" : "toggle" },
+        { "call" : "toggle" },
+        { "state" : { Bulb._COLOR : Bulb.COLOR_RED } },
+        { "call" : "toggle" },
+        { "state" : { Bulb._COLOR : Bulb.COLOR_GREEN } }
+    ]
+
+    client.bridge._drain("desk")
+    assert bulbs[_DESK].bulb[Bulb._COLOR] == Bulb.COLOR_GREEN
+    assert client.topic("mipow/desk/error") == []
+
+
+
+
+def test_invalid_payload_is_published(client):
+
+    client.send("mipow/desk/set", "nocolor")
+    client.send("mipow/desk/set", '{ "call" : "reset" }')
+
+    errors = [error for error, retain in client.topic("mipow/desk/error")]
+    assert [error["payload"] for error in errors] == [
+        "nocolor", '{ "call" : "reset" }' ]
+    assert all("error" in error for error in errors)
+    assert "desk" not in client.bridge._pending
+
+
+
+
+def test_failed_command_is_published(client):
+
+    client.send("mipow/shelf/set", "on")
+    client.bridge.stop()
+
+    error, retain = client.topic("mipow/shelf/error")[0]
+    assert error["command"] == { "call" : "on" }
+    assert client.topic("mipow/shelf/state") == []
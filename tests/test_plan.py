@@ -0,0 +1,219 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of the minimal write planner, Bulb.plan().
+"""
+
+from datetime import datetime
+
+from playbulb import codec
+from playbulb.mipow import Bulb
+
+
+_NOW = datetime(2026, 1, 1, 6, 30, 15)
+
+_SYNC_ALL = Bulb.INIT_COLOR + Bulb.INIT_EFFECT + Bulb.INIT_TIMER \
+    + Bulb.INIT_RANDOM
+
+
+
+
+def _synced(bulb, **state):
+
+    bulb.bulb[Bulb._SYNC] = _SYNC_ALL
+    for key, value in state.items():
+        bulb.bulb[key] = value
+
+    return bulb
+
+
+
+
+def _characteristics(plan):
+    return [write.characteristic for write in plan]
+
+
+
+
+def _timer(start, color = Bulb.COLOR_WHITE, runtime = 10):
+
+    return {
+        Bulb._START   : start,
+        Bulb._COLOR   : color,
+        Bulb._RUNTIME : runtime
+    }
+
+
+
+
+def test_color_of_unsynchronized_bulb_is_written(bulb):
+
+    plan = bulb.plan({ Bulb._COLOR : Bulb.COLOR_RED }, _NOW)
+
+    assert _characteristics(plan) == [Bulb._CHARACTERISTIC_COLOR]
+    assert plan.writes[0].value == codec.encode_color(Bulb.COLOR_RED)
+    assert plan.state[Bulb._COLOR] == Bulb.COLOR_RED
+
+
+
+
+def test_same_color_is_not_written(bulb):
+
+    _synced(bulb, Color = Bulb.COLOR_RED)
+
+    assert len(bulb.plan({ Bulb._COLOR : Bulb.COLOR_RED }, _NOW)) == 0
+    assert len(bulb.plan({ Bulb._COLOR : Bulb.COLOR_BLUE }, _NOW)) == 1
+
+
+
+
+def test_color_halts_running_effect(bulb):
+
+    _synced(bulb, Effect = { Bulb._COLOR  : Bulb.COLOR_RED,
+                             Bulb._EFFECT : Bulb.EFFECT_PULSE,
+                             Bulb._HOLD   : 10 },
+            Color = Bulb.COLOR_RED)
+
+    # the same color stops the effect as well
+    plan = bulb.plan({ Bulb._COLOR : Bulb.COLOR_RED }, _NOW)
+
+    assert _characteristics(plan) == [Bulb._CHARACTERISTIC_COLOR]
+    assert plan.state[Bulb._EFFECT][Bulb._EFFECT] == Bulb.EFFECT_HALT
+
+
+
+
+def test_running_effect_takes_precedence_over_color(bulb):
+
+    _synced(bulb)
+
+    plan = bulb.plan({
+        Bulb._COLOR  : Bulb.COLOR_BLUE,
+        Bulb._EFFECT : { Bulb._COLOR  : Bulb.COLOR_RED,
+                         Bulb._EFFECT : Bulb.EFFECT_BLINK,
+                         Bulb._HOLD   : 20 }
+    }, _NOW)
+
+    assert _characteristics(plan) == [Bulb._CHARACTERISTIC_EFFECT]
+    assert plan.writes[0].value == codec.encode_effect(Bulb.COLOR_RED,
+                                                       Bulb.EFFECT_BLINK, 20)
+    assert plan.state[Bulb._COLOR] == Bulb.COLOR_RED
+
+
+
+
+def test_same_effect_is_not_written(bulb):
+
+    effect = { Bulb._COLOR  : Bulb.COLOR_RED,
+               Bulb._EFFECT : Bulb.EFFECT_CANDLE,
+               Bulb._HOLD   : 1 }
+    _synced(bulb, Effect = dict(effect))
+
+    assert len(bulb.plan({ Bulb._EFFECT : effect }, _NOW)) == 0
+
+
+
+
+def test_only_changed_timers_are_written(bulb):
+
+    _synced(bulb)
+    bulb.bulb[Bulb._TIMER][1] = Bulb._normalize_timer(1, _timer([7, 0]))
+
+    plan = bulb.plan({ Bulb._TIMER : [None, _timer([7, 0]),
+                                      _timer([8, 0]), None] }, _NOW)
+
+    assert _characteristics(plan) == [Bulb._CHARACTERISTIC_TIMER]
+    assert plan.writes[0].response
+    assert plan.writes[0].value == codec.encode_timer(
+        2, 0, _NOW, 0, [8, 0], Bulb.COLOR_WHITE, 10)
+    assert plan.state[Bulb._TIMER][2][Bulb._START] == [8, 0]
+    assert plan.state[Bulb._TIME] == [6, 30]
+
+
+
+
+def test_fired_timer_is_armed_again(bulb):
+
+    _synced(bulb)
+    timer = Bulb._normalize_timer(0, _timer([7, 0]))
+
+    # reported off after it has fired, otherwise the same
+    bulb.bulb[Bulb._TIMER][0] = dict(timer, **{ Bulb._STATUS : 4 })
+
+    assert len(bulb.plan({ Bulb._TIMER : [_timer([7, 0])] }, _NOW)) == 1
+
+    bulb.bulb[Bulb._TIMER][0] = timer
+    assert len(bulb.plan({ Bulb._TIMER : [_timer([7, 0])] }, _NOW)) == 0
+
+
+
+
+def test_unset_timer(bulb):
+
+    _synced(bulb)
+
+    assert len(bulb.plan({ Bulb._TIMER : [{ Bulb._START : [0xff, 0xff] }] },
+                         _NOW)) == 0
+
+    bulb.bulb[Bulb._TIMER][0] = Bulb._normalize_timer(0, _timer([7, 0]))
+    plan = bulb.plan({ Bulb._TIMER : [{ Bulb._START : [0xff, 0xff] }] },
+                     _NOW)
+
+    assert len(plan) == 1
+    assert plan.state[Bulb._TIMER][0][Bulb._STATUS] == 4
+
+
+
+
+def test_random_mode(bulb):
+
+    randommode = {
+        Bulb._START : [18, 0],
+        Bulb._STOP  : [23, 0],
+        Bulb._MIN   : 5,
+        Bulb._MAX   : 30,
+        Bulb._COLOR : Bulb.COLOR_WHITE
+    }
+    _synced(bulb)
+
+    plan = bulb.plan({ Bulb._RANDOMMODE : randommode }, _NOW)
+    assert _characteristics(plan) == [Bulb._CHARACTERISTIC_RANDOMMODE]
+    assert plan.writes[0].value == codec.encode_random(
+        _NOW, [18, 0], [23, 0], 5, 30, Bulb.COLOR_WHITE)
+
+    bulb.bulb.update(plan.state)
+    assert len(bulb.plan({ Bulb._RANDOMMODE : randommode }, _NOW)) == 0
+
+
+
+
+def test_plan_does_not_change_the_bulb(bulb):
+
+    before = repr(bulb.bulb)
+    bulb.plan({ Bulb._COLOR : Bulb.COLOR_RED,
+                Bulb._TIMER : [_timer([7, 0])] }, _NOW)
+
+    assert repr(bulb.bulb) == before
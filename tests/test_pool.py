@@ -0,0 +1,158 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of BulbPool on fake devices, connections are evicted least recently
+used first.
+"""
+
+import threading
+
+from conftest import connected
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+
+
+_MACS = ["AF:66:4B:0D:AC:E%d" % i for i in range(4)]
+
+
+
+
+def pool(size):
+
+    # bulbs are created connected, records the macs created
+    created = []
+
+    def factory(mac, hci_device):
+        created.append(mac)
+        return connected(mac = mac)
+
+    _pool = BulbPool(size = size, factory = factory)
+    _pool.created = created
+
+    return _pool
+
+
+
+
+def use(pool, *macs):
+
+    for mac in macs:
+        with pool.session(mac) as bulb:
+            bulb.connect()
+
+
+
+
+def is_connected(pool):
+    return [mac for mac in _MACS
+            if mac in pool.bulbs()
+            and pool.bulbs()[mac].bulb[Bulb._CONNECTED]]
+
+
+
+
+def test_a_bulb_is_created_once():
+
+    _pool = pool(2)
+
+    with _pool.session(_MACS[0]) as bulb:
+        bulb.color(Bulb.COLOR_RED)
+
+    assert _pool.get(_MACS[0]) is bulb
+    assert bulb.bulb[Bulb._COLOR] == Bulb.COLOR_RED
+    assert _pool.created == [_MACS[0]]
+
+
+
+
+def test_least_recently_used_is_evicted():
+
+    _pool = pool(2)
+
+    use(_pool, _MACS[0], _MACS[1], _MACS[2])
+    assert is_connected(_pool) == [_MACS[1], _MACS[2]]
+
+    use(_pool, _MACS[1], _MACS[3])
+    assert is_connected(_pool) == [_MACS[1], _MACS[3]]
+
+
+
+
+def test_evicted_bulb_keeps_its_state_and_reconnects(devices):
+
+    _pool = BulbPool(size = 1)
+
+    with _pool.session(_MACS[0]) as bulb:
+        bulb.bulb[Bulb._HANDLES] = Bulb.bulb[Bulb._HANDLES]
+        bulb.color(Bulb.COLOR_RED)
+
+    use(_pool, _MACS[1])
+    assert not bulb.bulb[Bulb._CONNECTED]
+    assert devices[_MACS[0]].stopped
+    assert bulb.bulb[Bulb._COLOR] == Bulb.COLOR_RED
+
+    with _pool.session(_MACS[0]) as again:
+        assert again is bulb
+        assert again.connect()
+
+
+
+
+def test_bulb_in_a_session_is_not_evicted():
+
+    _pool = pool(1)
+    use(_pool, _MACS[0])
+
+    entered = threading.Event()
+    done = threading.Event()
+
+    def session():
+        with _pool.session(_MACS[0]):
+            entered.set()
+            done.wait(5)
+
+    thread = threading.Thread(target = session)
+    thread.start()
+    entered.wait(5)
+
+    use(_pool, _MACS[1])
+    assert is_connected(_pool) == [_MACS[0], _MACS[1]]
+
+    # the end of the session evicts the bulb used before it
+    done.set()
+    thread.join()
+    assert is_connected(_pool) == [_MACS[0]]
+
+
+
+
+def test_close_disconnects_all():
+
+    _pool = pool(4)
+    use(_pool, *_MACS)
+
+    _pool.close()
+    assert is_connected(_pool) == []
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of compiling programs onto timers and loading them.
+"""
+
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+
+from conftest import handle
+from playbulb import codec
+from playbulb import program
+from playbulb.mipow import Bulb
+
+
+_START = datetime(2026, 1, 1, 6, 30)
+_RED = [0, 255, 0, 0]
+_BLUE = [0, 0, 0, 255]
+
+
+
+
+class Scheduler():
+
+    # records what a TimerScheduler would be given
+    def __init__(self, entries = None):
+
+        self.added = []
+        self.cancelled = []
+        self._entries = entries if entries is not None else []
+
+    def entries(self, bulb):
+        return list(self._entries)
+
+    def cancel(self, bulb, entry):
+        self.cancelled.append(entry)
+
+    def add(self, bulb, start, minutes, color):
+        self.added.append((start, minutes, color))
+
+
+
+
+def test_compile():
+
+    steps = program.compile([(0, Bulb.COLOR_OFF), (10, _RED), (30, _BLUE)],
+                            _START)
+
+    assert steps == [
+        program.Step(_START, 10, _RED),
+        program.Step(_START + timedelta(minutes = 10), 20, _BLUE)
+    ]
+
+
+
+
+def test_keyframes_of_the_same_minute_keep_their_order():
+
+    keyframes = [(10, _BLUE), (0, Bulb.COLOR_OFF), (10, _RED),
+                 (10, Bulb.COLOR_WHITE)]
+
+    steps = program.compile(keyframes, _START)
+
+    assert steps == [program.Step(_START, 10, Bulb.COLOR_WHITE)]
+    assert program.first([(0, _BLUE), (0, _RED), (5, Bulb.COLOR_OFF)]) \
+        == _RED
+
+
+
+
+@pytest.mark.parametrize("minutes", [0, 1, 2, 3, 5, 30, 600])
+def test_no_step_without_minutes(minutes):
+
+    for keyframes in [program.wakeup(minutes), program.doze(minutes),
+                      program.bgr(minutes)]:
+        steps = program.compile(keyframes, _START)
+
+        assert all(1 <= step.minutes <= 255 for step in steps)
+        assert sum(step.minutes for step in steps) == minutes
+        assert all(s0.start + timedelta(minutes = s0.minutes) == s1.start
+                   for s0, s1 in zip(steps, steps[1:]))
+
+
+
+
+def test_long_fades_are_split():
+
+    steps = program.compile(program.fade(300, _RED), _START)
+
+    assert [step.minutes for step in steps] == [255, 45]
+    assert steps[-1].color == _RED
+
+
+
+
+def test_load_shows_the_first_keyframe(bulb):
+
+    keyframes = program.doze(30)
+    steps = program.compile(keyframes, _START)
+
+    assert program.load(bulb, steps, verify = False,
+                        color = program.first(keyframes))
+
+    writes = bulb._btle_device.writes
+    assert writes[0][:2] == (handle(Bulb._CHARACTERISTIC_COLOR),
+                             codec.encode_color(keyframes[0][1]))
+    assert [w[0] for w in writes[1:]] \
+        == [handle(Bulb._CHARACTERISTIC_TIMER)] * len(steps)
+
+
+
+
+def test_load_of_unreachable_bulb(bulb):
+
+    bulb.connect = lambda: False
+    bulb.bulb[Bulb._CONNECTED] = False
+
+    assert program.load(bulb, [], color = _RED) is False
+
+
+
+
+def test_load_needs_a_scheduler_beyond_four_steps(bulb):
+
+    steps = [program.Step(_START + timedelta(minutes = i), 1, _RED)
+             for i in range(5)]
+
+    with pytest.raises(ValueError):
+        program.load(bulb, steps, color = _BLUE)
+
+    # nothing has been written for a program which is not loaded
+    assert bulb._btle_device.writes == []
+
+    scheduler = Scheduler(entries = ["old"])
+    assert program.load(bulb, steps, scheduler = scheduler)
+    assert scheduler.cancelled == ["old"]
+    assert scheduler.added == [(s.start, s.minutes, s.color) for s in steps]
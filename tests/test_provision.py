@@ -0,0 +1,152 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of provisioning many bulbs into a registry, on fake devices.
+"""
+
+import os
+import threading
+import time
+
+from conftest import connected
+from playbulb import provision
+from playbulb import registry
+from playbulb.mipow import Bulb
+
+
+_MACS = ["AF:66:4B:0D:AC:E%d" % i for i in range(6)]
+
+
+
+
+def test_scan_finds_only_playbulbs(monkeypatch):
+
+    from gatttool import bledevice
+
+    monkeypatch.setattr(bledevice, "le_scan", lambda timeout: [
+        { "address" : _MACS[0], "name" : "PLAYBULB" },
+        { "address" : _MACS[1], "name" : "Playbulb Candle" },
+        { "address" : _MACS[2], "name" : "MIPOW" },
+        { "address" : _MACS[3], "name" : "Heart Rate" },
+        { "address" : _MACS[4], "name" : None }
+    ])
+
+    assert provision.scan() == [(_MACS[0], None), (_MACS[1], None),
+                                (_MACS[2], None)]
+
+
+
+
+def test_setup_stores_profiles_and_failures(tmp_path):
+
+    _registry = registry.Registry(str(tmp_path / "bulbs"))
+
+    def factory(mac, hci_device):
+        bulb = connected(mac = mac)
+        if mac == _MACS[1]:
+            bulb.connect = lambda: False
+            bulb.bulb[Bulb._CONNECTED] = False
+        return bulb
+
+    results = provision.setup(_registry, [_MACS[0], (_MACS[1], "shelf"),
+                                          (_MACS[2], "desk")],
+                              factory = factory)
+
+    assert [(r.mac, r.alias, r.hci_device) for r in results] \
+        == [(_MACS[0], None, "hci0"), (_MACS[1], "shelf", "hci0"),
+            (_MACS[2], "desk", "hci0")]
+    assert [r.error is None for r in results] == [True, False, True]
+    assert isinstance(results[1].error, IOError)
+
+    assert [p["mac"] for p in _registry.profiles()] == [_MACS[0], _MACS[2]]
+    assert _registry.mac("desk") == _MACS[2]
+
+
+
+
+def test_limit_per_adapter(tmp_path):
+
+    _registry = registry.Registry(str(tmp_path / "bulbs"))
+
+    lock = threading.Lock()
+    running = { "hci0" : 0, "hci1" : 0 }
+    most = dict(running)
+
+    def factory(mac, hci_device):
+        with lock:
+            running[hci_device] += 1
+            most[hci_device] = max(most[hci_device], running[hci_device])
+        time.sleep(0.05)
+        with lock:
+            running[hci_device] -= 1
+        return connected(mac = mac)
+
+    results = provision.setup(_registry, _MACS, ["hci0", "hci1"], 2,
+                              factory = factory)
+
+    assert all(r.error is None for r in results)
+    assert most == { "hci0" : 2, "hci1" : 2 }
+    assert len(_registry.profiles()) == len(_MACS)
+
+
+
+
+def test_failed_discovery_is_reported(tmp_path, monkeypatch, devices):
+
+    _registry = registry.Registry(str(tmp_path / "bulbs"))
+
+    # gatttool finds nothing, no handle file is written
+    monkeypatch.setattr(Bulb, "_setup_characteristics", lambda self: None)
+
+    results = provision.setup(_registry, [_MACS[5]])
+
+    assert isinstance(results[0].error, IOError)
+    assert "discover" in str(results[0].error)
+    assert _registry.profiles() == []
+    assert devices == {}
+
+
+
+
+def test_discovered_handles_are_stored(tmp_path, monkeypatch, devices):
+
+    _registry = registry.Registry(str(tmp_path / "bulbs"))
+
+    def discover(self):
+        with open(self._hnd_file, "w") as _file:
+            _file.write("handle = 0x0024, char properties = 0x0a, "
+                        "char value handle = 0x0025, uuid = 0000fffc\n")
+
+    monkeypatch.setattr(Bulb, "_setup_characteristics", discover)
+
+    try:
+        results = provision.setup(_registry, [_MACS[5]])
+    finally:
+        os.remove("/tmp/bulb-%s.py.hnd" % _MACS[5].replace(":", "_"))
+
+    assert results[0].error is None
+    assert _registry.get(_MACS[5])["handles"]["0000fffc"] == 0x25
+    assert devices[_MACS[5]].stopped
@@ -0,0 +1,139 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of the registry of known bulbs.
+"""
+
+import dbm
+import errno
+
+import pytest
+
+from conftest import connected
+from playbulb import registry
+from playbulb.mipow import Bulb
+
+
+_MAC = "AF:66:4B:0D:AC:E6"
+
+
+
+
+@pytest.fixture
+def known(tmp_path):
+
+    _registry = registry.Registry(str(tmp_path / "bulbs"))
+    _registry.put(registry.profile(connected(mac = _MAC.lower())), "desk")
+
+    return _registry
+
+
+
+
+def test_nothing_set_up(tmp_path):
+
+    _registry = registry.Registry(str(tmp_path / "bulbs"))
+
+    assert _registry.get("desk") is None
+    assert _registry.group("living") is None
+    assert _registry.profiles() == []
+    assert _registry.mac(_MAC.lower()) == _MAC
+
+    with pytest.raises(ValueError):
+        _registry.mac("desk")
+
+
+
+
+def test_mac_in_any_case(known):
+
+    assert known.mac("desk") == _MAC
+    assert known.get(_MAC.lower())["alias"] == "desk"
+    assert [p["mac"] for p in known.profiles()] == [_MAC]
+
+    bulb = known.bulb("desk")
+    assert bulb.bulb[Bulb._DEV_MAC] == _MAC
+
+    known.set_group("living", ["desk", "af:66:4b:0d:ac:e7"])
+    assert known.group("living") == [_MAC, "AF:66:4B:0D:AC:E7"]
+
+    assert known.remove(_MAC.lower())
+    with pytest.raises(ValueError):
+        known.mac("desk")
+
+
+
+
+def test_registries_of_a_file_share_a_lock(known, tmp_path):
+
+    assert registry.Registry(str(tmp_path / "bulbs"))._lock is known._lock
+    assert registry.Registry(str(tmp_path / "other"))._lock \
+        is not known._lock
+
+
+
+
+def _busy(monkeypatch, times):
+
+    # database locked by another process, e.g. gdbm while it is written
+    _open = dbm.open
+    calls = []
+
+    def _locked(*args):
+        calls.append(args)
+        if len(calls) <= times:
+            raise OSError(errno.EAGAIN, "Resource temporarily unavailable")
+
+        return _open(*args)
+
+    monkeypatch.setattr(registry, "_LOCK_RETRY", 0.01)
+    monkeypatch.setattr(registry, "_LOCK_TIMEOUT", 0.1)
+    monkeypatch.setattr(dbm, "open", _locked)
+
+    return calls
+
+
+
+
+def test_busy_database_is_opened_again(known, monkeypatch):
+
+    calls = _busy(monkeypatch, 2)
+
+    assert known.mac("desk") == _MAC
+    assert len(calls) == 3
+
+
+
+
+def test_busy_database_is_no_unknown_bulb(known, monkeypatch):
+
+    _busy(monkeypatch, 1000)
+
+    with pytest.raises(OSError):
+        known.get("desk")
+
+    with pytest.raises(OSError):
+        known.profiles()
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of TimerScheduler with a clock under control of the test.
+"""
+
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+
+from playbulb.mipow import Bulb
+from playbulb.scheduler import TimerScheduler
+
+
+_START = datetime(2026, 1, 1, 6, 0)
+
+
+
+
+class TimerBulb():
+
+    # records set_timers(), fails the first `failures` writes
+    def __init__(self, failures = 0, error = None):
+
+        self.failures = failures
+        self.error = error
+        self.writes = []
+
+    def set_timers(self, timers, verify = True):
+
+        if self.error is not None:
+            raise self.error
+
+        if self.failures > 0:
+            self.failures -= 1
+            return False
+
+        self.writes.append(timers)
+        return True
+
+
+
+
+class Clock():
+
+    def __init__(self, now = _START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+
+
+@pytest.fixture
+def scheduler(clock):
+
+    scheduler = TimerScheduler(verify = False, clock = clock)
+    yield scheduler
+    scheduler.stop()
+
+
+
+
+def _starts(timers):
+    return [t[Bulb._START] if t is not None else None for t in timers]
+
+
+
+
+def _add(scheduler, bulb, minutes):
+
+    return [scheduler.add(bulb, _START + timedelta(minutes = m), 5)
+            for m in minutes]
+
+
+
+
+def test_maps_next_four_entries(scheduler):
+
+    bulb = TimerBulb()
+    _add(scheduler, bulb, [50, 10, 40, 20, 30, 60])
+
+    assert scheduler.tick(True) == 1
+    assert sorted(_starts(bulb.writes[0])) == [[6, 10], [6, 20], [6, 30],
+                                               [6, 40]]
+    assert len(scheduler.entries(bulb)) == 6
+
+    # nothing has fired yet
+    assert scheduler.tick(True) == 0
+
+
+
+
+def test_bulbs_woken_up_many_times_are_written_once(scheduler):
+
+    bulbs = [TimerBulb() for i in range(50)]
+    for bulb in bulbs:
+        _add(scheduler, bulb, range(10, 410, 2))
+
+    assert scheduler.tick(True) == len(bulbs)
+    assert all(len(bulb.writes) == 1 for bulb in bulbs)
+
+
+
+
+def test_refills_a_slot_after_it_has_fired(scheduler, clock):
+
+    bulb = TimerBulb()
+    _add(scheduler, bulb, [10, 20, 30, 40, 50])
+    scheduler.tick(True)
+
+    clock.advance(minutes = 10, seconds = 5)
+    assert scheduler.tick(True) == 1
+
+    # only the slot of the fired timer is written
+    assert _starts(bulb.writes[1]).count(None) == 3
+    assert [6, 50] in _starts(bulb.writes[1])
+    assert len(scheduler.entries(bulb)) == 4
+
+
+
+
+def test_earlier_entry_displaces_the_latest(scheduler):
+
+    bulb = TimerBulb()
+    _add(scheduler, bulb, [10, 20, 30, 40])
+    scheduler.tick(True)
+
+    _add(scheduler, bulb, [5])
+    scheduler.tick(True)
+
+    assert _starts(bulb.writes[1]).count(None) == 3
+    assert [6, 5] in _starts(bulb.writes[1])
+
+
+
+
+def test_cancelled_entry_frees_its_slot(scheduler):
+
+    bulb = TimerBulb()
+    entries = _add(scheduler, bulb, [10, 20])
+    scheduler.tick(True)
+
+    scheduler.cancel(bulb, entries[0])
+    scheduler.tick(True)
+
+    assert [0xff, 0xff] in _starts(bulb.writes[1])
+    assert scheduler.entries(bulb) == [entries[1]]
+
+
+
+
+def test_entries_beyond_a_day_are_held_back(scheduler, clock):
+
+    bulb = TimerBulb()
+    scheduler.add(bulb, _START + timedelta(hours = 30))
+
+    assert scheduler.tick(True) == 0
+
+    clock.advance(hours = 7, minutes = 1)
+    assert scheduler.tick(True) == 1
+
+
+
+
+def test_failed_write_is_retried(scheduler, clock):
+
+    bulb = TimerBulb(failures = 1)
+    _add(scheduler, bulb, [10, 20])
+
+    assert scheduler.tick(True) == 1
+    assert bulb.writes == []
+
+    # not taken as programmed, the retry writes both again
+    clock.advance(seconds = 61)
+    assert scheduler.tick(True) == 1
+    assert sorted(s for s in _starts(bulb.writes[0]) if s is not None) \
+        == [[6, 10], [6, 20]]
+    assert len(scheduler.entries(bulb)) == 2
+
+
+
+
+def test_failing_bulb_does_not_stop_the_others(scheduler):
+
+    dead = TimerBulb(error = IOError("not reachable"))
+    good = TimerBulb()
+    _add(scheduler, dead, [10])
+    _add(scheduler, good, [10])
+
+    assert scheduler.tick(True) == 2
+    assert len(good.writes) == 1
+    assert len(scheduler.entries(dead)) == 1
+
+
+
+
+def test_session_wraps_each_write(clock):
+
+    from contextlib import contextmanager
+
+    sessions = []
+
+    @contextmanager
+    def session(bulb):
+        sessions.append(bulb)
+        yield bulb
+
+    scheduler = TimerScheduler(verify = False, clock = clock,
+                               session = session)
+    bulb = TimerBulb()
+    _add(scheduler, bulb, [10])
+    scheduler.tick(True)
+    scheduler.stop()
+
+    assert sessions == [bulb]
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of the schedule of the service: Cron, sun() and Service.due().
+"""
+
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import pytest
+
+from conftest import connected
+from playbulb import service
+from playbulb.mipow import Bulb
+from playbulb.pool import BulbPool
+from playbulb.service import Cron
+from playbulb.service import Service
+
+
+_BERLIN = (52.52, 13.40)
+_SYDNEY = (-33.87, 151.21)
+_SAN_FRANCISCO = (37.77, -122.42)
+_SVALBARD = (78.22, 15.65)
+
+# 2026-01-05 is a monday
+_MONDAY = datetime(2026, 1, 5, 6, 30)
+
+
+
+
+def _utc(*args):
+
+    # sun() returns naive local time
+    return datetime(*args, tzinfo = timezone.utc).astimezone() \
+        .replace(tzinfo = None)
+
+
+
+
+def _near(t, expected, minutes = 3):
+    return abs(t - expected) <= timedelta(minutes = minutes)
+
+
+
+
+def test_cron_fields():
+
+    cron = Cron("*/15 6-8 * * 1-5")
+
+    assert cron.match(_MONDAY.replace(minute = 30))
+    assert cron.match(_MONDAY.replace(hour = 8, minute = 45))
+    assert not cron.match(_MONDAY.replace(minute = 31))
+    assert not cron.match(_MONDAY.replace(hour = 9, minute = 0))
+    assert not cron.match(_MONDAY + timedelta(days = 5))
+
+
+
+
+def test_cron_lists_and_sunday_as_seven():
+
+    cron = Cron("0,30 22 * * 0")
+    sunday = datetime(2026, 1, 4, 22, 30)
+
+    assert cron.match(sunday)
+    assert Cron("30 22 * * 7").match(sunday)
+    assert not cron.match(sunday + timedelta(days = 1))
+
+
+
+
+def test_cron_day_or_weekday():
+
+    # like cron, restricted day and weekday match either of them
+    cron = Cron("0 12 1 * 1")
+
+    assert cron.match(datetime(2026, 1, 1, 12, 0))
+    assert cron.match(datetime(2026, 1, 5, 12, 0))
+    assert not cron.match(datetime(2026, 1, 6, 12, 0))
+
+    # with one of them unrestricted both have to match
+    assert not Cron("0 12 1 * *").match(datetime(2026, 1, 5, 12, 0))
+
+
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *",
+    "60 * * * *",
+    "* 24 * * *",
+    "* * 0 * *",
+    "5-1 * * * *",
+    "*/0 * * * *"
+])
+def test_invalid_cron(expression):
+
+    with pytest.raises(ValueError):
+        Cron(expression)
+
+
+
+
+def test_sun_berlin():
+
+    day = date(2026, 6, 21)
+
+    assert _near(service.sun(day, *_BERLIN, rising = True),
+                 _utc(2026, 6, 21, 2, 43))
+    assert _near(service.sun(day, *_BERLIN, rising = False),
+                 _utc(2026, 6, 21, 19, 33))
+
+    day = date(2026, 12, 21)
+    assert _near(service.sun(day, *_BERLIN, rising = True),
+                 _utc(2026, 12, 21, 7, 14))
+
+
+
+
+def test_sun_on_the_other_side_of_utc_midnight():
+
+    # local sunrise in Sydney is on the day before in UTC
+    assert _near(service.sun(date(2026, 3, 20), *_SYDNEY, rising = True),
+                 _utc(2026, 3, 19, 19, 59))
+
+    # local sunset in San Francisco is on the day after in UTC
+    assert _near(service.sun(date(2026, 6, 21), *_SAN_FRANCISCO,
+                             rising = False),
+                 _utc(2026, 6, 22, 3, 35))
+
+
+
+
+def test_sun_polar_day_and_night():
+
+    assert service.sun(date(2026, 6, 21), *_SVALBARD, rising = False) is None
+    assert service.sun(date(2026, 12, 21), *_SVALBARD, rising = True) is None
+
+
+
+
+def _service(entries, pool = None):
+
+    return Service({
+        "location" : { "latitude" : _BERLIN[0], "longitude" : _BERLIN[1] },
+        "groups"   : { "living" : [ "AF:66:4B:0D:AC:E6",
+                                    "AF:66:4B:0D:AC:E7" ] },
+        "schedule" : entries
+    }, pool = pool)
+
+
+
+
+def test_due_groups_entries_by_bulb():
+
+    wakeup = { "cron" : "30 6 * * 1-5", "targets" : [ "living" ],
+               "call" : "wakeup", "args" : [ 30 ] }
+    red = { "cron" : "30 6 * * *", "targets" : [ "AF:66:4B:0D:AC:E6" ],
+            "state" : { "Color" : [ 0, 255, 0, 0 ] } }
+    _service_ = _service([wakeup, red])
+
+    due = _service_.due(_MONDAY.replace(second = 42))
+
+    assert list(due.keys()) == [ "AF:66:4B:0D:AC:E6", "AF:66:4B:0D:AC:E7" ]
+    assert [e["call"] if "call" in e else "state"
+            for e in due["AF:66:4B:0D:AC:E6"]] == [ "wakeup", "state" ]
+    assert len(_service_.due(_MONDAY + timedelta(minutes = 1))) == 0
+
+
+
+
+def test_due_at_sunset_with_offset():
+
+    _service_ = _service([{ "sunset" : -15, "targets" : [ "living" ],
+                            "call" : "on" }])
+
+    sunset = service.sun(date(2026, 6, 21), *_BERLIN, rising = False)
+
+    assert len(_service_.due(sunset - timedelta(minutes = 15))) == 2
+    assert len(_service_.due(sunset)) == 0
+
+
+
+
+def test_invalid_entries():
+
+    with pytest.raises(ValueError):
+        _service([{ "cron" : "* * * * *", "targets" : [], "call" : "rm" }])
+
+    with pytest.raises(ValueError):
+        _service([{ "cron" : "* * * * *", "targets" : [] }])
+
+    with pytest.raises(ValueError):
+        Service({ "schedule" : [{ "sunrise" : 0, "targets" : [],
+                                  "call" : "on" }] })
+
+
+
+
+def test_run_once_reports_unreachable_bulbs():
+
+    bulbs = { "AF:66:4B:0D:AC:E6" : connected(mac = "AF:66:4B:0D:AC:E6"),
+              "AF:66:4B:0D:AC:E7" : connected(mac = "AF:66:4B:0D:AC:E7") }
+
+    # the second bulb has lost its connection and does not come back
+    bulbs["AF:66:4B:0D:AC:E7"].connect = lambda: False
+    bulbs["AF:66:4B:0D:AC:E7"].bulb[Bulb._CONNECTED] = False
+
+    _service_ = _service([
+        { "cron" : "30 6 * * *", "targets" : [ "living" ],
+          "state" : { "Color" : [ 0, 255, 0, 0 ] } },
+        { "cron" : "31 6 * * *", "targets" : [ "living" ], "call" : "off" }
+    ], BulbPool(factory = lambda mac, hci_device: bulbs[mac]))
+
+    for now in [_MONDAY, _MONDAY + timedelta(minutes = 1)]:
+        results = _service_.run_once(now)
+
+        assert results["AF:66:4B:0D:AC:E6"] is None
+        assert isinstance(results["AF:66:4B:0D:AC:E7"], IOError)
+
+    _service_.stop()
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of export and restore of snapshots on fake devices.
+"""
+
+import io
+import json
+
+from conftest import FakeDevice
+from conftest import handle
+from playbulb import snapshot
+from playbulb.mipow import Bulb
+
+
+_SOURCE = "AF:66:4B:0D:AC:E6"
+_TARGET = "AF:66:4B:0D:AC:E7"
+
+# slot 1 has fired at 06:00, slot 2 is armed for 07:00
+_TIMERS = bytes([4, 6, 0,  0, 7, 0,  4, 255, 255,  4, 255, 255,  6, 30])
+_TIMER_EFFECTS = bytes([0, 255, 0, 0, 10,  255, 0, 0, 0, 20]) + bytes(10)
+
+_UNSET = bytes([4, 255, 255] * 4 + [6, 30])
+
+# random mode which has been switched off, its times are kept
+_RANDOM = bytes([0, 0, 0, 18, 0, 23, 0, 5, 30, 255, 0, 0, 0])
+
+
+
+
+def _factory(mac, hci_device):
+    return Bulb(mac = mac, hci_device = hci_device, handles = {})
+
+
+
+
+def _export(devices, mac):
+
+    out = io.StringIO()
+    assert snapshot.export([mac], out, factory = _factory)
+
+    return json.loads(out.getvalue())
+
+
+
+
+def _restore(record):
+
+    results = list(snapshot.restore([json.dumps(record)],
+                                    factory = _factory))
+
+    assert len(results) == 1 and results[0].error is None
+    return results[0]
+
+
+
+
+def test_round_trip_does_not_arm_timers_which_are_off(devices):
+
+    devices[_SOURCE] = FakeDevice({
+        handle(Bulb._CHARACTERISTIC_TIMER)        : _TIMERS,
+        handle(Bulb._CHARACTERISTIC_TIMER_EFFECT) : _TIMER_EFFECTS,
+        handle(Bulb._CHARACTERISTIC_RANDOMMODE)   : _RANDOM
+    })
+    devices[_TARGET] = FakeDevice({
+        handle(Bulb._CHARACTERISTIC_TIMER)        : _UNSET
+    })
+
+    record = _export(devices, _SOURCE)
+    timers = record["state"][Bulb._TIMER]
+    assert [t[Bulb._STATUS] for t in timers] == [4, 0, 4, 4]
+
+    # the same state on the bulb it has been taken from needs no write
+    assert _restore(record).writes == 0
+    assert devices[_SOURCE].writes == []
+
+    # only the armed timer is written to another bulb
+    record["target"] = _TARGET
+    assert _restore(record).writes == 1
+
+    writes = devices[_TARGET].writes
+    assert [w[0] for w in writes] == [handle(Bulb._CHARACTERISTIC_TIMER)]
+    assert writes[0][1][0] == 1 and writes[0][1][6:8] == bytes([0, 7])
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Start-up budget of the command line, see python -X importtime.
+
+Importing mipow_cli has to stay within _BUDGET microseconds, measured as
+the best of a few runs with compiled byte code, and must not load what
+only some commands need.
+"""
+
+import os
+import subprocess
+import sys
+
+
+_SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+_BUDGET = 35000
+_RUNS = 5
+
+# loaded only by the commands which need them
+_LAZY = ["concurrent.futures", "dbm", "gatttool", "json", "pexpect",
+         "socket", "subprocess", "threading", "playbulb.registry"]
+
+
+
+
+def _python(tmp_path, *args):
+
+    # byte code of its own, written even if the environment says not to
+    env = dict(os.environ, PYTHONPYCACHEPREFIX = str(tmp_path))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    return subprocess.run([sys.executable] + list(args), cwd = _SRC,
+                          env = env, stdout = subprocess.PIPE,
+                          stderr = subprocess.PIPE, universal_newlines = True,
+                          check = True)
+
+
+
+
+def _import_time(tmp_path):
+
+    # import time: self [us] | cumulative | imported package
+    for line in _python(tmp_path, "-X", "importtime", "-c",
+                        "import mipow_cli").stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if fields[-1] == "mipow_cli":
+            return int(fields[1])
+
+
+
+
+def test_import_within_budget(tmp_path):
+
+    # the first import writes the byte code
+    _python(tmp_path, "-c", "import mipow_cli")
+
+    best = min(_import_time(tmp_path) for run in range(_RUNS))
+    assert best < _BUDGET, "import mipow_cli takes %i us" % best
+
+
+
+
+def test_import_loads_nothing_lazy(tmp_path):
+
+    loaded = _python(tmp_path, "-c", "import sys, mipow_cli; "
+                     "print(mipow_cli._COMMANDS is None); "
+                     "print(' '.join(sys.modules))").stdout.splitlines()
+
+    assert loaded[0] == "True"
+    assert [module for module in _LAZY
+            if module in loaded[1].split()] == []
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+#
+# MIT License
+#
+# Copyright (c) 2017 heckie75
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""
+Tests of Watcher on a FakeDevice with the waits recorded instead of slept.
+"""
+
+import pytest
+
+from conftest import connected
+from playbulb.mipow import Bulb
+from playbulb.watch import Watcher
+
+
+
+
+def run(watcher, polls):
+
+    # runs changes() for a number of polls, returns changes and waits
+    waits = []
+
+    def wait(interval):
+        waits.append(interval)
+        if len(waits) == polls:
+            watcher.stop()
+
+    watcher._stop.wait = wait
+
+    return list(watcher.changes()), waits
+
+
+
+
+def failing(bulb, error):
+
+    def char_read_hnd(handle):
+        raise error
+
+    bulb._btle_device.char_read_hnd = char_read_hnd
+
+
+
+
+def test_back_off_is_relative_to_the_interval():
+
+    changes, waits = run(Watcher(connected(), interval = 0.5), 6)
+
+    assert len(changes) == 1
+    assert waits == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+
+
+
+
+def test_back_off_cap_is_a_parameter():
+
+    watcher = Watcher(connected(), interval = 0.5, max_interval = 1.5)
+    changes, waits = run(watcher, 4)
+
+    assert waits == [0.5, 1.0, 1.5, 1.5]
+
+
+
+
+def test_link_errors_are_a_disconnect():
+
+    from gatttool import bledevice
+
+    for error in [IOError("gone"), bledevice.NoResponseError("gone")]:
+        bulb = connected()
+        failing(bulb, error)
+
+        changes, waits = run(Watcher(bulb), 2)
+
+        assert changes == [{ Bulb._CONNECTED : False }]
+        assert not bulb.bulb[Bulb._CONNECTED]
+
+
+
+
+def test_other_errors_are_raised():
+
+    bulb = connected()
+    failing(bulb, ValueError("bug"))
+
+    with pytest.raises(ValueError):
+        run(Watcher(bulb), 2)